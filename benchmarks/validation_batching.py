@@ -0,0 +1,135 @@
+"""
+Бенчмарк: проверка симптомов отдельными запросами против микропакетов
+
+Вместо Groq используется фейковый клиент с задержкой, зависящей от размера
+запроса, поэтому бенчмарк не расходует квоту API.
+
+Запуск:
+    python -m benchmarks.validation_batching --users 40 --window-ms 20 --batch-size 8
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from services.ai_scheduler import estimate_tokens
+from services.ai_service import AIService
+
+
+SAMPLE_TEXTS = [
+    "болит голова второй день, давит в висках",
+    "температура 38, ломит тело, слабость",
+    "как приготовить борщ",
+    "сыпь на руках, чешется после новой еды",
+    "кашель с мокротой неделю",
+    "привет, как дела",
+    "тянет поясницу после тренировки",
+    "тошнота по утрам и изжога",
+]
+
+
+class FakeRawResponse:
+    """Имитация сырого ответа SDK (with_raw_response): заголовки без лимитов"""
+
+    def __init__(self, response):
+        self.headers = {}
+        self._response = response
+
+    async def parse(self):
+        return self._response
+
+
+class FakeCompletions:
+    """Имитация chat.completions: задержка = базовая + время генерации ответа"""
+
+    def __init__(self, base_latency: float, per_item_latency: float):
+        self.base_latency = base_latency
+        self.per_item_latency = per_item_latency
+        self.requests = 0
+        self.tokens = 0
+        # AIService вызывает with_raw_response.create
+        self.with_raw_response = self
+
+    async def create(self, model, messages, temperature, max_tokens, **kwargs):
+        user_message = messages[-1]['content']
+        ids = [int(i) for i in re.findall(r'^\[(\d+)\]$', user_message, re.MULTILINE)]
+        await asyncio.sleep(self.base_latency + self.per_item_latency * max(1, len(ids)))
+
+        if ids:
+            items = ', '.join(
+                f'{{"id": {i}, "is_valid": true, "symptoms": "", "reason": ""}}' for i in ids
+            )
+            content = f'{{"results": [{items}]}}'
+        else:
+            content = '{"is_valid": true, "symptoms": "", "reason": ""}'
+
+        total = sum(estimate_tokens(m['content']) for m in messages) + estimate_tokens(content)
+        self.requests += 1
+        self.tokens += total
+        return FakeRawResponse(SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=total)
+        ))
+
+
+async def run(batching: bool, args) -> dict:
+    os.environ["AI_BATCH_VALIDATION"] = "true" if batching else "false"
+    os.environ["AI_BATCH_WINDOW_MS"] = str(args.window_ms)
+    os.environ["AI_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["GROQ_RPM"] = str(args.rpm)
+    os.environ["GROQ_TPM"] = str(args.tpm)
+
+    service = AIService()
+    completions = FakeCompletions(args.base_latency, args.item_latency)
+    for key in service.keys.keys:
+        key.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def user(i: int) -> float:
+        # Пользователи приходят равномерно в течение spread секунд
+        await asyncio.sleep(args.spread * i / args.users)
+        started = time.perf_counter()
+        await service.validate_symptoms(f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} (#{i})")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(user(i) for i in range(args.users))))
+    elapsed = time.perf_counter() - started
+    await service.http_client.aclose()
+
+    return {
+        'mode': 'batched' if batching else 'per-request',
+        'elapsed': elapsed,
+        'throughput': args.users / elapsed,
+        'requests': completions.requests,
+        'tokens': completions.tokens,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95) - 1]
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=40, help='Число проверок')
+    parser.add_argument('--spread', type=float, default=0.25, help='Интервал прихода запросов (сек)')
+    parser.add_argument('--window-ms', type=float, default=20, help='Окно сбора пакета (мс)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Максимальный размер пакета')
+    parser.add_argument('--base-latency', type=float, default=0.3, help='Задержка запроса (сек)')
+    parser.add_argument('--item-latency', type=float, default=0.05, help='Задержка на элемент (сек)')
+    parser.add_argument('--rpm', type=int, default=30, help='Лимит запросов в минуту')
+    parser.add_argument('--tpm', type=int, default=100000, help='Лимит токенов в минуту')
+    args = parser.parse_args()
+
+    print(f"{'режим':<12} {'время, с':>9} {'пров./с':>8} {'запросов':>9} {'токенов':>8} {'p50, с':>7} {'p95, с':>7}")
+    for batching in (False, True):
+        r = await run(batching, args)
+        print(f"{r['mode']:<12} {r['elapsed']:>9.2f} {r['throughput']:>8.1f} {r['requests']:>9} "
+              f"{r['tokens']:>8} {r['p50']:>7.2f} {r['p95']:>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,6 +4,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 from bot.states import Consultation
+from bot.streaming import StreamingMessage
 from bot.keyboards import (
     get_main_menu,
     get_symptoms_input_keyboard,
@@ -16,35 +17,61 @@ from bot.keyboards import (
     get_final_confirmation,
     get_result_keyboard
 )
-from services.ai_service import AIService
-from database.connection import supabase_client
+from services.ai_service import ai_service
+from services.ai_sessions import ai_sessions, SessionCancelled
+from services.red_flags import detect_red_flags, EMERGENCY_GUIDANCE
+from database.models import Consultation as ConsultationRecord
+from database.consultation_log import consultation_log
+from database.repositories import user_repository
 
 
 router = Router()
-ai_service = AIService()
 
 
 # ============ ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ============
 
+URGENCY_EMOJI = {
+    'emergency': '🚨',
+    'high': '⚠️',
+    'medium': '📋',
+    'low': 'ℹ️'
+}
+
+URGENCY_TEXT = {
+    'emergency': 'СРОЧНО! Требуется скорая помощь',
+    'high': 'Высокая (обратиться в течение 24 часов)',
+    'medium': 'Средняя (обратиться в течение недели)',
+    'low': 'Низкая (плановый приём)'
+}
+
+
+def format_recommendation(recommendation: dict, markdown: bool = True) -> str:
+    """
+    Текст рекомендации специалиста
+    
+    Args:
+        recommendation: Результат recommend_doctor (может быть неполным при потоковом выводе)
+        markdown: Выделять заголовки жирным (для промежуточных правок - без разметки)
+    """
+    b = '*' if markdown else ''
+    urgency = recommendation.get('urgency')
+    
+    result_text = f"🩺 {b}Рекомендация специалиста{b}\n\n"
+    result_text += f"{b}Специалист:{b} {recommendation['specialist']}\n\n"
+    if urgency:
+        result_text += f"{URGENCY_EMOJI.get(urgency, '📋')} {b}Срочность:{b} "
+        result_text += f"{URGENCY_TEXT.get(urgency, 'Средняя')}\n\n"
+    if recommendation.get('reasoning'):
+        result_text += f"{b}Обоснование:{b}\n{recommendation['reasoning']}"
+    return result_text
+
+
 async def get_user_profile(user_id: int) -> dict:
     """Получает профиль пользователя для AI"""
     try:
-        response = supabase_client.table('user_profiles').select('*').eq('user_id', user_id).execute()
-        if response.data:
-            profile = response.data[0]
-            
-            if profile.get('birthdate'):
-                birthdate = datetime.fromisoformat(profile['birthdate'])
-                age = (datetime.now() - birthdate).days // 365
-            else:
-                age = None
-            
-            return {
-                'gender': profile.get('gender'),
-                'age': age,
-                'height': profile.get('height'),
-                'weight': profile.get('weight')
-            }
+        profile = await user_repository.get(user_id)
+        if profile:
+            return profile.ai_profile()
     except Exception as e:
         print(f"DB Error: {e}")
     
@@ -52,32 +79,54 @@ async def get_user_profile(user_id: int) -> dict:
 
 
 async def save_consultation(user_id: int, data: dict):
-    """Сохраняет консультацию в БД"""
+    """Сохраняет консультацию в БД (через локальный журнал)"""
     try:
         import json
         
-        consultation_data = {
-            'user_id': user_id,
-            'symptoms': json.dumps(data.get('symptoms', {}), ensure_ascii=False),
-            'questions_answers': json.dumps(data.get('questions_answers', {}), ensure_ascii=False),
-            'recommended_doctor': data.get('specialist'),
-            'urgency_level': data.get('urgency'),
-            'created_at': datetime.now().isoformat()
-        }
+        consultation_data = ConsultationRecord(
+            user_id=user_id,
+            symptoms=json.dumps(data.get('symptoms', {}), ensure_ascii=False),
+            questions_answers=json.dumps(data.get('questions_answers', {}), ensure_ascii=False),
+            recommended_doctor=data.get('specialist'),
+            urgency_level=data.get('urgency'),
+            source=data.get('source'),
+            created_at=datetime.now()
+        )
         
-        supabase_client.table('consultations').insert(consultation_data).execute()
+        # В базу консультация попадёт фоновой задачей, ответ пользователю не ждёт сети
+        await consultation_log.append(consultation_data)
     except Exception as e:
         print(f"DB Error: {e}")
 
 
+async def send_emergency(message: Message, state: FSMContext, red_flag: dict, symptoms: dict):
+    """Немедленная экстренная рекомендация при признаках неотложного состояния"""
+    ai_sessions.cancel(message.from_user.id)
+    
+    await message.answer(
+        EMERGENCY_GUIDANCE.format(name=red_flag['name']),
+        reply_markup=get_result_keyboard(),
+        parse_mode="Markdown"
+    )
+    
+    await save_consultation(message.from_user.id, {
+        'symptoms': symptoms,
+        'questions_answers': {},
+        'specialist': 'Скорая помощь',
+        'urgency': 'emergency',
+        'source': 'emergency'
+    })
+    
+    await state.clear()
+
+
 # ============ НАЧАЛО КОНСУЛЬТАЦИИ ============
 
 @router.message(F.text == "🩺 Новая консультация")
 async def start_consultation(message: Message, state: FSMContext):
     """Начало новой консультации"""
     try:
-        response = supabase_client.table('user_profiles').select('user_id').eq('user_id', message.from_user.id).execute()
-        if not response.data:
+        if not await user_repository.exists(message.from_user.id):
             await message.answer(
                 "❌ Пожалуйста, сначала зарегистрируйтесь\n"
                 "Используйте /start"
@@ -86,6 +135,7 @@ async def start_consultation(message: Message, state: FSMContext):
     except Exception as e:
         print(f"DB Error: {e}")
     
+    ai_sessions.cancel(message.from_user.id)
     await state.clear()
     
     await message.answer(
@@ -106,6 +156,7 @@ async def start_consultation(message: Message, state: FSMContext):
 @router.message(Consultation.waiting_for_symptoms, F.text == "❌ Отменить")
 async def cancel_from_symptoms(message: Message, state: FSMContext):
     """Отмена на первом этапе (описание симптомов)"""
+    ai_sessions.cancel(message.from_user.id)
     await state.clear()
     await message.answer(
         "❌ Консультация отменена",
@@ -119,38 +170,47 @@ async def process_symptoms_text(message: Message, state: FSMContext):
     
     symptoms_text = message.text.strip()
     
-    # ВАЛИДАЦИЯ
-    await message.answer("⏳ Проверяю ваше сообщение...")
+    # Признаки неотложного состояния - сразу экстренная рекомендация, без AI
+    red_flag = detect_red_flags(symptoms_text)
+    if red_flag:
+        print(f"DEBUG: Red flag detected: {red_flag}")
+        await send_emergency(message, state, red_flag, {'main': symptoms_text})
+        return
     
-    validation = ai_service.validate_symptoms(symptoms_text)
+    # ВАЛИДАЦИЯ И ОКУЛЬТУРИВАНИЕ (один запрос к AI, ответ выводится по мере генерации)
+    stream = StreamingMessage(message)
+    await stream.start("⏳ Проверяю ваше сообщение...")
     
-    if not validation['is_valid']:
-        await message.answer(
+    try:
+        async with ai_sessions.scope(message.from_user.id):
+            async for intake in ai_service.stream_analyze_symptoms(symptoms_text):
+                if not intake['done'] and intake['is_valid'] is not False and intake['improved']:
+                    await stream.update(f"📝 Ваши симптомы:\n\n{intake['improved']}")
+    except SessionCancelled:
+        await stream.finish("❌ Проверка отменена", parse_mode=None)
+        return
+    
+    if not intake['is_valid']:
+        await stream.finish(
             f"❌ *Ошибка валидации*\n\n"
-            f"{validation['reason']}\n\n"
+            f"{intake['reason']}\n\n"
             f"Пожалуйста, опишите именно медицинские симптомы:\n"
             f"• Боли и их локализация\n"
             f"• Температура\n"
             f"• Тошнота, слабость\n"
             f"• Другие физические ощущения\n\n"
-            f"Попробуйте ещё раз:",
-            parse_mode="Markdown"
+            f"Попробуйте ещё раз:"
         )
         return
     
-    # ОКУЛЬТУРИВАНИЕ СИМПТОМОВ
-    await message.answer("✏️ Улучшаю формулировку...")
-    
-    improved_symptoms = ai_service.improve_symptoms_text(symptoms_text)
+    improved_symptoms = intake['improved']
     
     await state.update_data(main_symptoms=improved_symptoms)
     
+    await stream.finish(f"📝 *Ваши симптомы:*\n\n{improved_symptoms}")
     await message.answer(
-        f"📝 *Ваши симптомы:*\n\n"
-        f"{improved_symptoms}\n\n"
-        f"Подтвердите или добавьте детали:",
-        reply_markup=get_symptoms_confirmation(),
-        parse_mode="Markdown"
+        "Подтвердите или добавьте детали:",
+        reply_markup=get_symptoms_confirmation()
     )
     
     await state.set_state(Consultation.confirming_symptoms)
@@ -172,6 +232,10 @@ async def confirm_symptoms(message: Message, state: FSMContext):
     """Подтверждение симптомов"""
     await message.answer("✅ Симптомы подтверждены")
     
+    # Начинаем подбор дополнительных симптомов, пока пользователь выбирает давность
+    data = await state.get_data()
+    ai_service.prefetch_additional_symptoms(message.from_user.id, data.get('main_symptoms', ''))
+    
     # ОТДЕЛЬНОЕ сообщение для вопроса о давности
     await message.answer(
         "📅 *Этап 2 из 4*\n\n"
@@ -186,6 +250,7 @@ async def confirm_symptoms(message: Message, state: FSMContext):
 @router.message(Consultation.confirming_symptoms, F.text == "🔄 Начать заново")
 async def restart_symptoms(message: Message, state: FSMContext):
     """Начать описание заново"""
+    ai_sessions.cancel(message.from_user.id)
     await message.answer(
         "🔄 Начинаем заново\n\n"
         "Опишите ваши симптомы:",
@@ -200,6 +265,7 @@ async def restart_symptoms(message: Message, state: FSMContext):
 @router.message(Consultation.waiting_for_duration, F.text == "🔙 Назад")
 async def back_from_duration(message: Message, state: FSMContext):
     """Возврат с этапа давности к подтверждению симптомов"""
+    ai_sessions.cancel(message.from_user.id)
     data = await state.get_data()
     main_symptoms = data.get('main_symptoms', '')
     
@@ -224,16 +290,23 @@ async def process_duration(message: Message, state: FSMContext):
     
     await message.answer(f"📅 Давность: {duration_text}")
     
-    # Генерируем дополнительные симптомы через AI
-    await message.answer("⏳ Анализирую симптомы...")
-    
     data = await state.get_data()
     main_symptoms = data.get('main_symptoms', '')
     
-    additional_symptoms = ai_service.generate_additional_symptoms(
-        main_symptoms=main_symptoms,
-        duration=duration_text
-    )
+    # Дополнительные симптомы обычно уже подобраны в фоне после подтверждения
+    if not ai_service.prefetch_ready(message.from_user.id, main_symptoms):
+        await message.answer("⏳ Анализирую симптомы...")
+    
+    try:
+        async with ai_sessions.scope(message.from_user.id):
+            additional_symptoms = await ai_service.get_additional_symptoms(
+                user_id=message.from_user.id,
+                main_symptoms=main_symptoms,
+                duration=duration_text
+            )
+    except SessionCancelled:
+        # Пользователь отменил или вернулся назад - состояние уже изменено
+        return
     
     # ЛОГИРОВАНИЕ для отладки
     print(f"DEBUG: Generated {len(additional_symptoms)} symptoms: {additional_symptoms}")
@@ -420,8 +493,25 @@ async def process_other_symptom(message: Message, state: FSMContext):
     """Обработка другого симптома"""
     other_symptom = message.text.strip()
     
+    data = await state.get_data()
+    
+    # Признаки неотложного состояния - сразу экстренная рекомендация, без AI
+    red_flag = detect_red_flags(data.get('main_symptoms', ''), other_symptom)
+    if red_flag:
+        print(f"DEBUG: Red flag detected: {red_flag}")
+        await send_emergency(message, state, red_flag, {
+            'main': data.get('main_symptoms'),
+            'duration': data.get('duration'),
+            'additional': [*data.get('selected_additional', set()), other_symptom]
+        })
+        return
+    
     # Валидация
-    validation = ai_service.validate_symptoms(other_symptom)
+    try:
+        async with ai_sessions.scope(message.from_user.id):
+            validation = await ai_service.validate_symptoms(other_symptom)
+    except SessionCancelled:
+        return
     
     if not validation['is_valid']:
         await message.answer(
@@ -430,7 +520,6 @@ async def process_other_symptom(message: Message, state: FSMContext):
         )
         return
     
-    data = await state.get_data()
     selected = data.get('selected_additional', set())
     selected.add(validation['symptoms'] if validation['symptoms'] else other_symptom)
     
@@ -513,53 +602,60 @@ async def final_confirm(message: Message, state: FSMContext):
     """Финальное подтверждение и получение рекомендации"""
     await message.answer("✅ Данные подтверждены")
     
-    await message.answer("⏳ Анализирую симптомы и подбираю специалиста...")
-    
     data = await state.get_data()
-    user_profile = await get_user_profile(message.from_user.id)
     
-    recommendation = ai_service.recommend_doctor(
-        main_symptoms=data.get('main_symptoms', ''),
-        duration=data.get('duration', ''),
-        additional_symptoms=list(data.get('selected_additional', set())),
-        user_profile=user_profile
+    # Выбранные дополнительные симптомы могут дать картину неотложного состояния
+    red_flag = detect_red_flags(
+        data.get('main_symptoms', ''), *data.get('selected_additional', set())
     )
-    
-    await save_consultation(message.from_user.id, {
-        'symptoms': {
+    if red_flag:
+        print(f"DEBUG: Red flag detected: {red_flag}")
+        await send_emergency(message, state, red_flag, {
             'main': data.get('main_symptoms'),
             'duration': data.get('duration'),
             'additional': list(data.get('selected_additional', set()))
-        },
-        'questions_answers': {},
-        'specialist': recommendation['specialist'],
-        'urgency': recommendation['urgency']
-    })
+        })
+        return
     
-    urgency_emoji = {
-        'emergency': '🚨',
-        'high': '⚠️',
-        'medium': '📋',
-        'low': 'ℹ️'
-    }
-    
-    urgency_text = {
-        'emergency': 'СРОЧНО! Требуется скорая помощь',
-        'high': 'Высокая (обратиться в течение 24 часов)',
-        'medium': 'Средняя (обратиться в течение недели)',
-        'low': 'Низкая (плановый приём)'
-    }
-    
-    result_text = f"🩺 *Рекомендация специалиста*\n\n"
-    result_text += f"*Специалист:* {recommendation['specialist']}\n\n"
-    result_text += f"{urgency_emoji.get(recommendation['urgency'], '📋')} *Срочность:* "
-    result_text += f"{urgency_text.get(recommendation['urgency'], 'Средняя')}\n\n"
-    result_text += f"*Обоснование:*\n{recommendation['reasoning']}"
+    stream = StreamingMessage(message)
+    await stream.start("⏳ Анализирую симптомы и подбираю специалиста...")
     
+    user_profile = await get_user_profile(message.from_user.id)
+    
+    # Рекомендация выводится по мере генерации ответа AI
+    try:
+        async with ai_sessions.scope(message.from_user.id):
+            async for recommendation in ai_service.stream_recommend_doctor(
+                main_symptoms=data.get('main_symptoms', ''),
+                duration=data.get('duration', ''),
+                additional_symptoms=list(data.get('selected_additional', set())),
+                user_profile=user_profile,
+                user_id=message.from_user.id
+            ):
+                if not recommendation['done'] and recommendation['specialist']:
+                    await stream.update(format_recommendation(recommendation, markdown=False))
+    except SessionCancelled:
+        await stream.finish("❌ Подбор специалиста отменён", parse_mode=None)
+        return
+    
+    # Повторная отправка тех же данных уже сохранена в истории
+    if not recommendation.get('cached'):
+        await save_consultation(message.from_user.id, {
+            'symptoms': {
+                'main': data.get('main_symptoms'),
+                'duration': data.get('duration'),
+                'additional': list(data.get('selected_additional', set()))
+            },
+            'questions_answers': {},
+            'specialist': recommendation['specialist'],
+            'urgency': recommendation['urgency'],
+            'source': recommendation.get('source')
+        })
+    
+    await stream.finish(format_recommendation(recommendation))
     await message.answer(
-        result_text,
-        reply_markup=get_result_keyboard(),
-        parse_mode="Markdown"
+        "Что дальше?",
+        reply_markup=get_result_keyboard()
     )
     
     await state.clear()
@@ -579,6 +675,7 @@ async def add_more_from_final(message: Message, state: FSMContext):
 @router.message(Consultation.final_confirmation, F.text == "🔄 Начать заново")
 async def restart_consultation(message: Message, state: FSMContext):
     """Начать консультацию заново"""
+    ai_sessions.cancel(message.from_user.id)
     await state.clear()
     await start_consultation(message, state)
 
@@ -588,6 +685,7 @@ async def restart_consultation(message: Message, state: FSMContext):
 @router.message(F.text == "🏠 В главное меню")
 async def back_to_main_menu(message: Message, state: FSMContext):
     """Возврат в главное меню"""
+    ai_sessions.cancel(message.from_user.id)
     await state.clear()
     await message.answer(
         "Главное меню",
@@ -609,6 +707,7 @@ async def book_appointment(message: Message):
 @router.message(F.text == "❌ Отменить")
 async def cancel_consultation_button(message: Message, state: FSMContext):
     """Отмена консультации через кнопку"""
+    ai_sessions.cancel(message.from_user.id)
     await state.clear()
     await message.answer(
         "❌ Консультация отменена",
@@ -619,6 +718,7 @@ async def cancel_consultation_button(message: Message, state: FSMContext):
 @router.message(F.text == "/cancel")
 async def cancel_consultation_command(message: Message, state: FSMContext):
     """Отмена через команду"""
+    ai_sessions.cancel(message.from_user.id)
     await state.clear()
     await message.answer(
         "❌ Консультация отменена",
@@ -12,8 +12,10 @@ from bot.keyboards import (
     get_profile_menu,
     get_edit_profile_menu
 )
-from database.connection import supabase_client
+from database.models import UserProfile
+from database.repositories import user_repository
 from services.phone_formatter import format_phone_number, get_phone_info
+from services.ai_sessions import ai_sessions
 
 
 router = Router()
@@ -46,9 +48,9 @@ def parse_date(date_string: str) -> datetime:
 async def show_profile(message: Message):
     """Показать профиль пользователя"""
     try:
-        response = supabase_client.table('user_profiles').select('*').eq('user_id', message.from_user.id).execute()
+        profile = await user_repository.get(message.from_user.id)
         
-        if not response.data:
+        if not profile:
             await message.answer(
                 "❌ Профиль не найден\n\n"
                 "Пожалуйста, пройдите регистрацию:\n"
@@ -56,26 +58,17 @@ async def show_profile(message: Message):
             )
             return
         
-        profile = response.data[0]
-        
-        # Форматируем дату рождения
-        birthdate = profile.get('birthdate')
-        age = None
-        if birthdate:
-            birthdate_obj = datetime.fromisoformat(birthdate)
-            age = (datetime.now() - birthdate_obj).days // 365
-            birthdate_formatted = birthdate_obj.strftime("%d.%m.%Y")
-        else:
-            birthdate_formatted = "не указано"
+        # Дата рождения и возраст вычислены при загрузке профиля
+        birthdate_formatted = profile.birthdate_text or "не указано"
+        age = profile.age
         
         # Форматируем пол
-        gender = profile.get('gender')
-        gender_text = {"male": "👨 Мужской", "female": "👩 Женский"}.get(gender, "не указано")
+        gender_text = {"male": "👨 Мужской", "female": "👩 Женский"}.get(profile.gender, "не указано")
         
         # Формируем текст профиля
         profile_text = f"👤 *Ваш профиль*\n\n"
-        profile_text += f"*ФИО:* {profile.get('full_name', 'не указано')}\n"
-        profile_text += f"*Телефон:* {profile.get('phone', 'не указано')}\n"
+        profile_text += f"*ФИО:* {profile.full_name or 'не указано'}\n"
+        profile_text += f"*Телефон:* {profile.phone or 'не указано'}\n"
         profile_text += f"*Дата рождения:* {birthdate_formatted}"
         
         if age:
@@ -84,8 +77,8 @@ async def show_profile(message: Message):
             profile_text += "\n"
         
         profile_text += f"*Пол:* {gender_text}\n"
-        profile_text += f"*Рост:* {profile.get('height', 'не указано')} см\n"
-        profile_text += f"*Вес:* {profile.get('weight', 'не указано')} кг"
+        profile_text += f"*Рост:* {profile.height or 'не указано'} см\n"
+        profile_text += f"*Вес:* {profile.weight or 'не указано'} кг"
         
         await message.answer(
             profile_text,
@@ -372,20 +365,20 @@ async def process_weight(message: Message, state: FSMContext):
         data = await state.get_data()
         
         try:
-            profile_data = {
-                'user_id': message.from_user.id,
-                'username': message.from_user.username,
-                'full_name': data['full_name'],
-                'phone': data['phone'],
-                'birthdate': data['birthdate'],
-                'gender': data['gender'],
-                'height': data['height'],
-                'weight': data['weight'],
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
+            profile_data = UserProfile(
+                user_id=message.from_user.id,
+                username=message.from_user.username,
+                full_name=data['full_name'],
+                phone=data['phone'],
+                birthdate=data['birthdate'],
+                gender=data['gender'],
+                height=data['height'],
+                weight=data['weight'],
+                created_at=datetime.now(),
+                updated_at=datetime.now()
+            )
             
-            supabase_client.table('user_profiles').insert(profile_data).execute()
+            await user_repository.create(profile_data)
             
             await message.answer(
                 "🎉 *Регистрация завершена!*\n\n"
@@ -510,10 +503,10 @@ async def edit_full_name(message: Message, state: FSMContext):
         return
     
     try:
-        supabase_client.table('user_profiles').update({
+        await user_repository.update(message.from_user.id, {
             'full_name': full_name,
             'updated_at': datetime.now().isoformat()
-        }).eq('user_id', message.from_user.id).execute()
+        })
         
         await message.answer(f"✅ ФИО обновлено: {full_name}")
         await message.answer("Что ещё хотите изменить?", reply_markup=get_edit_profile_menu())
@@ -544,10 +537,10 @@ async def edit_phone(message: Message, state: FSMContext):
         phone_info = get_phone_info(phone_input)
         
         # Сохраняем в БД
-        supabase_client.table('user_profiles').update({
+        await user_repository.update(message.from_user.id, {
             'phone': formatted_phone,
             'updated_at': datetime.now().isoformat()
-        }).eq('user_id', message.from_user.id).execute()
+        })
         
         # Показываем что сохранили
         info_text = f"✅ *Телефон обновлён:*\n\n"
@@ -583,10 +576,10 @@ async def edit_birthdate(message: Message, state: FSMContext):
             await message.answer("❌ Укажите корректную дату")
             return
         
-        supabase_client.table('user_profiles').update({
+        await user_repository.update(message.from_user.id, {
             'birthdate': birthdate.date().isoformat(),
             'updated_at': datetime.now().isoformat()
-        }).eq('user_id', message.from_user.id).execute()
+        })
         
         await message.answer(f"✅ Дата рождения обновлена: {birthdate.strftime('%d.%m.%Y')} ({age} лет)")
         await message.answer("Что ещё хотите изменить?", reply_markup=get_edit_profile_menu())
@@ -605,10 +598,10 @@ async def edit_gender(message: Message, state: FSMContext):
     gender = "male" if message.text == "👨 Мужской" else "female"
     
     try:
-        supabase_client.table('user_profiles').update({
+        await user_repository.update(message.from_user.id, {
             'gender': gender,
             'updated_at': datetime.now().isoformat()
-        }).eq('user_id', message.from_user.id).execute()
+        })
         
         await message.answer(f"✅ Пол обновлён: {message.text}", reply_markup=ReplyKeyboardRemove())
         await message.answer("Что ещё хотите изменить?", reply_markup=get_edit_profile_menu())
@@ -629,10 +622,10 @@ async def edit_height(message: Message, state: FSMContext):
             await message.answer("❌ Укажите корректный рост (50-250 см)")
             return
         
-        supabase_client.table('user_profiles').update({
+        await user_repository.update(message.from_user.id, {
             'height': height,
             'updated_at': datetime.now().isoformat()
-        }).eq('user_id', message.from_user.id).execute()
+        })
         
         await message.answer(f"✅ Рост обновлён: {height} см")
         await message.answer("Что ещё хотите изменить?", reply_markup=get_edit_profile_menu())
@@ -655,10 +648,10 @@ async def edit_weight(message: Message, state: FSMContext):
             await message.answer("❌ Укажите корректный вес (20-300 кг)")
             return
         
-        supabase_client.table('user_profiles').update({
+        await user_repository.update(message.from_user.id, {
             'weight': weight,
             'updated_at': datetime.now().isoformat()
-        }).eq('user_id', message.from_user.id).execute()
+        })
         
         await message.answer(f"✅ Вес обновлён: {weight} кг")
         await message.answer("Что ещё хотите изменить?", reply_markup=get_edit_profile_menu())
@@ -694,6 +687,8 @@ async def cancel_profile_action(message: Message, state: FSMContext):
         )
         await state.set_state(EditProfile.choosing_field)
     else:
+        # Отмена консультации (в т.ч. фонового подбора симптомов)
+        ai_sessions.cancel(message.from_user.id)
         await state.clear()
         await message.answer(
             "Главное меню",
@@ -0,0 +1,68 @@
+"""
+Потоковый вывод ответа AI: одно сообщение, которое дописывается по мере генерации
+"""
+
+import os
+import time
+
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Message
+
+
+# Минимальный интервал между правками сообщения (лимиты Telegram на редактирование)
+EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Символ в конце текста, пока ответ ещё генерируется
+CURSOR = " ▌"
+
+
+class StreamingMessage:
+    """
+    Сообщение, которое обновляется по мере поступления ответа AI
+
+    Промежуточные правки отправляются без разметки (незакрытые * ломают
+    Markdown) и не чаще EDIT_INTERVAL. Итоговый текст - с разметкой.
+    """
+
+    def __init__(self, message: Message):
+        """
+        Args:
+            message: Сообщение пользователя, в чат которого отвечаем
+        """
+        self.message = message
+        self.sent: Message | None = None
+        self._last_text = ""
+        self._last_edit = 0.0
+
+    async def start(self, text: str):
+        """Отправляет сообщение-заготовку"""
+        self.sent = await self.message.answer(text)
+        self._last_text = text
+        self._last_edit = time.monotonic()
+
+    async def update(self, text: str):
+        """Промежуточное обновление (пропускается, если прошлое было недавно)"""
+        if self.sent is None or not text:
+            return
+        text = text + CURSOR
+        if text == self._last_text or time.monotonic() - self._last_edit < EDIT_INTERVAL:
+            return
+
+        self._last_edit = time.monotonic()
+        try:
+            await self.sent.edit_text(text, parse_mode=None)
+            self._last_text = text
+        except TelegramAPIError as e:
+            print(f"DEBUG: Stream edit skipped: {e}")
+
+    async def finish(self, text: str, parse_mode: str | None = "Markdown"):
+        """Итоговый текст; если правка не удалась - отправляет новое сообщение"""
+        if self.sent is not None:
+            try:
+                await self.sent.edit_text(text, parse_mode=parse_mode)
+                return
+            except TelegramAPIError as e:
+                if "message is not modified" in str(e):
+                    return
+                print(f"DEBUG: Stream final edit failed: {e}")
+        await self.message.answer(text, parse_mode=parse_mode)
@@ -9,16 +9,20 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN environment variable is not set")
 
-# Groq API Key
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Groq API Key (или несколько ключей через запятую в GROQ_API_KEYS)
+GROQ_API_KEYS = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
+GROQ_API_KEY = os.getenv("GROQ_API_KEY") or (GROQ_API_KEYS[0] if GROQ_API_KEYS else None)
 if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY environment variable is not set")
+    raise ValueError("GROQ_API_KEY or GROQ_API_KEYS environment variable is not set")
 
-# Supabase credentials
+# Хранилище данных: supabase или sqlite
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+# Supabase credentials (не нужны для локального SQLite)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+if STORAGE_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
     raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
 
 # Настройки
@@ -27,6 +31,9 @@ PORT = int(os.getenv("PORT", 8080))
 
 print("✅ Configuration loaded successfully")
 print(f"   - Bot token: {'*' * 10}{BOT_TOKEN[-10:]}")
-print(f"   - Groq API: {'*' * 10}{GROQ_API_KEY[-10:]}")
-print(f"   - Supabase: {SUPABASE_URL}")
+print(f"   - Groq API: {'*' * 10}{GROQ_API_KEY[-10:]} (ключей: {max(len(GROQ_API_KEYS), 1)})")
+if STORAGE_BACKEND == "sqlite":
+    print(f"   - Storage: SQLite ({os.getenv('STORAGE_PATH', 'bot.db')})")
+else:
+    print(f"   - Supabase: {SUPABASE_URL}")
 print(f"   - Port: {PORT}")
@@ -2,7 +2,28 @@
 Database module for Telegram Medical Bot
 """
 
-from .connection import supabase_client
 from .models import UserProfile, Consultation, Message
+from .profile_cache import CachedProfile
+from .storage import StorageBackend, PostgrestClient, SQLiteStorage
+from .repositories import (
+    UserRepository,
+    ConsultationRepository,
+    storage,
+    user_repository,
+    consultation_repository
+)
 
-__all__ = ['supabase_client', 'UserProfile', 'Consultation', 'Message']
+
+def __getattr__(name):
+    # Синхронный клиент Supabase создаётся только по запросу (не нужен для SQLite)
+    if name == 'supabase_client':
+        from .connection import supabase_client
+        return supabase_client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    'supabase_client', 'UserProfile', 'Consultation', 'Message', 'CachedProfile',
+    'StorageBackend', 'PostgrestClient', 'SQLiteStorage',
+    'UserRepository', 'ConsultationRepository', 'storage', 'user_repository', 'consultation_repository'
+]
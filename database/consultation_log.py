@@ -0,0 +1,228 @@
+"""
+Отложенное сохранение консультаций через локальный журнал
+
+Запись консультации в Supabase - сетевой запрос на пути ответа пользователю.
+Консультация сначала добавляется в локальный журнал (SQLite в режиме WAL,
+synchronous=FULL - запись переживает падение процесса), после чего бот сразу
+отвечает. Фоновая задача переносит записи журнала в таблицу consultations
+пачками и удаляет перенесённые:
+
+- при ошибке сети или 5xx пачка повторяется с экспоненциальной паузой;
+- если пачку отклонила база (4xx или нарушение ограничений SQLite), записи отправляются по одной,
+  отклонённые удаляются из журнала и учитываются в метриках;
+- записи, оставшиеся в журнале после остановки, отправляются при запуске.
+
+Доставка "хотя бы один раз": если ответ на вставку потерян, пачка будет
+отправлена повторно.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from collections import Counter
+
+import httpx
+
+from database.models import Consultation
+from database.repositories import ConsultationRepository, consultation_repository
+
+
+# Максимальная пауза между повторами при недоступности базы (сек)
+MAX_RETRY_DELAY = 60.0
+
+
+def _rejected(error: Exception) -> bool:
+    """Отклонила ли база запись (повтор той же записи не поможет)"""
+    if isinstance(error, sqlite3.IntegrityError):
+        return True
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    status = error.response.status_code
+    return 400 <= status < 500 and status not in (408, 429)
+
+
+class ConsultationLog:
+    """Локальный журнал консультаций с фоновой пакетной отправкой в базу"""
+
+    def __init__(self, repository: ConsultationRepository, path: str,
+                 batch_size: int = 100, flush_interval: float = 2.0):
+        """
+        Args:
+            repository: Репозиторий консультаций
+            path: Файл журнала SQLite
+            batch_size: Максимум записей в одной вставке
+            flush_interval: Период отправки накопленных записей (сек)
+        """
+        self.repository = repository
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pending_consultations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                logged_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        self.pending = self._conn.execute("SELECT COUNT(*) FROM pending_consultations").fetchone()[0]
+
+        self._flusher: asyncio.Task | None = None
+        self._flush_now = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._retry_delay = 0.0
+        self.stats_counters = Counter()
+
+    # ============ ЖУРНАЛ (SQLite) ============
+
+    def _append(self, payload: str):
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO pending_consultations (payload, logged_at) VALUES (?, ?)",
+                (payload, time.time())
+            )
+
+    def _read_batch(self) -> list[tuple[int, str]]:
+        return self._conn.execute(
+            "SELECT id, payload FROM pending_consultations ORDER BY id LIMIT ?",
+            (self.batch_size,)
+        ).fetchall()
+
+    def _delete(self, ids: list[int]):
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM pending_consultations WHERE id = ?", [(i,) for i in ids]
+            )
+
+    def _mark_attempt(self, ids: list[int]):
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE pending_consultations SET attempts = attempts + 1 WHERE id = ?",
+                [(i,) for i in ids]
+            )
+
+    # ============ ЗАПИСЬ И ОТПРАВКА ============
+
+    async def append(self, consultation: Consultation):
+        """
+        Добавляет консультацию в журнал (в базу она попадёт фоновой задачей)
+
+        Args:
+            consultation: Консультация
+        """
+        await asyncio.to_thread(self._append, consultation.model_dump_json(exclude={'id'}))
+        self.pending += 1
+        self.stats_counters['appended'] += 1
+        self._schedule_flush()
+
+    def start(self):
+        """Запускает отправку записей, оставшихся в журнале с прошлого запуска"""
+        if self.pending:
+            print(f"DEBUG DB: Replaying {self.pending} logged consultations")
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if self.pending >= self.batch_size:
+            self._flush_now.set()
+
+    async def _flush_loop(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(
+                    self._flush_now.wait(), max(self.flush_interval, self._retry_delay)
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """
+        Отправляет записи журнала в базу
+
+        Returns:
+            True, если журнал пуст (все записи отправлены или отклонены)
+        """
+        async with self._lock:
+            while self.pending:
+                batch = await asyncio.to_thread(self._read_batch)
+                if not batch:
+                    self.pending = 0
+                    break
+                ids = [row_id for row_id, _ in batch]
+                records = [Consultation.model_validate_json(payload) for _, payload in batch]
+                try:
+                    await self.repository.create_many(records)
+                except Exception as e:
+                    if not _rejected(e):
+                        return await self._on_failure(ids, e)
+                    # Пачку отклонила база - отправляем записи по одной
+                    if not await self._flush_one_by_one(batch, records):
+                        return False
+                    continue
+
+                await asyncio.to_thread(self._delete, ids)
+                self.pending -= len(ids)
+                self._retry_delay = 0.0
+                self.stats_counters['flushed'] += len(ids)
+                self.stats_counters['batches'] += 1
+            return True
+
+    async def _flush_one_by_one(self, batch: list[tuple[int, str]],
+                                records: list[Consultation]) -> bool:
+        for (row_id, _), record in zip(batch, records):
+            try:
+                await self.repository.create_many([record])
+            except Exception as e:
+                if not _rejected(e):
+                    return await self._on_failure([row_id], e)
+                self.stats_counters['rejected'] += 1
+                print(f"DEBUG DB: Consultation rejected by database: {e}")
+            else:
+                self.stats_counters['flushed'] += 1
+            await asyncio.to_thread(self._delete, [row_id])
+            self.pending -= 1
+        return True
+
+    async def _on_failure(self, ids: list[int], error: Exception) -> bool:
+        await asyncio.to_thread(self._mark_attempt, ids)
+        self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), MAX_RETRY_DELAY)
+        self.stats_counters['errors'] += 1
+        print(f"DEBUG DB: Consultation flush failed, retry in {self._retry_delay:.1f}s: {error}")
+        return False
+
+    async def close(self, timeout: float = 5.0):
+        """Останавливает фоновую задачу, пытаясь отправить остаток журнала"""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self.pending:
+            print(f"DEBUG DB: {self.pending} consultations left in {self.path} for next start")
+        self._conn.close()
+
+    def stats(self) -> dict:
+        """Статистика журнала для метрик"""
+        return {
+            'pending': self.pending,
+            'retry_delay': self._retry_delay,
+            **self.stats_counters
+        }
+
+
+consultation_log = ConsultationLog(
+    consultation_repository,
+    os.getenv("CONSULTATION_LOG_PATH", "consultations.db"),
+    batch_size=int(os.getenv("CONSULTATION_LOG_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("CONSULTATION_LOG_FLUSH_INTERVAL", "2"))
+)
@@ -27,7 +27,8 @@ class Consultation(BaseModel):
     symptoms: str  # JSON строка с симптомами
     questions_answers: str  # JSON строка с вопросами и ответами
     recommended_doctor: str
-    urgency_level: str  # 'low', 'medium', 'high', 'emergency'
+    urgency_level: Optional[str] = None  # 'low', 'medium', 'high', 'emergency'
+    source: Optional[str] = None  # Кто выбрал специалиста: 'ai', 'local', 'degraded', 'default', 'emergency'
     created_at: Optional[datetime] = None
     
     class Config:
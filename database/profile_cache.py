@@ -0,0 +1,74 @@
+"""
+Кэш профилей пользователей
+
+Один и тот же профиль читается при /start, показе профиля, начале
+консультации и перед запросом к AI. Профиль хранится в процессе в компактном
+виде (__slots__) вместе с производными полями (возраст, дата рождения для
+показа), поэтому повторные чтения не обращаются к базе. Все изменения
+профиля проходят через UserRepository, который обновляет кэш после записи.
+"""
+
+from datetime import date, datetime
+
+from database.models import UserProfile
+
+
+# Поля профиля, которые хранятся в кэше (и запрашиваются из базы)
+PROFILE_FIELDS = ('user_id', 'username', 'full_name', 'phone', 'birthdate', 'gender', 'height', 'weight')
+
+
+def age_from_birthdate(birthdate: str | None, today: date | None = None) -> int | None:
+    """
+    Возраст в полных годах
+
+    Args:
+        birthdate: Дата рождения в формате ISO (YYYY-MM-DD)
+        today: Текущая дата (по умолчанию - сегодня)
+    """
+    if not birthdate:
+        return None
+    try:
+        born = datetime.fromisoformat(birthdate).date()
+    except ValueError:
+        return None
+    today = today or date.today()
+    return (today - born).days // 365
+
+
+class CachedProfile:
+    """Профиль пользователя с производными полями"""
+
+    __slots__ = PROFILE_FIELDS + ('age', 'birthdate_text')
+
+    def __init__(self, profile: UserProfile):
+        """
+        Args:
+            profile: Профиль из таблицы user_profiles
+        """
+        for field in PROFILE_FIELDS:
+            setattr(self, field, getattr(profile, field))
+        self._derive()
+
+    def _derive(self):
+        self.age = age_from_birthdate(self.birthdate)
+        self.birthdate_text = (
+            datetime.fromisoformat(self.birthdate).strftime("%d.%m.%Y")
+            if self.age is not None else None
+        )
+
+    def apply(self, fields: dict):
+        """Применяет изменённые поля (после успешной записи в базу)"""
+        for field, value in fields.items():
+            if field in PROFILE_FIELDS:
+                setattr(self, field, value)
+        if 'birthdate' in fields:
+            self._derive()
+
+    def ai_profile(self) -> dict:
+        """Данные профиля для запроса к AI"""
+        return {
+            'gender': self.gender,
+            'age': self.age,
+            'height': self.height,
+            'weight': self.weight
+        }
@@ -0,0 +1,124 @@
+"""
+Асинхронный доступ к данным бота
+
+Репозитории работают с хранилищем, выбранным переменной STORAGE_BACKEND
+(Supabase через PostgREST или локальный SQLite, см. database/storage.py).
+"""
+
+import os
+
+from database.models import Consultation, UserProfile
+from database.profile_cache import PROFILE_FIELDS, CachedProfile
+from database.storage import PostgrestClient, StorageBackend, create_storage
+from services.cache import TTLCache
+
+
+class UserRepository:
+    """Профили пользователей (таблица user_profiles) с кэшем чтения"""
+
+    table = 'user_profiles'
+    # Только поля, которые используют обработчики (без служебных дат)
+    columns = ','.join(PROFILE_FIELDS)
+
+    def __init__(self, storage: StorageBackend, cache_size: int = 10000, cache_ttl: float = 300.0):
+        """
+        Args:
+            storage: Хранилище
+            cache_size: Максимум профилей в кэше
+            cache_ttl: Время жизни профиля в кэше (сек)
+        """
+        self.storage = storage
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        # Номер изменения профиля: чтение, во время которого профиль изменили,
+        # не попадает в кэш (иначе в нём останется строка до изменения)
+        self._versions: dict[int, int] = {}
+
+    async def get(self, user_id: int) -> CachedProfile | None:
+        """Профиль пользователя или None, если он не зарегистрирован"""
+        profile = self.cache.get(user_id)
+        if profile is not None:
+            return profile
+
+        version = self._versions.get(user_id, 0)
+        rows = await self.storage.select(
+            self.table, columns=self.columns, filters={'user_id': user_id}, limit=1
+        )
+        if not rows:
+            return None
+        profile = CachedProfile(UserProfile.model_validate(rows[0]))
+        if self._versions.get(user_id, 0) == version:
+            self.cache.set(user_id, profile)
+        return profile
+
+    async def exists(self, user_id: int) -> bool:
+        """Зарегистрирован ли пользователь (профиль заодно попадает в кэш)"""
+        return await self.get(user_id) is not None
+
+    async def create(self, profile: UserProfile):
+        """Сохраняет новый профиль"""
+        await self.storage.insert(self.table, profile.model_dump(mode='json', exclude_none=True))
+        self.cache.set(profile.user_id, CachedProfile(profile))
+
+    async def update(self, user_id: int, fields: dict):
+        """Изменяет поля профиля"""
+        # Номер меняется до и после записи: чтения, пересекающиеся с ней, не кэшируются
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        try:
+            await self.storage.update(self.table, fields, {'user_id': user_id})
+        except Exception:
+            # Неизвестно, применилась ли запись - следующее чтение пойдёт в базу
+            self.cache.pop(user_id)
+            raise
+        finally:
+            self._versions[user_id] += 1
+        profile = self.cache.peek(user_id)
+        if profile is not None:
+            profile.apply(fields)
+
+    def cache_stats(self) -> dict:
+        """Метрики кэша профилей (для эндпоинта /metrics)"""
+        return self.cache.stats()
+
+
+class ConsultationRepository:
+    """История консультаций (таблица consultations)"""
+
+    table = 'consultations'
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+
+    async def create_many(self, consultations: list[Consultation]):
+        """Сохраняет консультации одной вставкой"""
+        # У всех строк пачки одинаковый набор ключей (этого требует PostgREST)
+        await self.storage.insert(
+            self.table, [c.model_dump(mode='json', exclude={'id'}) for c in consultations]
+        )
+
+    async def recent(self, columns: str = 'symptoms,recommended_doctor,urgency_level,source',
+                     limit: int = 1000) -> list[dict]:
+        """
+        Последние консультации, новые первыми
+
+        Args:
+            columns: Столбцы через запятую
+            limit: Максимум строк
+        """
+        return await self.storage.select(
+            self.table, columns=columns, order='created_at.desc', limit=limit
+        )
+
+    async def recent_symptoms(self, limit: int = 1000) -> list[str]:
+        """Симптомы (JSON) последних консультаций, новые первыми"""
+        rows = await self.recent(columns='symptoms', limit=limit)
+        return [row['symptoms'] for row in rows if row.get('symptoms')]
+
+
+# Общее хранилище и репозитории для всех обработчиков
+storage = create_storage()
+user_repository = UserRepository(
+    storage,
+    cache_size=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+    cache_ttl=float(os.getenv("PROFILE_CACHE_TTL", "300"))
+)
+consultation_repository = ConsultationRepository(storage)
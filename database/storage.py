@@ -0,0 +1,289 @@
+"""
+Хранилища данных бота (таблицы user_profiles, consultations, messages)
+
+Репозитории работают с хранилищем через общий интерфейс StorageBackend
+(select / insert / update с условиями равенства). Реализации:
+
+- PostgrestClient - Supabase через PostgREST (по умолчанию);
+- SQLiteStorage - локальный файл SQLite в режиме WAL: без сети, для
+  развёртывания на одном сервере и нагрузочных тестов.
+
+Выбор - переменная окружения STORAGE_BACKEND (supabase или sqlite).
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import httpx
+
+
+class StorageBackend(ABC):
+    """Интерфейс хранилища (фильтры - только по равенству)"""
+
+    @abstractmethod
+    async def select(self, table: str, columns: str = '*', filters: dict | None = None,
+                     order: str | None = None, limit: int | None = None) -> list[dict]:
+        """
+        Строки таблицы
+
+        Args:
+            table: Таблица
+            columns: Столбцы через запятую
+            filters: Столбец -> значение (условия равенства)
+            order: Сортировка в формате PostgREST (например, 'created_at.desc')
+            limit: Максимум строк
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert(self, table: str, rows: dict | list[dict]):
+        """Добавляет одну или несколько строк"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update(self, table: str, values: dict, filters: dict):
+        """Изменяет строки, подходящие под фильтры"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Освобождает соединения"""
+
+
+# ============ SUPABASE (POSTGREST) ============
+
+class PostgrestClient(StorageBackend):
+    """
+    Минимальный асинхронный клиент PostgREST
+
+    Синхронный клиент supabase-py блокирует цикл событий на время каждого
+    запроса, поэтому запросы идут напрямую через общий пул keep-alive
+    соединений httpx с таймаутами.
+    """
+
+    def __init__(self, url: str, key: str, timeout: float = 5.0, max_connections: int = 20):
+        """
+        Args:
+            url: URL проекта Supabase
+            key: Ключ API
+            timeout: Таймаут запроса (сек)
+            max_connections: Размер пула соединений
+        """
+        self.http_client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={
+                'apikey': key,
+                'Authorization': f"Bearer {key}",
+                'Content-Type': 'application/json'
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        )
+
+    @staticmethod
+    def _params(filters: dict) -> dict:
+        return {column: f"eq.{value}" for column, value in filters.items()}
+
+    async def select(self, table: str, columns: str = '*', filters: dict | None = None,
+                     order: str | None = None, limit: int | None = None) -> list[dict]:
+        params = {'select': columns, **self._params(filters or {})}
+        if order:
+            params['order'] = order
+        if limit is not None:
+            params['limit'] = str(limit)
+        response = await self.http_client.get(f"/{table}", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def insert(self, table: str, rows: dict | list[dict]):
+        response = await self.http_client.post(
+            f"/{table}", json=rows, headers={'Prefer': 'return=minimal'}
+        )
+        response.raise_for_status()
+
+    async def update(self, table: str, values: dict, filters: dict):
+        response = await self.http_client.patch(
+            f"/{table}", params=self._params(filters), json=values,
+            headers={'Prefer': 'return=minimal'}
+        )
+        response.raise_for_status()
+
+    async def close(self):
+        await self.http_client.aclose()
+
+
+# ============ SQLITE ============
+
+# Схема supabase_schema.sql в синтаксисе SQLite
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    full_name TEXT,
+    phone TEXT,
+    birthdate TEXT,
+    age INTEGER,
+    gender TEXT CHECK (gender IN ('male', 'female', 'other')),
+    height INTEGER,
+    weight REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS consultations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES user_profiles(user_id) ON DELETE CASCADE,
+    symptoms TEXT NOT NULL,
+    questions_answers TEXT NOT NULL,
+    recommended_doctor TEXT NOT NULL,
+    urgency_level TEXT CHECK (urgency_level IN ('low', 'medium', 'high', 'emergency')),
+    source TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES user_profiles(user_id) ON DELETE CASCADE,
+    consultation_id INTEGER REFERENCES consultations(id) ON DELETE SET NULL,
+    role TEXT CHECK (role IN ('user', 'assistant')),
+    content TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_consultations_user_id ON consultations(user_id);
+CREATE INDEX IF NOT EXISTS idx_consultations_created_at ON consultations(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id);
+CREATE INDEX IF NOT EXISTS idx_messages_consultation_id ON messages(consultation_id);
+"""
+
+# Столбцы, добавленные после создания схемы: (таблица, столбец, тип)
+SQLITE_ADDED_COLUMNS = [
+    ('consultations', 'source', 'TEXT'),
+]
+
+_IDENTIFIER_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def _identifier(name: str) -> str:
+    """Проверяет имя таблицы или столбца (в SQL оно подставляется как текст)"""
+    name = name.strip()
+    if not _IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return name
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Хранилище в локальном файле SQLite
+
+    Запросы выполняются в потоке, чтобы запись на диск не блокировала цикл
+    событий; одно соединение защищено блокировкой, поэтому транзакции разных
+    запросов не смешиваются.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Файл базы данных
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._add_missing_columns()
+        self._lock = threading.Lock()
+
+    def _add_missing_columns(self):
+        """Добавляет новые столбцы в файл, созданный прежней версией схемы"""
+        for table, column, column_type in SQLITE_ADDED_COLUMNS:
+            existing = {row['name'] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+
+    def _run(self, sql: str, params: list | tuple = (), many: bool = False) -> list[dict]:
+        with self._lock, self._conn:
+            if many:
+                self._conn.executemany(sql, params)
+                return []
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    @staticmethod
+    def _where(filters: dict) -> tuple[str, list]:
+        if not filters:
+            return '', []
+        clause = ' AND '.join(f"{_identifier(column)} = ?" for column in filters)
+        return f" WHERE {clause}", list(filters.values())
+
+    async def select(self, table: str, columns: str = '*', filters: dict | None = None,
+                     order: str | None = None, limit: int | None = None) -> list[dict]:
+        if columns.strip() != '*':
+            columns = ', '.join(_identifier(column) for column in columns.split(','))
+        where, params = self._where(filters or {})
+        sql = f"SELECT {columns} FROM {_identifier(table)}{where}"
+        if order:
+            column, _, direction = order.partition('.')
+            sql += f" ORDER BY {_identifier(column)} {'DESC' if direction == 'desc' else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return await asyncio.to_thread(self._run, sql, params)
+
+    async def insert(self, table: str, rows: dict | list[dict]):
+        rows = [rows] if isinstance(rows, dict) else rows
+        if not rows:
+            return
+        columns = [_identifier(column) for column in rows[0]]
+        sql = (f"INSERT INTO {_identifier(table)} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        await asyncio.to_thread(
+            self._run, sql, [tuple(row[column] for column in columns) for row in rows], True
+        )
+
+    async def update(self, table: str, values: dict, filters: dict):
+        assignments = ', '.join(f"{_identifier(column)} = ?" for column in values)
+        where, params = self._where(filters)
+        sql = f"UPDATE {_identifier(table)} SET {assignments}{where}"
+        await asyncio.to_thread(self._run, sql, [*values.values(), *params])
+
+    def _close(self):
+        with self._lock:
+            self._conn.close()
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+
+def create_storage() -> StorageBackend:
+    """
+    Хранилище по переменным окружения
+
+    STORAGE_BACKEND: supabase (по умолчанию) или sqlite (файл STORAGE_PATH)
+    """
+    kind = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    if kind == "sqlite":
+        return SQLiteStorage(os.getenv("STORAGE_PATH", "bot.db"))
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError(
+            "Missing Supabase credentials. "
+            "Please set SUPABASE_URL and SUPABASE_KEY environment variables "
+            "(or STORAGE_BACKEND=sqlite)."
+        )
+    return PostgrestClient(
+        url,
+        key,
+        timeout=float(os.getenv("DB_TIMEOUT", "5")),
+        max_connections=int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+    )
@@ -7,6 +7,10 @@ from aiogram.enums import ParseMode
 
 from config import BOT_TOKEN
 from bot.handlers import basic, profile, consultation, specialists
+from services.ai_service import ai_service
+from services.ai_workers import AIWorkerPool
+from database.consultation_log import consultation_log
+from database.repositories import storage, user_repository
 
 
 # Настройка логирования
@@ -35,8 +39,17 @@ dp.include_router(consultation.router) # Консультации (должен
 
 # HTTP сервер для Render (Health check)
 async def health_check(request):
-    """Endpoint для проверки здоровья сервиса"""
-    return web.Response(text="OK", status=200)
+    """Endpoint для проверки здоровья сервиса (и состояния интеграции с AI)"""
+    return web.json_response(ai_service.get_health(), status=200)
+
+
+async def metrics(request):
+    """Endpoint с метриками сервисов (JSON)"""
+    return web.json_response({
+        **ai_service.get_stats(),
+        'profile_cache': user_repository.cache_stats(),
+        'consultation_log': consultation_log.stats()
+    })
 
 
 async def start_bot():
@@ -44,6 +57,13 @@ async def start_bot():
     try:
         logger.info("Starting bot...")
         
+        # Процессы AI запускаются заранее, чтобы первый пользователь не ждал их старта
+        if isinstance(ai_service, AIWorkerPool):
+            await ai_service.start()
+        
+        # Консультации, не отправленные в базу до остановки, отправляются сейчас
+        consultation_log.start()
+        
         # Удаляем старые вебхуки (если есть)
         await bot.delete_webhook(drop_pending_updates=True)
         
@@ -56,6 +76,9 @@ async def start_bot():
         raise
     finally:
         await bot.session.close()
+        await ai_service.close()
+        await consultation_log.close()
+        await storage.close()
 
 
 async def start_web_server():
@@ -63,6 +86,7 @@ async def start_web_server():
     app = web.Application()
     app.router.add_get('/health', health_check)
     app.router.add_get('/', health_check)
+    app.router.add_get('/metrics', metrics)
     
     runner = web.AppRunner(app)
     await runner.setup()
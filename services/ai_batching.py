@@ -0,0 +1,103 @@
+"""
+Микропакетирование: запросы, пришедшие в течение короткого окна,
+обрабатываются одним вызовом
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class MicroBatcher:
+    """
+    Собирает элементы в пакет и передаёт их обработчику одним вызовом
+
+    Пакет отправляется, когда истекло окно ожидания (отсчёт от первого
+    элемента) или набралось max_size элементов. Каждый вызывающий получает
+    свой результат из списка, возвращённого обработчиком.
+    """
+
+    def __init__(self, handler: Callable[[list], Awaitable[list]],
+                 window: float = 0.02, max_size: int = 8):
+        """
+        Args:
+            handler: Обрабатывает список элементов, возвращает список результатов того же размера
+            window: Окно сбора пакета (секунды)
+            max_size: Максимальный размер пакета
+        """
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+        self._items: list = []
+        self._futures: list[asyncio.Future] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Добавляет элемент в текущий пакет и ждёт его результат
+
+        Args:
+            item: Элемент для обработки
+
+        Returns:
+            Результат обработчика для этого элемента
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append(item)
+        self._futures.append(future)
+
+        if len(self._items) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Отменённые ожидающие не попадают в пакет
+        batch = [(item, future) for item, future in zip(self._items, self._futures)
+                 if not future.done()]
+        self._items, self._futures = [], []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            results = await self.handler(items)
+            if len(results) != len(items):
+                raise ValueError(f"batch handler returned {len(results)} results for {len(items)} items")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'pending': len(self._items)
+        }
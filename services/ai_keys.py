@@ -0,0 +1,208 @@
+"""
+Пул API-ключей Groq с учётом квоты каждого ключа
+
+Лимиты Groq действуют на аккаунт, поэтому несколько ключей (GROQ_API_KEYS)
+увеличивают пропускную способность. После каждого ответа остаток запросов
+и токенов ключа берётся из заголовков x-ratelimit-*. Для запроса выбирается
+ключ с наибольшим запасом (с учётом уже выполняющихся запросов); исчерпанный
+ключ или ключ, получивший 429, исключается из ротации до времени сброса.
+"""
+
+import os
+import re
+import time
+
+import httpx
+from groq import AsyncGroq
+
+
+_DURATION_RE = re.compile(r'([\d.]+)(ms|h|m|s)')
+_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+# Пауза для ключа после 429 без заголовков о времени сброса (сек)
+DEFAULT_COOLDOWN = 10.0
+
+
+def parse_reset(value: str | None) -> float | None:
+    """
+    Время до сброса лимита из заголовка Groq в секундах
+
+        >>> parse_reset('2m59.56s'), parse_reset('7.66s'), parse_reset('120ms')
+        (179.56, 7.66, 0.12)
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return round(sum(float(number) * _UNITS[unit] for number, unit in parts), 3)
+
+
+def _header_int(headers: httpx.Headers, name: str) -> int | None:
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class GroqKey:
+    """Ключ API, его клиент и последняя известная квота"""
+
+    def __init__(self, label: str, client: AsyncGroq):
+        self.label = label
+        self.client = client
+        # Квота из заголовков последнего ответа (None - неизвестна)
+        self.limit_requests: int | None = None
+        self.limit_tokens: int | None = None
+        self.remaining_requests: int | None = None
+        self.remaining_tokens: int | None = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        # Ключ исключён из ротации до этого момента (time.monotonic)
+        self.disabled_until = 0.0
+        # Выполняющиеся запросы и зарезервированные ими токены
+        self.in_flight = 0
+        self.reserved_tokens = 0
+        # Метрики
+        self.requests = 0
+        self.tokens_used = 0
+        self.rate_limited = 0
+
+    def headroom(self, now: float) -> float:
+        """Доля оставшейся квоты (0..1) за вычетом выполняющихся запросов"""
+        shares = [1.0]
+        if self.remaining_requests is not None and self.limit_requests and now < self.requests_reset_at:
+            shares.append((self.remaining_requests - self.in_flight) / self.limit_requests)
+        if self.remaining_tokens is not None and self.limit_tokens and now < self.tokens_reset_at:
+            shares.append((self.remaining_tokens - self.reserved_tokens) / self.limit_tokens)
+        return min(shares)
+
+
+class KeyPool:
+    """Выбор ключа Groq для запроса и учёт квоты по заголовкам ответов"""
+
+    def __init__(self, api_keys: list[str], http_client: httpx.AsyncClient):
+        """
+        Args:
+            api_keys: Ключи API Groq
+            http_client: Общий пул HTTP-соединений
+        """
+        if not api_keys:
+            raise ValueError("GROQ_API_KEYS or GROQ_API_KEY environment variable is not set")
+        # Повторы выполняет AIService (с бюджетом и выключателем), а не SDK;
+        # в метриках ключ виден по номеру и последним символам
+        self.keys = [
+            GroqKey(f"#{i + 1} ...{key[-4:]}",
+                    AsyncGroq(api_key=key, http_client=http_client, max_retries=0))
+            for i, key in enumerate(api_keys)
+        ]
+        self.exhausted = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def available(self) -> int:
+        """Количество ключей в ротации"""
+        now = time.monotonic()
+        return sum(1 for key in self.keys if key.disabled_until <= now)
+
+    def acquire(self, tokens: int) -> GroqKey:
+        """
+        Выбирает ключ с наибольшим запасом и резервирует на нём запрос
+
+        Если все ключи исключены из ротации, возвращается ключ с ближайшим сбросом.
+
+        Args:
+            tokens: Оценка токенов запроса
+        """
+        now = time.monotonic()
+        active = [key for key in self.keys if key.disabled_until <= now]
+        if active:
+            key = max(active, key=lambda k: (k.headroom(now), -k.in_flight))
+        else:
+            key = min(self.keys, key=lambda k: k.disabled_until)
+        key.in_flight += 1
+        key.reserved_tokens += tokens
+        return key
+
+    def release(self, key: GroqKey, tokens: int, headers: httpx.Headers | None = None,
+                used_tokens: int | None = None):
+        """
+        Снимает резерв запроса и обновляет квоту ключа по заголовкам ответа
+
+        Args:
+            key: Ключ из acquire
+            tokens: Зарезервированные токены
+            headers: Заголовки ответа Groq (None - ответа нет)
+            used_tokens: Фактически израсходованные токены
+        """
+        key.in_flight -= 1
+        key.reserved_tokens -= tokens
+        if headers is None:
+            return
+        key.requests += 1
+        if used_tokens:
+            key.tokens_used += used_tokens
+
+        now = time.monotonic()
+        for kind in ('requests', 'tokens'):
+            limit = _header_int(headers, f'x-ratelimit-limit-{kind}')
+            remaining = _header_int(headers, f'x-ratelimit-remaining-{kind}')
+            reset = parse_reset(headers.get(f'x-ratelimit-reset-{kind}'))
+            if limit is not None:
+                setattr(key, f'limit_{kind}', limit)
+            if remaining is None:
+                continue
+            setattr(key, f'remaining_{kind}', remaining)
+            reset_at = now + (reset if reset is not None else 60.0)
+            setattr(key, f'{kind}_reset_at', reset_at)
+            if remaining <= 0:
+                self._disable(key, reset_at)
+
+    def on_rate_limited(self, key: GroqKey, headers: httpx.Headers | None = None):
+        """Исключает ключ из ротации после ответа 429"""
+        key.rate_limited += 1
+        headers = headers or httpx.Headers()
+        delay = (parse_reset(headers.get('retry-after'))
+                 or parse_reset(headers.get('x-ratelimit-reset-tokens'))
+                 or DEFAULT_COOLDOWN)
+        self._disable(key, time.monotonic() + delay)
+
+    def _disable(self, key: GroqKey, until: float):
+        if until > key.disabled_until:
+            self.exhausted += 1
+            print(f"DEBUG AI: Groq key {key.label} out of rotation for {until - time.monotonic():.1f}s")
+        key.disabled_until = max(key.disabled_until, until)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            'available': self.available(),
+            'exhausted': self.exhausted,
+            'keys': {
+                key.label: {
+                    'requests': key.requests,
+                    'tokens': key.tokens_used,
+                    'rate_limited': key.rate_limited,
+                    'in_flight': key.in_flight,
+                    'remaining_requests': key.remaining_requests,
+                    'remaining_tokens': key.remaining_tokens,
+                    'headroom': round(key.headroom(now), 3),
+                    'disabled_for': round(max(0.0, key.disabled_until - now), 1)
+                }
+                for key in self.keys
+            }
+        }
+
+
+def api_keys_from_env() -> list[str]:
+    """Ключи из GROQ_API_KEYS (через запятую) или единственный GROQ_API_KEY"""
+    keys = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(',') if key.strip()]
+    if not keys and os.getenv("GROQ_API_KEY"):
+        keys = [os.getenv("GROQ_API_KEY")]
+    # Один и тот же ключ дважды не увеличивает квоту
+    return list(dict.fromkeys(keys))
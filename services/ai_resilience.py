@@ -0,0 +1,118 @@
+"""
+Устойчивость интеграции с Groq: повторы с джиттером, бюджет повторов,
+автоматический выключатель (circuit breaker) по методам
+"""
+
+import random
+import time
+
+
+class AIUnavailableError(Exception):
+    """AI недоступен: выключатель разомкнут или исчерпаны попытки"""
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 5.0) -> float:
+    """Задержка перед повтором: экспоненциальная с полным джиттером"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryBudget:
+    """
+    Глобальный бюджет повторов: каждый запрос пополняет бюджет на ratio,
+    каждый повтор расходует единицу. Не даёт повторам умножить нагрузку
+    во время сбоя.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 5.0):
+        """
+        Args:
+            ratio: Доля повторов относительно запросов
+            reserve: Максимальный запас повторов (и начальный баланс)
+        """
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = reserve
+        self.retries = 0
+        self.denied = 0
+
+    def record_request(self):
+        self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def try_retry(self) -> bool:
+        """Расходует единицу бюджета, если она есть"""
+        if self.balance >= 1:
+            self.balance -= 1
+            self.retries += 1
+            return True
+        self.denied += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            'balance': round(self.balance, 2),
+            'retries': self.retries,
+            'denied': self.denied
+        }
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель: после failure_threshold ошибок подряд
+    размыкается на reset_timeout секунд, затем пропускает один пробный запрос
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_cancel(self):
+        """Запрос отменён без результата - освобождаем пробный слот"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,102 @@
+"""
+Маршрутизация запросов по моделям и хеджирование медленных запросов
+
+Каждому методу AIService назначены основная и резервная модели. По каждой
+модели отслеживается скользящая задержка; если запрос выполняется дольше
+текущего p95 основной модели, дублирующий запрос отправляется в резервную
+модель и используется ответ, пришедший первым.
+"""
+
+from collections import deque
+
+from services.ai_resilience import RetryBudget
+
+
+class LatencyTracker:
+    """Скользящее окно задержек модели"""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.total = 0
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+        self.total += 1
+
+    def percentile(self, p: float) -> float | None:
+        """p-й перцентиль (0..100) или None, если замеров нет"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ModelRouter:
+    """Выбор модели по методу и решение о хеджировании"""
+
+    def __init__(self, routes: dict[str, tuple[str, str | None]], default: tuple[str, str | None],
+                 min_samples: int = 20, hedge_ratio: float = 0.1):
+        """
+        Args:
+            routes: Метод -> (основная модель, резервная модель или None)
+            default: Маршрут для методов, которых нет в routes
+            min_samples: Минимум замеров модели, после которого включается хеджирование
+            hedge_ratio: Доля запросов, которые можно продублировать
+        """
+        self.routes = routes
+        self.default = default
+        self.min_samples = min_samples
+        self.latency: dict[str, LatencyTracker] = {}
+        # Бюджет дублей: хеджирование не должно удваивать нагрузку при общей деградации
+        self.hedge_budget = RetryBudget(ratio=hedge_ratio, reserve=3)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def route(self, method: str) -> tuple[str, str | None]:
+        """(основная модель, резервная модель) для метода"""
+        return self.routes.get(method, self.default)
+
+    def record(self, model: str, latency: float):
+        """Учитывает задержку выполненного запроса"""
+        if model not in self.latency:
+            self.latency[model] = LatencyTracker()
+        self.latency[model].record(latency)
+
+    def hedge_delay(self, method: str) -> float | None:
+        """
+        Через сколько секунд дублировать запрос метода
+
+        Returns:
+            Текущий p95 основной модели или None, если хеджирование невозможно
+            (нет резервной модели или недостаточно замеров)
+        """
+        self.hedge_budget.record_request()
+        primary, backup = self.route(method)
+        tracker = self.latency.get(primary)
+        if not backup or tracker is None or len(tracker.samples) < self.min_samples:
+            return None
+        return tracker.percentile(95)
+
+    def try_hedge(self) -> bool:
+        """Расходует бюджет на дублирующий запрос"""
+        if self.hedge_budget.try_retry():
+            self.hedges += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        models = {}
+        for model, tracker in self.latency.items():
+            p50, p95 = tracker.percentile(50), tracker.percentile(95)
+            models[model] = {
+                'requests': tracker.total,
+                'p50': round(p50, 3) if p50 is not None else None,
+                'p95': round(p95, 3) if p95 is not None else None
+            }
+        return {
+            'routes': {method: list(route) for method, route in self.routes.items()},
+            'models': models,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_denied': self.hedge_budget.denied
+        }
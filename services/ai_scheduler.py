@@ -0,0 +1,185 @@
+"""
+Локальный планировщик запросов к Groq: лимиты RPM/TPM и очередь с приоритетами
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+# Приоритеты (меньше - важнее)
+PRIORITY_EMERGENCY = 0   # Случаи с признаками неотложного состояния
+PRIORITY_RECOMMEND = 1   # Финальная рекомендация врача
+PRIORITY_VALIDATE = 2    # Проверка симптомов (пользователь ждёт ответа)
+PRIORITY_GENERATE = 3    # Подбор дополнительных симптомов
+PRIORITY_IMPROVE = 4     # Улучшение формулировки
+
+PRIORITY_NAMES = {
+    PRIORITY_EMERGENCY: 'emergency',
+    PRIORITY_RECOMMEND: 'recommend',
+    PRIORITY_VALIDATE: 'validate',
+    PRIORITY_GENERATE: 'generate',
+    PRIORITY_IMPROVE: 'improve',
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (кириллица ~3 символа на токен)"""
+    return len(text) // 3 + 1
+
+
+class TokenBucket:
+    """Ведро токенов с равномерным пополнением"""
+    
+    def __init__(self, capacity: float, per_minute: float):
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+        self.tokens = capacity
+        self._updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в ведре наберётся amount"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float('inf')
+    
+    def consume(self, amount: float):
+        """Списывает токены (баланс может уйти в минус - тогда следующие запросы подождут)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+    
+    def drain(self):
+        """Обнуляет ведро (после ответа 429 от Groq)"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class AIScheduler:
+    """
+    Выдаёт разрешения на запросы к Groq в порядке приоритета,
+    не превышая лимиты запросов и токенов в минуту и число одновременных запросов
+    """
+    
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int):
+        self.requests = TokenBucket(rpm, rpm)
+        self.tokens = TokenBucket(tpm, tpm)
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        
+        self._queue: list[tuple[int, int, asyncio.Future, int]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        
+        # Метрики
+        self.max_queue_depth = 0
+        self.granted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.rate_limited = 0
+        self._waits: deque[float] = deque(maxlen=1000)
+    
+    @asynccontextmanager
+    async def slot(self, priority: int, tokens: int):
+        """
+        Ожидает разрешения на запрос
+        
+        Args:
+            priority: Приоритет (PRIORITY_*)
+            tokens: Оценка токенов запроса (промпт + ожидаемый ответ)
+        
+        Yields:
+            Функцию report_usage(actual_tokens) для корректировки TPM по факту
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self._queue, (priority, next(self._seq), future, tokens))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._dispatch()
+        
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Разрешение уже выдано, но задачу отменили - возвращаем слот
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        
+        self._waits.append(time.monotonic() - enqueued_at)
+        self.granted[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        
+        def report_usage(actual_tokens: int):
+            self.tokens.consume(actual_tokens - tokens)
+        
+        try:
+            yield report_usage
+        finally:
+            self._release()
+    
+    def on_rate_limited(self):
+        """Groq всё же вернул 429 - приостанавливаем выдачу до пополнения вёдер"""
+        self.rate_limited += 1
+        self.requests.drain()
+        self.tokens.drain()
+    
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+    
+    def _dispatch(self):
+        """Выдаёт разрешения ожидающим запросам, пока позволяют лимиты"""
+        while self._queue and self.running < self.max_concurrency:
+            priority, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                self._schedule(wait)
+                return
+            
+            heapq.heappop(self._queue)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self.running += 1
+            future.set_result(None)
+    
+    def _schedule(self, delay: float):
+        """Повторная попытка выдачи, когда вёдра пополнятся"""
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        
+        def fire():
+            self._timer = None
+            self._dispatch()
+        
+        self._timer = loop.call_at(when, fire)
+    
+    def stats(self) -> dict:
+        """Метрики очереди для /metrics"""
+        waits = sorted(self._waits)
+        return {
+            'queue_depth': sum(1 for _, _, future, _ in self._queue if not future.done()),
+            'max_queue_depth': self.max_queue_depth,
+            'running': self.running,
+            'requests_available': round(self.requests.tokens, 1),
+            'tokens_available': round(self.tokens.tokens, 1),
+            'granted': dict(self.granted),
+            'rate_limited': self.rate_limited,
+            'wait_avg': round(sum(waits) / len(waits), 3) if waits else 0.0,
+            'wait_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+            'wait_max': round(waits[-1], 3) if waits else 0.0
+        }
@@ -0,0 +1,87 @@
+"""
+Схемы структурированных ответов AI (pydantic)
+"""
+
+from typing import Literal
+
+from pydantic import BaseModel, ValidationInfo, field_validator, model_validator
+
+
+class IntakeResult(BaseModel):
+    """Результат объединённой проверки и улучшения симптомов"""
+    is_valid: bool
+    reason: str = ""
+    improved: str = ""
+
+    @field_validator('reason', 'improved', mode='before')
+    @classmethod
+    def none_to_empty(cls, value):
+        return value or ""
+
+
+class ValidationResult(BaseModel):
+    """Результат проверки: описывает ли текст симптомы"""
+    is_valid: bool
+    symptoms: str = ""
+    reason: str = ""
+
+    @field_validator('symptoms', 'reason', mode='before')
+    @classmethod
+    def none_to_empty(cls, value):
+        return value or ""
+
+
+class BatchValidationItem(ValidationResult):
+    """Результат проверки одного сообщения пакета"""
+    id: int
+
+
+class BatchValidationResult(BaseModel):
+    """Результаты пакетной проверки"""
+    results: list[BatchValidationItem]
+
+
+class AdditionalSymptoms(BaseModel):
+    """Дополнительные симптомы для уточнения"""
+    symptoms: list[str]
+
+    @model_validator(mode='before')
+    @classmethod
+    def accept_bare_list(cls, data):
+        # Старый формат ответа - JSON-массив без обёртки
+        if isinstance(data, list):
+            return {'symptoms': data}
+        return data
+
+    @field_validator('symptoms', mode='before')
+    @classmethod
+    def drop_non_strings(cls, value):
+        if isinstance(value, list):
+            return [item for item in value if isinstance(item, str)]
+        return value
+
+
+class Recommendation(BaseModel):
+    """Рекомендация специалиста"""
+    specialist: str
+    urgency: Literal['emergency', 'high', 'medium', 'low'] = 'medium'
+    reasoning: str = ""
+
+    @field_validator('specialist')
+    @classmethod
+    def known_specialist(cls, value: str, info: ValidationInfo) -> str:
+        # Список допустимых специалистов передаётся через context
+        specialists = (info.context or {}).get('specialists')
+        if specialists and value not in specialists:
+            raise ValueError(f"специалист '{value}' не из списка")
+        return value
+
+    @field_validator('urgency', mode='before')
+    @classmethod
+    def normalize_urgency(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @field_validator('reasoning', mode='before')
+    @classmethod
+    def none_to_empty(cls, value):
+        return value or ""
@@ -1,44 +1,618 @@
 import os
-import json
-import re
-from groq import Groq
+import asyncio
+import hashlib
+from collections import defaultdict
+from typing import TypeVar
+
+import httpx
+from groq import APIConnectionError, APIStatusError, RateLimitError
+from pydantic import BaseModel
+
+from services.ai_batching import MicroBatcher
+from services.ai_keys import KeyPool, api_keys_from_env
+from services.ai_router import ModelRouter
+from services.ai_schemas import (
+    AdditionalSymptoms,
+    BatchValidationResult,
+    IntakeResult,
+    Recommendation,
+    ValidationResult,
+)
+from services.structured_output import StructuredOutputError, parse_structured
+from services.ai_sessions import ai_sessions
+from services.prompts import Prompt, PromptRegistry, PROMPT_TEXTS, TOKEN_BUDGETS
+from services.json_stream import parse_partial_object
+from services.cache import TTLCache
+from services.russian_text import normalize_symptoms
+from services.singleflight import SingleFlight
+from services.suggestion_store import create_suggestion_store
+from services.symptom_lexicon import SymptomLexicon
+from services.red_flags import detect_red_flags
+from services.triage import TriageEngine
+from services.ai_resilience import (
+    AIUnavailableError,
+    CircuitBreaker,
+    RetryBudget,
+    backoff_delay,
+)
+from services.ai_scheduler import (
+    AIScheduler,
+    estimate_tokens,
+    PRIORITY_EMERGENCY,
+    PRIORITY_RECOMMEND,
+    PRIORITY_VALIDATE,
+    PRIORITY_GENERATE,
+    PRIORITY_IMPROVE,
+)
+
+
+SchemaT = TypeVar('SchemaT', bound=BaseModel)
+
+# Ответ модели, показываемый ей при повторной попытке исправить JSON (символов)
+REPAIR_ECHO_CHARS = 1500
+
+
+# Специалисты, которых может рекомендовать бот
+SPECIALISTS = [
+    "Кардиолог", "Невролог", "Гастроэнтеролог", "Эндокринолог", 
+    "Пульмонолог", "Уролог", "Гинеколог", "Дерматолог", 
+    "Офтальмолог", "Отоларинголог (ЛОР)", "Ортопед-травматолог", 
+    "Ревматолог", "Аллерголог-иммунолог", "Психиатр", "Онколог", 
+    "Хирург", "Проктолог", "Маммолог", "Нефролог", "Терапевт"
+]
+
+# Минимальная уверенность локального триажа для ответа без AI (>1 - всегда AI)
+TRIAGE_THRESHOLD = float(os.getenv("AI_TRIAGE_THRESHOLD", "0.75"))
+
+# Группы давности симптомов (соответствуют кнопкам get_duration_keyboard)
+DURATION_BUCKETS = {
+    'меньше 24 часов': 'lt_24h',
+    '1-3 дня': '1_3d',
+    '3-7 дней': '3_7d',
+    'больше недели': 'gt_7d',
+    'не указана': 'any',
+}
+
+# Приоритет запросов в очереди к Groq по методам
+METHOD_PRIORITIES = {
+    'recommend_doctor': PRIORITY_RECOMMEND,
+    'analyze_symptoms': PRIORITY_VALIDATE,
+    'validate_symptoms': PRIORITY_VALIDATE,
+    'generate_additional_symptoms': PRIORITY_GENERATE,
+    'improve_symptoms_text': PRIORITY_IMPROVE,
+}
+
+# Модели Groq: основная и резервная (для хеджирования медленных запросов) по методам
+DEFAULT_MODEL = os.getenv("AI_MODEL", "llama-3.1-8b-instant")
+BACKUP_MODEL = os.getenv("AI_BACKUP_MODEL", "llama-3.3-70b-versatile") or None
+
+MODEL_ROUTES = {
+    'recommend_doctor': (DEFAULT_MODEL, BACKUP_MODEL),
+    'analyze_symptoms': (DEFAULT_MODEL, BACKUP_MODEL),
+    'validate_symptoms': (DEFAULT_MODEL, BACKUP_MODEL),
+    'generate_additional_symptoms': (DEFAULT_MODEL, BACKUP_MODEL),
+    'improve_symptoms_text': (DEFAULT_MODEL, BACKUP_MODEL),
+}
+
+# Ожидаемый размер ответа (токенов) для предварительного резервирования TPM
+# (не больше максимума ответа из бюджета промпта)
+EXPECTED_COMPLETION_TOKENS = 300
+
+# Давность для предварительной генерации, пока пользователь выбирает вариант
+ANY_DURATION = 'не указана'
+
+# Сколько хранится готовый результат предварительной генерации, если его не забрали (сек)
+PREFETCH_TTL = float(os.getenv("AI_PREFETCH_TTL", "600"))
+
+# Если после проверки осталось меньше симптомов, список дополняется локально
+MIN_ADDITIONAL_SYMPTOMS = 5
 
 
 class AIService:
-    """Сервис для работы с Groq AI"""
+    """Сервис для работы с Groq AI (асинхронный)"""
     
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.model = "llama-3.1-8b-instant"
+        # Таймаут одного вызова AI (секунды) и лимит одновременных запросов
+        self.timeout = float(os.getenv("AI_TIMEOUT", "20"))
+        self.max_concurrency = int(os.getenv("AI_MAX_CONCURRENCY", "10"))
+        
+        # Общий пул HTTP-соединений (keep-alive) для всех запросов к Groq
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=5.0)
+        )
+        # Ключи Groq (GROQ_API_KEYS): запрос уходит в ключ с наибольшим остатком квоты
+        self.keys = KeyPool(api_keys_from_env(), self.http_client)
+        # Режим JSON-ответа Groq для методов со структурированным ответом
+        self.json_mode = os.getenv("AI_JSON_MODE", "true").lower() == "true"
+        # Разбор структурированных ответов по методам: с первой попытки / после исправления / нет
+        self.parse_stats: dict[str, dict] = defaultdict(
+            lambda: {'parsed': 0, 'repaired': 0, 'failed': 0}
+        )
+        # Системные промпты (версии, варианты для A/B, бюджеты токенов)
+        self.prompts = PromptRegistry(
+            PROMPT_TEXTS,
+            TOKEN_BUDGETS,
+            compact_ratio=float(os.getenv("AI_PROMPT_COMPACT_RATIO", "0")),
+            specialists=', '.join(SPECIALISTS)
+        )
+        # Модели по методам, задержки моделей и хеджирование медленных запросов
+        self.router = ModelRouter(
+            MODEL_ROUTES,
+            default=(DEFAULT_MODEL, BACKUP_MODEL),
+            min_samples=int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20")),
+            hedge_ratio=float(os.getenv("AI_HEDGE_RATIO", "0.1"))
+        )
+        # Проверка и улучшение симптомов одним запросом (False - двумя отдельными)
+        self.fused_intake = os.getenv("AI_FUSED_INTAKE", "true").lower() == "true"
+        # Лимиты Groq (запросов и токенов в минуту на ключ) и очередь с приоритетами
+        self.scheduler = AIScheduler(
+            rpm=int(os.getenv("GROQ_RPM", "30")) * len(self.keys),
+            tpm=int(os.getenv("GROQ_TPM", "6000")) * len(self.keys),
+            max_concurrency=self.max_concurrency
+        )
+        # Повторы и выключатели по методам
+        self.max_retries = int(os.getenv("AI_MAX_RETRIES", "2"))
+        self.retry_budget = RetryBudget(ratio=float(os.getenv("AI_RETRY_BUDGET_RATIO", "0.2")))
+        self._breaker_failures = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+        self._breaker_reset = float(os.getenv("AI_BREAKER_RESET", "30"))
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.degraded_calls = 0
+        # Одинаковые одновременные запросы (двойное нажатие, разные пользователи) - один вызов
+        self._single_flight = SingleFlight()
+        
+        # Микропакетирование проверки симптомов: запросы за окно - одним вызовом AI
+        self.validation_batcher = None
+        if os.getenv("AI_BATCH_VALIDATION", "false").lower() == "true":
+            self.validation_batcher = MicroBatcher(
+                self._validate_batch,
+                window=float(os.getenv("AI_BATCH_WINDOW_MS", "20")) / 1000,
+                max_size=int(os.getenv("AI_BATCH_SIZE", "8"))
+            )
+        
+        # Кэш дополнительных симптомов по нормализованным основным симптомам
+        self.additional_symptoms_cache = TTLCache(
+            max_size=int(os.getenv("AI_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("AI_CACHE_TTL", "86400"))
+        )
+        # Постоянное хранилище тех же списков (общее для перезапусков и реплик)
+        self.suggestion_store = create_suggestion_store()
+        
+        # Рекомендации по пользователям: повторная отправка тех же данных не вызывает AI
+        self.recommendation_memo = TTLCache(
+            max_size=int(os.getenv("AI_RECOMMEND_MEMO_SIZE", "1024")),
+            ttl=float(os.getenv("AI_RECOMMEND_MEMO_TTL", "1800"))
+        )
+        
+        # Локальный триаж для однозначных случаев
+        self.triage = TriageEngine(SPECIALISTS)
+        self.triage_stats = {'local': 0, 'ai': 0, 'emergency_priority': 0, 'degraded_low_confidence': 0}
+        
+        # Локальная проверка языка и словаря для сгенерированных симптомов
+        self.lexicon = SymptomLexicon()
+        
+        # Фоновые задачи предварительной генерации: user_id -> (симптомы, задача)
+        self._prefetch_tasks: dict[int, tuple[str, asyncio.Task]] = {}
+    
+    async def close(self):
+        """Сохраняет очередь хранилища симптомов и закрывает пул HTTP-соединений"""
+        if self.suggestion_store is not None:
+            await self.suggestion_store.close()
+        await self.http_client.aclose()
+    
+    def get_stats(self) -> dict:
+        """Метрики сервиса (для эндпоинта /metrics)"""
+        return {
+            'additional_symptoms_cache': self.additional_symptoms_cache.stats(),
+            'suggestion_store': self.suggestion_store.stats() if self.suggestion_store else None,
+            'recommendation_memo': self.recommendation_memo.stats(),
+            'single_flight': self._single_flight.stats(),
+            'scheduler': self.scheduler.stats(),
+            'api_keys': self.keys.stats(),
+            'models': self.router.stats(),
+            'prompts': self.prompts.stats(),
+            'structured_output': self._parse_stats(),
+            'triage': dict(self.triage_stats),
+            'symptom_lexicon': self.lexicon.get_stats(),
+            'sessions': ai_sessions.stats(),
+            'validation_batching': self.validation_batcher.stats() if self.validation_batcher else None,
+            'resilience': self.get_health()
+        }
+    
+    def get_health(self) -> dict:
+        """Состояние выключателей (для эндпоинта /health)"""
+        breakers = {method: breaker.stats() for method, breaker in self.breakers.items()}
+        degraded = any(b['state'] != CircuitBreaker.CLOSED for b in breakers.values())
+        return {
+            'status': 'degraded' if degraded else 'ok',
+            'breakers': breakers,
+            'retry_budget': self.retry_budget.stats(),
+            'degraded_calls': self.degraded_calls
+        }
+    
+    def _parse_stats(self) -> dict:
+        result = {}
+        for method, stats in self.parse_stats.items():
+            total = sum(stats.values())
+            result[method] = {
+                **stats,
+                'failure_rate': round(stats['failed'] / total, 3) if total else 0.0
+            }
+        return result
     
-    def _call_ai(self, system_prompt: str, user_message: str, temperature: float = 0.7) -> str:
+    def _breaker(self, method: str) -> CircuitBreaker:
+        if method not in self.breakers:
+            self.breakers[method] = CircuitBreaker(self._breaker_failures, self._breaker_reset)
+        return self.breakers[method]
+    
+    @staticmethod
+    def _symptoms_cache_key(main_symptoms: str, duration: str) -> tuple[str, str]:
+        """Ключ кэша: нормализованные симптомы + группа давности"""
+        duration_key = duration.strip().lower()
+        return normalize_symptoms(main_symptoms), DURATION_BUCKETS.get(duration_key, duration_key)
+    
+    async def _call_ai(self, prompt: Prompt, user_message: str,
+                       temperature: float = 0.7, timeout: float | None = None,
+                       method: str = "", priority: int | None = None,
+                       items: int = 1, json_mode: bool = False) -> str:
         """
         Базовый метод для вызова AI
         
+        Одновременные вызовы с одинаковыми (method, model, промпт, temperature)
+        разделяют один запрос к Groq. Запросы ждут своей очереди в планировщике
+        с учётом лимитов RPM/TPM и приоритета метода. Временные ошибки
+        повторяются (в пределах бюджета повторов), а при серии ошибок
+        выключатель метода размыкается и вызовы сразу завершаются ошибкой.
+        
         Args:
-            system_prompt: Системный промпт
+            prompt: Системный промпт из реестра (задаёт и максимум ответа)
             user_message: Сообщение пользователя
             temperature: Температура генерации (0-1)
+            timeout: Таймаут вызова в секундах (по умолчанию AI_TIMEOUT)
+            method: Имя метода AIService (ключ объединения запросов и приоритет)
+            priority: Явный приоритет (PRIORITY_*), иначе по METHOD_PRIORITIES
+            items: Число элементов в пакетном запросе (масштабирует максимум ответа)
+            json_mode: Запросить у Groq ответ в виде JSON-объекта
         
         Returns:
             Ответ от AI
+        
+        Raises:
+            AIUnavailableError: AI недоступен - вызывающий метод переходит
+                на локальный упрощённый режим
+            StructuredOutputError: Groq отклонил ответ, не прошедший проверку JSON
         """
+        if priority is None:
+            priority = METHOD_PRIORITIES.get(method, PRIORITY_GENERATE)
+        
+        prompt_hash = hashlib.sha256(
+            f"{prompt.text}\x00{user_message}".encode('utf-8')
+        ).hexdigest()
+        max_tokens = self.prompts.max_tokens(prompt.name, items)
+        key = (method, self.router.route(method)[0], prompt_hash, temperature, max_tokens, json_mode)
+        
+        return await self._single_flight.do(
+            key,
+            lambda: self._call_with_retries(
+                method, prompt, user_message, temperature, timeout, priority, max_tokens, json_mode
+            )
+        )
+    
+    async def _call_with_retries(self, method: str, prompt: Prompt, user_message: str,
+                                 temperature: float, timeout: float | None, priority: int,
+                                 max_tokens: int, json_mode: bool) -> str:
+        """Запрос с повторами, бюджетом повторов и выключателем метода"""
+        breaker = self._breaker(method)
+        self.retry_budget.record_request()
+        self.prompts.record(prompt, user_message)
+        
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self.degraded_calls += 1
+                raise AIUnavailableError(f"circuit open for {method or 'ai'}")
+            
+            try:
+                result = await self._request(
+                    method, prompt.text, user_message, temperature, timeout, priority,
+                    max_tokens, json_mode
+                )
+                breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                breaker.record_cancel()
+                raise
+            except asyncio.TimeoutError:
+                error, retryable = f"timeout after {timeout or self.timeout}s", True
+            except RateLimitError as e:
+                # Пока есть ключи в ротации, повтор уходит в другой ключ без паузы
+                if not self.keys.available():
+                    self.scheduler.on_rate_limited()
+                error, retryable = f"rate limited: {e}", True
+            except APIConnectionError as e:
+                error, retryable = f"connection error: {e}", True
+            except APIStatusError as e:
+                if e.status_code == 400 and 'json_validate_failed' in str(e):
+                    # Модель выдала некорректный JSON - это не сбой Groq
+                    breaker.record_cancel()
+                    raise StructuredOutputError(f"json_validate_failed: {e}") from e
+                error, retryable = f"status {e.status_code}: {e}", e.status_code >= 500
+            except Exception as e:
+                error, retryable = str(e), False
+            
+            print(f"AI Error ({method}, attempt {attempt + 1}): {error}")
+            # Ошибки запроса (4xx) не говорят о недоступности Groq
+            if retryable:
+                breaker.record_failure()
+            else:
+                breaker.record_cancel()
+            
+            if (not retryable or attempt >= self.max_retries
+                    or not self.retry_budget.try_retry()):
+                self.degraded_calls += 1
+                raise AIUnavailableError(error)
+            
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+    
+    async def _request(self, method: str, system_prompt: str, user_message: str,
+                       temperature: float, timeout: float | None, priority: int,
+                       max_tokens: int, json_mode: bool) -> str:
+        """
+        Один запрос к Groq с хеджированием
+        
+        Если основная модель не ответила за свой текущий p95 (отсчёт - с момента
+        получения слота планировщика), отправляется дубль в резервную модель.
+        Используется первый успешный ответ, второй запрос отменяется.
+        """
+        primary, backup = self.router.route(method)
+        granted = asyncio.Event()
+        tasks = [asyncio.create_task(self._complete(
+            primary, system_prompt, user_message, temperature, timeout, priority,
+            max_tokens, json_mode, granted
+        ))]
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=temperature,
-                max_tokens=1024
+            delay = self.router.hedge_delay(method)
+            if delay is not None:
+                waiter = asyncio.create_task(granted.wait())
+                try:
+                    await asyncio.wait({tasks[0], waiter}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                
+                done, _ = await asyncio.wait({tasks[0]}, timeout=delay)
+                if not done and self.router.try_hedge():
+                    print(f"DEBUG AI: Hedging {method}: {primary} slower than {delay:.2f}s, trying {backup}")
+                    tasks.append(asyncio.create_task(self._complete(
+                        backup, system_prompt, user_message, temperature, timeout,
+                        priority, max_tokens, json_mode, asyncio.Event()
+                    )))
+            
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.router.hedge_wins += 1
+                        return task.result()
+                    # Ошибка основного запроса важнее (по ней решается, повторять ли)
+                    if error is None or task is tasks[0]:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _complete(self, model: str, system_prompt: str, user_message: str,
+                        temperature: float, timeout: float | None, priority: int,
+                        max_tokens: int, json_mode: bool, granted: asyncio.Event) -> str:
+        """Запрос к модели через планировщик, с таймаутом и замером задержки"""
+        tokens = (estimate_tokens(system_prompt) + estimate_tokens(user_message)
+                  + min(max_tokens, EXPECTED_COMPLETION_TOKENS))
+        timeout = timeout or self.timeout
+        extra = {'response_format': {'type': 'json_object'}} if json_mode else {}
+        loop = asyncio.get_running_loop()
+        async with self.scheduler.slot(priority, tokens) as report_usage:
+            granted.set()
+            started = loop.time()
+            key = self.keys.acquire(tokens)
+            headers = used = None
+            try:
+                # Сырой ответ - ради заголовков x-ratelimit-* с остатком квоты ключа
+                raw = await asyncio.wait_for(
+                    key.client.chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_message}
+                        ],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **extra
+                    ),
+                    timeout=timeout
+                )
+                headers = raw.headers
+                response = await raw.parse()
+                used = response.usage.total_tokens if response.usage else None
+            except asyncio.TimeoutError:
+                self.router.record(model, timeout)
+                raise
+            except RateLimitError as e:
+                headers = e.response.headers
+                self.keys.on_rate_limited(key, headers)
+                raise
+            finally:
+                self.keys.release(key, tokens, headers, used)
+            self.router.record(model, loop.time() - started)
+            if used:
+                report_usage(used)
+        return (response.choices[0].message.content or "").strip()
+    
+    async def _call_structured(self, prompt: Prompt, user_message: str, schema: type[SchemaT],
+                               temperature: float = 0.3, method: str = "", items: int = 1,
+                               context: dict | None = None,
+                               priority: int | None = None) -> SchemaT | None:
+        """
+        Запрос со структурированным ответом
+        
+        Ответ запрашивается в режиме JSON (если AI_JSON_MODE), разбирается
+        терпимым парсером и проверяется схемой. При ошибке делается одна
+        повторная попытка с описанием ошибки.
+        
+        Returns:
+            Ответ по схеме или None, если он не получен и после исправления
+        
+        Raises:
+            AIUnavailableError: AI недоступен
+        """
+        try:
+            response = await self._call_ai(
+                prompt, user_message, temperature=temperature, method=method,
+                priority=priority, items=items, json_mode=self.json_mode
+            )
+        except StructuredOutputError as e:
+            # Groq отклонил ответ, не прошедший проверку JSON
+            return await self._repair_structured(
+                prompt, user_message, "", e, schema, method, items, context, priority
             )
-            return response.choices[0].message.content.strip()
+        
+        try:
+            result = parse_structured(response, schema, context)
+        except StructuredOutputError as e:
+            return await self._repair_structured(
+                prompt, user_message, response, e, schema, method, items, context, priority
+            )
+        
+        self.parse_stats[method]['parsed'] += 1
+        return result
+    
+    async def _repair_structured(self, prompt: Prompt, user_message: str, response: str,
+                                 error: Exception, schema: type[SchemaT], method: str,
+                                 items: int = 1, context: dict | None = None,
+                                 priority: int | None = None) -> SchemaT | None:
+        """Одна повторная попытка: модели показывают её ответ и ошибку разбора"""
+        print(f"DEBUG AI: Structured output error ({method}): {error}")
+        
+        previous = f"Твой предыдущий ответ:\n{response[:REPAIR_ECHO_CHARS]}\n\n" if response else ""
+        repair_message = (
+            f"{user_message}\n\n{previous}"
+            f"Ошибка разбора ответа: {error}\n"
+            f"Верни только исправленный JSON строго по формату, без пояснений."
+        )
+        try:
+            response = await self._call_ai(
+                prompt, repair_message, temperature=0.0, method=method,
+                priority=priority, items=items, json_mode=self.json_mode
+            )
+            result = parse_structured(response, schema, context)
+        except StructuredOutputError as e:
+            print(f"DEBUG AI: Structured output repair failed ({method}): {e}")
+            self.parse_stats[method]['failed'] += 1
+            return None
+        
+        self.parse_stats[method]['repaired'] += 1
+        return result
+    
+    async def _stream_ai(self, prompt: Prompt, user_message: str,
+                         temperature: float = 0.7, method: str = "",
+                         priority: int | None = None):
+        """
+        Потоковый вызов AI
+        
+        Учитывает выключатель метода и планировщик, но не повторяется
+        и не объединяется с другими запросами.
+        
+        Yields:
+            Накопленный текст ответа после каждого фрагмента
+        
+        Raises:
+            AIUnavailableError: AI недоступен или поток оборвался
+        """
+        if priority is None:
+            priority = METHOD_PRIORITIES.get(method, PRIORITY_GENERATE)
+        
+        breaker = self._breaker(method)
+        if not breaker.allow():
+            self.degraded_calls += 1
+            raise AIUnavailableError(f"circuit open for {method or 'ai'}")
+        
+        self.prompts.record(prompt, user_message)
+        max_tokens = self.prompts.max_tokens(prompt.name)
+        tokens = (prompt.tokens + estimate_tokens(user_message)
+                  + min(max_tokens, EXPECTED_COMPLETION_TOKENS))
+        loop = asyncio.get_running_loop()
+        text = ""
+        stream = None
+        key = headers = None
+        try:
+            async with self.scheduler.slot(priority, tokens) as report_usage:
+                deadline = loop.time() + self.timeout
+                key = self.keys.acquire(tokens)
+                raw = await asyncio.wait_for(
+                    key.client.chat.completions.with_raw_response.create(
+                        model=self.router.route(method)[0],
+                        messages=[
+                            {"role": "system", "content": prompt.text},
+                            {"role": "user", "content": user_message}
+                        ],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=True
+                    ),
+                    timeout=self.timeout
+                )
+                headers = raw.headers
+                stream = await raw.parse()
+                chunks = stream.__aiter__()
+                while True:
+                    # Общий таймаут на весь ответ, а не на каждый фрагмент
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        text += delta
+                        yield text
+                # В потоке usage не приходит - уточняем TPM по оценке ответа
+                report_usage(prompt.tokens + estimate_tokens(user_message)
+                             + estimate_tokens(text))
+        except (asyncio.CancelledError, GeneratorExit):
+            breaker.record_cancel()
+            raise
+        except AIUnavailableError:
+            raise
         except Exception as e:
-            print(f"AI Error: {e}")
-            return ""
+            print(f"AI Stream Error ({method}): {e}")
+            if isinstance(e, RateLimitError):
+                headers = e.response.headers
+                self.keys.on_rate_limited(key, headers)
+                if not self.keys.available():
+                    self.scheduler.on_rate_limited()
+            breaker.record_failure()
+            self.degraded_calls += 1
+            raise AIUnavailableError(str(e)) from e
+        finally:
+            if key is not None:
+                self.keys.release(key, tokens, headers, prompt.tokens
+                                  + estimate_tokens(user_message) + estimate_tokens(text))
+            if stream is not None:
+                await stream.close()
+        
+        breaker.record_success()
     
-    def validate_symptoms(self, text: str) -> dict:
+    async def validate_symptoms(self, text: str) -> dict:
         """
         Проверяет, описывает ли текст медицинские симптомы
         
@@ -52,44 +626,28 @@ class AIService:
                 'reason': str      # Причина, если невалидно
             }
         """
-        system_prompt = """Ты медицинский ассистент. Твоя задача - проверить, описывает ли пользователь медицинские симптомы или жалобы на здоровье.
-
-СИМПТОМЫ - это:
-- Физические ощущения (боль, температура, слабость, тошнота и т.д.)
-- Изменения в состоянии здоровья
-- Видимые проявления (сыпь, отек, покраснение и т.д.)
-- Нарушения функций организма
-
-НЕ СИМПТОМЫ:
-- Рецепты
-- Инструкции
-- Вопросы не о здоровье
-- Случайный текст
-- Просьбы что-то сделать
-
-Ответь СТРОГО в JSON формате:
-{
-    "is_valid": true/false,
-    "symptoms": "краткое описание симптомов" или "",
-    "reason": "почему невалидно" или ""
-}"""
+        if self.validation_batcher:
+            return await self.validation_batcher.submit(text)
+        return await self._validate_single(text)
+    
+    async def _validate_single(self, text: str) -> dict:
+        """Проверка симптомов отдельным запросом (формат ответа - как у validate_symptoms)"""
+        prompt = self.prompts.get('validate_symptoms', text)
+        text = self.prompts.fit(prompt, text)
 
         user_message = f"Проверь, описывает ли это симптомы:\n\n{text}"
         
-        response = self._call_ai(system_prompt, user_message, temperature=0.3)
-        
         try:
-            # Извлекаем JSON из ответа
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-                return {
-                    'is_valid': result.get('is_valid', False),
-                    'symptoms': result.get('symptoms', ''),
-                    'reason': result.get('reason', '')
-                }
-        except Exception as e:
-            print(f"JSON Parse Error: {e}")
+            result = await self._call_structured(
+                prompt, user_message, ValidationResult, temperature=0.3, method="validate_symptoms"
+            )
+        except AIUnavailableError:
+            # Упрощённый режим: AI недоступен - не блокируем консультацию
+            return {'is_valid': True, 'symptoms': '', 'reason': ''}
+        
+        self.prompts.record_outcome(prompt, result is not None)
+        if result is not None:
+            return result.model_dump()
         
         # Если не удалось распарсить, считаем невалидным
         return {
@@ -98,7 +656,49 @@ class AIService:
             'reason': 'Не удалось распознать симптомы'
         }
     
-    def improve_symptoms_text(self, text: str) -> str:
+    async def _validate_batch(self, texts: list[str]) -> list[dict]:
+        """
+        Проверка нескольких текстов одним запросом (обработчик MicroBatcher)
+        
+        Тексты, для которых в ответе нет результата, проверяются отдельными запросами.
+        
+        Args:
+            texts: Тексты от пользователей
+        
+        Returns:
+            Результаты в формате validate_symptoms, в том же порядке
+        """
+        if len(texts) == 1:
+            return [await self._validate_single(texts[0])]
+        
+        prompt = self.prompts.get('validate_symptoms_batch')
+        items = '\n\n'.join(f"[{i}]\n{text}" for i, text in enumerate(texts, 1))
+        user_message = f"Проверь, описывают ли эти сообщения симптомы:\n\n{items}"
+        
+        try:
+            result = await self._call_structured(
+                prompt, user_message, BatchValidationResult, temperature=0.3,
+                method="validate_symptoms", items=len(texts)
+            )
+        except AIUnavailableError:
+            # Упрощённый режим: AI недоступен - не блокируем консультацию
+            return [{'is_valid': True, 'symptoms': '', 'reason': ''} for _ in texts]
+        
+        parsed: dict[int, dict] = {}
+        for item in (result.results if result else []):
+            if 1 <= item.id <= len(texts):
+                parsed[item.id] = item.model_dump(exclude={'id'})
+        
+        missing = [i for i in range(1, len(texts) + 1) if i not in parsed]
+        self.prompts.record_outcome(prompt, not missing)
+        if missing:
+            print(f"DEBUG AI: Batch validation missed {len(missing)} of {len(texts)} items")
+            singles = await asyncio.gather(*(self._validate_single(texts[i - 1]) for i in missing))
+            parsed.update(zip(missing, singles))
+        
+        return [parsed[i] for i in range(1, len(texts) + 1)]
+    
+    async def improve_symptoms_text(self, text: str) -> str:
         """
         Окультуривает и улучшает описание симптомов от пользователя
         
@@ -108,33 +708,16 @@ class AIService:
         Returns:
             Улучшенный, структурированный текст симптомов
         """
-        system_prompt = """Ты медицинский редактор. Твоя задача - улучшить и структурировать описание симптомов от пациента, сохраняя всю важную информацию.
-
-ПРАВИЛА:
-1. Исправь грамматические и орфографические ошибки
-2. Структурируй информацию логично
-3. Используй правильные медицинские термины
-4. Сохрани ВСЮ важную информацию (локализация боли, интенсивность, время и т.д.)
-5. Убери лишние слова ("типа", "как бы", "ну вот" и т.д.)
-6. Сделай текст понятным для врача
-7. НЕ добавляй информацию, которой нет в оригинале
-8. НЕ ставь диагнозы
+        prompt = self.prompts.get('improve_symptoms_text', text)
 
-ФОРМАТ ОТВЕТА: просто улучшенный текст, без дополнительных комментариев
-
-Примеры:
-Исходно: "у меня как бы голова болит и типа в висках стреляет уже 2 день"
-Улучшено: "Головная боль в области висков, стреляющего характера. Беспокоит в течение 2 дней."
-
-Исходно: "жывот болит справо низу когда хожу"
-Улучшено: "Боль в правой нижней части живота, усиливается при ходьбе."
-
-Исходно: "температура высокая кашель сухой слабость"
-Улучшено: "Повышенная температура тела. Сухой кашель. Общая слабость."""
-
-        user_message = f"Улучши описание симптомов:\n\n{text}"
+        user_message = f"Улучши описание симптомов:\n\n{self.prompts.fit(prompt, text)}"
         
-        response = self._call_ai(system_prompt, user_message, temperature=0.3)
+        try:
+            response = await self._call_ai(
+                prompt, user_message, temperature=0.3, method="improve_symptoms_text"
+            )
+        except AIUnavailableError:
+            return text
         
         # Очищаем ответ от лишнего
         improved = response.strip()
@@ -151,9 +734,121 @@ class AIService:
             if improved.startswith(phrase):
                 improved = improved[len(phrase):].strip()
         
+        self.prompts.record_outcome(prompt, bool(improved))
         return improved if improved else text
     
-    def generate_additional_symptoms(self, main_symptoms: str, duration: str) -> list[str]:
+    async def analyze_symptoms(self, text: str) -> dict:
+        """
+        Проверяет симптомы и улучшает формулировку за один запрос к AI
+        
+        При ошибке разбора ответа (или если AI_FUSED_INTAKE=false)
+        выполняет validate_symptoms и improve_symptoms_text по отдельности.
+        
+        Args:
+            text: Текст от пользователя
+        
+        Returns:
+            {
+                'is_valid': bool,  # True если это симптомы
+                'reason': str,     # Причина, если невалидно
+                'improved': str    # Улучшенный текст симптомов
+            }
+        """
+        if self.fused_intake:
+            prompt = self.prompts.get('analyze_symptoms', text)
+            try:
+                intake = await self._call_structured(
+                    prompt, self._intake_message(prompt, text), IntakeResult,
+                    temperature=0.3, method="analyze_symptoms"
+                )
+            except AIUnavailableError:
+                # Упрощённый режим: принимаем текст как есть
+                return {'is_valid': True, 'reason': '', 'improved': text}
+            self.prompts.record_outcome(prompt, intake is not None)
+            if intake is not None:
+                return self._intake_result(intake, text)
+            print("DEBUG AI: Fused intake failed, falling back to separate calls")
+        
+        return await self._analyze_symptoms_separately(text)
+    
+    async def stream_analyze_symptoms(self, text: str):
+        """
+        Потоковый вариант analyze_symptoms
+        
+        Yields:
+            Промежуточные результаты {'is_valid': bool | None, 'improved': str, 'done': False}
+            и последним - итоговый результат analyze_symptoms с 'done': True
+        """
+        if not self.fused_intake:
+            yield {**await self._analyze_symptoms_separately(text), 'done': True}
+            return
+        
+        prompt = self.prompts.get('analyze_symptoms', text)
+        response = ""
+        try:
+            async for response in self._stream_ai(
+                prompt, self._intake_message(prompt, text),
+                temperature=0.3, method="analyze_symptoms"
+            ):
+                fields, complete = parse_partial_object(response)
+                yield {
+                    'is_valid': fields.get('is_valid') if 'is_valid' in complete else None,
+                    'improved': fields.get('improved', ''),
+                    'done': False
+                }
+        except AIUnavailableError:
+            yield {'is_valid': True, 'reason': '', 'improved': text, 'done': True}
+            return
+        
+        message = self._intake_message(prompt, text)
+        try:
+            intake = parse_structured(response, IntakeResult)
+            self.parse_stats['analyze_symptoms']['parsed'] += 1
+        except StructuredOutputError as e:
+            try:
+                intake = await self._repair_structured(
+                    prompt, message, response, e, IntakeResult, "analyze_symptoms"
+                )
+            except AIUnavailableError:
+                intake = None
+        self.prompts.record_outcome(prompt, intake is not None)
+        
+        if intake is not None:
+            result = self._intake_result(intake, text)
+        else:
+            print("DEBUG AI: Fused intake failed, falling back to separate calls")
+            result = await self._analyze_symptoms_separately(text)
+        yield {**result, 'done': True}
+    
+    async def _analyze_symptoms_separately(self, text: str) -> dict:
+        """Проверка и улучшение двумя отдельными запросами"""
+        validation = await self.validate_symptoms(text)
+        if not validation['is_valid']:
+            return {'is_valid': False, 'reason': validation['reason'], 'improved': ''}
+        
+        improved = await self.improve_symptoms_text(text)
+        return {'is_valid': True, 'reason': '', 'improved': improved}
+    
+    def _intake_message(self, prompt: Prompt, text: str) -> str:
+        return f"Проверь и улучши описание симптомов:\n\n{self.prompts.fit(prompt, text)}"
+    
+    @staticmethod
+    def _intake_result(result: IntakeResult, text: str) -> dict:
+        """Ответ объединённого запроса в формате analyze_symptoms"""
+        if not result.is_valid:
+            return {
+                'is_valid': False,
+                'reason': result.reason or 'Не удалось распознать симптомы',
+                'improved': ''
+            }
+        
+        return {
+            'is_valid': True,
+            'reason': '',
+            'improved': result.improved.strip() or text
+        }
+    
+    async def generate_additional_symptoms(self, main_symptoms: str, duration: str) -> list[str]:
         """
         Генерирует список дополнительных симптомов для уточнения
         
@@ -164,107 +859,175 @@ class AIService:
         Returns:
             Список из 8-10 релевантных симптомов
         """
-        system_prompt = """Ты опытный русскоязычный врач-диагност. На основе основных симптомов пациента, предложи 8-10 дополнительных симптомов для уточнения диагноза.
-
-КРИТИЧЕСКИ ВАЖНО - ТОЛЬКО РУССКИЙ ЯЗЫК:
-1. Используй ТОЛЬКО литературный русский язык
-2. НЕ используй украинские слова (шкіра → кожа, голова → голова, біль → боль)
-3. НЕ используй английские слова или транслитерацию
-4. НЕ используй слова из других языков
-5. Проверь каждое слово - оно должно быть русским!
-
-ПРАВИЛЬНЫЕ русские медицинские термины:
-✅ "Зуд кожи" (НЕ "Зудящая шкіра"!)
-✅ "Покраснение кожи" (НЕ "Червона шкіра"!)
-✅ "Головная боль" (НЕ "Головний біль"!)
-✅ "Тошнота" (НЕ "Нудота"!)
-✅ "Слабость" (НЕ "Слабкість"!)
-✅ "Повышенная температура"
-✅ "Головокружение"
-✅ "Потеря аппетита"
-
-ПРАВИЛА:
-1. Симптомы должны быть КОРОТКИМИ (2-4 слова)
-2. Только симптомы, НЕ названия болезней
-3. Релевантные основным жалобам
-4. Разнообразные (не повторяться)
-5. ПРОВЕРЬ: каждое слово на русском языке!
-
-Формат ответа: JSON массив строк ТОЛЬКО на русском языке
-["симптом 1", "симптом 2", ..., "симптом 8"]"""
+        cache_key = self._symptoms_cache_key(main_symptoms, duration)
+        cached = self.additional_symptoms_cache.get(cache_key)
+        if cached is not None:
+            print(f"DEBUG AI: Additional symptoms cache hit: {cache_key}")
+            return list(cached)
+        
+        stored = await self._stored_symptoms(cache_key)
+        if stored:
+            return stored
+        
+        prompt = self.prompts.get('generate_additional_symptoms', cache_key[0])
+        main_symptoms = self.prompts.fit(prompt, main_symptoms, reserved=estimate_tokens(duration) + 40)
 
         user_message = f"""Основные симптомы: {main_symptoms}
 Давность: {duration}
 
-Предложи 8-10 дополнительных симптомов для уточнения НА РУССКОМ ЯЗЫКЕ (не украинском, не английском)."""
+Предложи 8-10 дополнительных симптомов для уточнения."""
 
-        response = self._call_ai(system_prompt, user_message, temperature=0.7)
+        try:
+            result = await self._call_structured(
+                prompt, user_message, AdditionalSymptoms,
+                temperature=0.7, method="generate_additional_symptoms"
+            )
+        except AIUnavailableError:
+            # Упрощённый режим: типичные симптомы подходящих специалистов (без кэширования)
+            return self.triage.suggest_symptoms(main_symptoms)
         
-        print(f"DEBUG AI: Raw response length: {len(response)}")
-        print(f"DEBUG AI: First 200 chars: {response[:200]}")
+        if result is None:
+            # Возвращаем пустой список если не удалось
+            self.prompts.record_outcome(prompt, False)
+            print("DEBUG AI: Returning empty list")
+            return []
         
-        try:
-            # Ищем JSON массив в ответе
-            json_match = re.search(r'\[.*\]', response, re.DOTALL)
-            if json_match:
-                print(f"DEBUG AI: Found JSON: {json_match.group()[:200]}")
-                symptoms = json.loads(json_match.group())
-                print(f"DEBUG AI: Parsed {len(symptoms)} symptoms")
-                # Фильтруем и очищаем симптомы
-                filtered = self._filter_symptoms(symptoms)
-                print(f"DEBUG AI: After filtering: {len(filtered)} symptoms")
-                return filtered
-            else:
-                print("DEBUG AI: No JSON array found in response")
-        except Exception as e:
-            print(f"DEBUG AI: JSON Parse Error: {e}")
+        print(f"DEBUG AI: Parsed {len(result.symptoms)} symptoms")
+        # Фильтруем и очищаем симптомы
+        filtered = self._filter_symptoms(result.symptoms, main_symptoms)
+        print(f"DEBUG AI: After filtering: {len(filtered)} symptoms")
+        self.prompts.record_outcome(prompt, bool(filtered))
+        if filtered:
+            self.additional_symptoms_cache.set(cache_key, tuple(filtered))
+            if self.suggestion_store is not None:
+                self.suggestion_store.put(cache_key, filtered)
+        return filtered
+    
+    async def _stored_symptoms(self, cache_key: tuple[str, str]) -> list[str] | None:
+        """Список из постоянного хранилища (с сохранением в in-process кэш)"""
+        if self.suggestion_store is None:
+            return None
+        stored = await self.suggestion_store.get(cache_key)
+        if stored:
+            print(f"DEBUG AI: Additional symptoms store hit: {cache_key}")
+            self.additional_symptoms_cache.set(cache_key, tuple(stored))
+        return stored
+    
+    def prefetch_additional_symptoms(self, user_id: int, main_symptoms: str):
+        """
+        Запускает генерацию дополнительных симптомов в фоне (без учёта давности),
+        пока пользователь выбирает давность
         
-        # Возвращаем пустой список если не удалось
-        print("DEBUG AI: Returning empty list")
-        return []
+        Args:
+            user_id: ID пользователя Telegram
+            main_symptoms: Подтверждённые основные симптомы
+        """
+        self.cancel_prefetch(user_id)
+        task = asyncio.create_task(
+            self.generate_additional_symptoms(main_symptoms, ANY_DURATION)
+        )
+        self._prefetch_tasks[user_id] = (main_symptoms, task)
+        # Отмена сессии пользователя (ai_sessions.cancel) отменяет и фоновую генерацию
+        ai_sessions.track(user_id, task)
+        task.add_done_callback(lambda t: self._on_prefetch_done(user_id, t))
+    
+    def _on_prefetch_done(self, user_id: int, task: asyncio.Task):
+        """
+        Завершение фоновой задачи: отменённая или с ошибкой убирается сразу
+        (ошибка забирается, чтобы не попасть в лог как необработанная),
+        готовая - через PREFETCH_TTL, если обработчик её так и не забрал
+        """
+        failed = task.cancelled() or task.exception() is not None
+        entry = self._prefetch_tasks.get(user_id)
+        if not entry or entry[1] is not task:
+            return
+        if failed:
+            del self._prefetch_tasks[user_id]
+        else:
+            asyncio.get_running_loop().call_later(PREFETCH_TTL, self._expire_prefetch, user_id, task)
+    
+    def _expire_prefetch(self, user_id: int, task: asyncio.Task):
+        entry = self._prefetch_tasks.get(user_id)
+        if entry and entry[1] is task:
+            del self._prefetch_tasks[user_id]
+    
+    def prefetch_ready(self, user_id: int, main_symptoms: str) -> bool:
+        """Завершена ли фоновая генерация для этих симптомов"""
+        entry = self._prefetch_tasks.get(user_id)
+        return bool(entry and entry[0] == main_symptoms and entry[1].done())
     
-    def _filter_symptoms(self, symptoms: list[str]) -> list[str]:
+    def cancel_prefetch(self, user_id: int):
+        """Отменяет фоновую генерацию пользователя (назад / отмена / новая консультация)"""
+        entry = self._prefetch_tasks.pop(user_id, None)
+        if entry and not entry[1].done():
+            entry[1].cancel()
+    
+    async def get_additional_symptoms(self, user_id: int, main_symptoms: str, duration: str) -> list[str]:
+        """
+        Возвращает дополнительные симптомы, используя предварительную генерацию
+        
+        Порядок: кэш и хранилище для выбранной давности (в том числе записи
+        прогрева) -> фоновая задача из prefetch_additional_symptoms -> обычный
+        запрос generate_additional_symptoms.
+        """
+        entry = self._prefetch_tasks.pop(user_id, None)
+        cache_key = self._symptoms_cache_key(main_symptoms, duration)
+        
+        if cache_key in self.additional_symptoms_cache:
+            if entry:
+                entry[1].cancel()
+            return await self.generate_additional_symptoms(main_symptoms, duration)
+        
+        stored = await self._stored_symptoms(cache_key)
+        if stored:
+            if entry:
+                entry[1].cancel()
+            return stored
+        
+        if entry and entry[0] == main_symptoms:
+            try:
+                symptoms = await entry[1]
+                if symptoms:
+                    return symptoms
+            except asyncio.CancelledError:
+                # Отменён сам обработчик (ai_sessions.cancel) - новый запрос не нужен;
+                # отменена только фоновая задача - генерируем заново
+                if not entry[1].cancelled() or asyncio.current_task().cancelling():
+                    raise
+        elif entry:
+            entry[1].cancel()
+        
+        return await self.generate_additional_symptoms(main_symptoms, duration)
+    
+    def _filter_symptoms(self, symptoms: list[str], main_symptoms: str = "") -> list[str]:
         """
         Фильтрует список симптомов
         
         Args:
             symptoms: Исходный список
+            main_symptoms: Основные симптомы (их повторы убираются)
         
         Returns:
-            Отфильтрованный список (без дубликатов, болезней, длинных фраз)
+            Отфильтрованный список (только русские формулировки, без дубликатов,
+            болезней и длинных фраз)
         """
-        filtered = []
-        seen = set()
-        
-        # Список болезней для исключения
-        disease_keywords = [
-            'инфаркт', 'инсульт', 'диабет', 'рак', 'грипп', 'ковид',
-            'пневмония', 'гастрит', 'язва', 'артрит', 'астма'
-        ]
-        
-        for symptom in symptoms:
-            # Очищаем от лишних символов
-            clean = symptom.strip().strip('"').strip("'").lower()
-            
-            # Пропускаем если:
-            # 1. Уже есть в списке
-            # 2. Слишком длинный (> 50 символов)
-            # 3. Содержит название болезни
-            if (clean in seen or 
-                len(clean) > 50 or 
-                any(disease in clean for disease in disease_keywords)):
-                continue
-            
-            seen.add(clean)
-            filtered.append(symptom.strip().strip('"').strip("'"))
-        
-        return filtered[:10]  # Максимум 10 симптомов
+        filtered = self.lexicon.clean(symptoms, main_symptoms)
+        if len(filtered) < MIN_ADDITIONAL_SYMPTOMS:
+            # Вместо повторной генерации дополняем список типичными симптомами
+            extra = self.lexicon.clean(
+                self.triage.suggest_symptoms(main_symptoms),
+                ' '.join([main_symptoms, *filtered]),
+                limit=10 - len(filtered)
+            )
+            filtered += extra
+        return filtered
     
-    def recommend_doctor(self, 
+    async def recommend_doctor(self, 
                         main_symptoms: str, 
                         duration: str, 
                         additional_symptoms: list[str],
-                        user_profile: dict) -> dict:
+                        user_profile: dict,
+                        user_id: int | None = None) -> dict:
         """
         Рекомендует врача и уровень срочности
         
@@ -273,43 +1036,202 @@ class AIService:
             duration: Давность симптомов
             additional_symptoms: Дополнительные симптомы
             user_profile: Профиль пользователя (пол, возраст, рост, вес)
+            user_id: ID пользователя Telegram (для повторного использования рекомендации)
         
         Returns:
             {
                 'specialist': 'Название специалиста',
                 'urgency': 'low'|'medium'|'high'|'emergency',
-                'reasoning': 'Обоснование'
+                'reasoning': 'Обоснование',
+                'source': 'ai'|'local'|'degraded'|'default',  # Кто выбрал специалиста
+                'low_confidence': True,  # Только в упрощённом режиме без уверенного триажа
+                'cached': True  # Только для повторной отправки тех же данных
             }
         """
-        # Список доступных специалистов
-        specialists = [
-            "Кардиолог", "Невролог", "Гастроэнтеролог", "Эндокринолог", 
-            "Пульмонолог", "Уролог", "Гинеколог", "Дерматолог", 
-            "Офтальмолог", "Отоларинголог (ЛОР)", "Ортопед-травматолог", 
-            "Ревматолог", "Аллерголог-иммунолог", "Психиатр", "Онколог", 
-            "Хирург", "Проктолог", "Маммолог", "Нефролог", "Терапевт"
-        ]
+        memo_key = self._memo_key(user_id, main_symptoms, duration, additional_symptoms, user_profile)
+        memo = self._memoized_recommendation(memo_key)
+        if memo is not None:
+            return memo
         
-        system_prompt = f"""Ты опытный врач-терапевт. На основе симптомов пациента:
-1. Определи наиболее подходящего специалиста из списка
-2. Оцени уровень срочности обращения
-3. Кратко объясни почему
-
-ДОСТУПНЫЕ СПЕЦИАЛИСТЫ:
-{', '.join(specialists)}
-
-УРОВНИ СРОЧНОСТИ:
-- emergency: Требуется скорая помощь (угроза жизни)
-- high: Обратиться в течение 24 часов
-- medium: Обратиться в течение недели
-- low: Плановый прием
-
-Ответь СТРОГО в JSON формате:
-{{
-    "specialist": "Название специалиста из списка",
-    "urgency": "emergency/high/medium/low",
-    "reasoning": "Краткое обоснование (2-3 предложения)"
-}}"""
+        # Однозначные случаи решаем локально, без запроса к AI
+        triage = self._local_triage(main_symptoms, duration, additional_symptoms)
+        if triage.get('confident'):
+            return self._remember_recommendation(memo_key, self._triage_recommendation(triage))
+        
+        prompt, user_message = self._recommend_prompts(
+            main_symptoms, duration, additional_symptoms, user_profile
+        )
+        
+        try:
+            result = await self._call_structured(
+                prompt, user_message, Recommendation, temperature=0.3,
+                method="recommend_doctor", context={'specialists': SPECIALISTS},
+                priority=self._recommend_priority(triage, main_symptoms, additional_symptoms)
+            )
+        except AIUnavailableError:
+            return self._degraded_recommendation(triage)
+        
+        self.prompts.record_outcome(prompt, result is not None)
+        if result is None:
+            return self._recommendation_result(None)
+        return self._remember_recommendation(memo_key, self._recommendation_result(result))
+    
+    async def stream_recommend_doctor(self,
+                                      main_symptoms: str,
+                                      duration: str,
+                                      additional_symptoms: list[str],
+                                      user_profile: dict,
+                                      user_id: int | None = None):
+        """
+        Потоковый вариант recommend_doctor
+        
+        Yields:
+            Промежуточные результаты по мере генерации:
+            {'specialist': str | None, 'urgency': str | None, 'reasoning': str, 'done': False}
+            и последним - итоговую рекомендацию в формате recommend_doctor с 'done': True
+        """
+        memo_key = self._memo_key(user_id, main_symptoms, duration, additional_symptoms, user_profile)
+        memo = self._memoized_recommendation(memo_key)
+        if memo is not None:
+            yield {**memo, 'done': True}
+            return
+        
+        triage = self._local_triage(main_symptoms, duration, additional_symptoms)
+        if triage.get('confident'):
+            recommendation = self._remember_recommendation(memo_key, self._triage_recommendation(triage))
+            yield {**recommendation, 'done': True}
+            return
+        
+        prompt, user_message = self._recommend_prompts(
+            main_symptoms, duration, additional_symptoms, user_profile
+        )
+        
+        response = ""
+        try:
+            async for response in self._stream_ai(
+                prompt, user_message, temperature=0.3, method="recommend_doctor",
+                priority=self._recommend_priority(triage, main_symptoms, additional_symptoms)
+            ):
+                fields, complete = parse_partial_object(response)
+                yield {
+                    # Специалиста показываем, только когда поле получено целиком
+                    'specialist': fields.get('specialist') if 'specialist' in complete else None,
+                    'urgency': fields.get('urgency') if 'urgency' in complete else None,
+                    'reasoning': fields.get('reasoning', ''),
+                    'done': False
+                }
+        except AIUnavailableError:
+            yield {**self._degraded_recommendation(triage), 'done': True}
+            return
+        
+        context = {'specialists': SPECIALISTS}
+        try:
+            result = parse_structured(response, Recommendation, context)
+            self.parse_stats['recommend_doctor']['parsed'] += 1
+        except StructuredOutputError as e:
+            try:
+                result = await self._repair_structured(
+                    prompt, user_message, response, e, Recommendation, "recommend_doctor",
+                    context=context
+                )
+            except AIUnavailableError:
+                result = None
+        self.prompts.record_outcome(prompt, result is not None)
+        recommendation = self._recommendation_result(result)
+        if result is not None:
+            self._remember_recommendation(memo_key, recommendation)
+        yield {**recommendation, 'done': True}
+    
+    def _memo_key(self, user_id: int | None, main_symptoms: str, duration: str,
+                  additional_symptoms: list[str], user_profile: dict) -> tuple | None:
+        """
+        Ключ рекомендации: канонические симптомы + поля профиля, попадающие в промпт
+        
+        Порядок и формулировка дополнительных симптомов не учитываются.
+        """
+        if user_id is None:
+            return None
+        return (
+            user_id,
+            *self._symptoms_cache_key(main_symptoms, duration),
+            frozenset(normalize_symptoms(symptom) for symptom in additional_symptoms),
+            user_profile.get('gender'),
+            user_profile.get('age')
+        )
+    
+    def _memoized_recommendation(self, memo_key: tuple | None) -> dict | None:
+        """Сохранённая рекомендация для тех же данных (с пометкой 'cached')"""
+        if memo_key is None:
+            return None
+        memo = self.recommendation_memo.get(memo_key)
+        if memo is None:
+            return None
+        print(f"DEBUG AI: Recommendation memo hit for user {memo_key[0]}")
+        return {**memo, 'cached': True}
+    
+    def _remember_recommendation(self, memo_key: tuple | None, recommendation: dict) -> dict:
+        """Запоминает рекомендацию (упрощённый режим и ответ по умолчанию не запоминаются)"""
+        if memo_key is not None:
+            self.recommendation_memo.set(memo_key, dict(recommendation))
+        return recommendation
+    
+    def _local_triage(self, main_symptoms: str, duration: str, additional_symptoms: list[str]) -> dict:
+        """Локальный триаж; 'confident' - можно ответить без AI"""
+        triage = self.triage.assess(main_symptoms, duration, additional_symptoms)
+        if triage['specialist'] and triage['confidence'] >= TRIAGE_THRESHOLD:
+            print(f"DEBUG AI: Local triage: {triage['specialist']} ({triage['confidence']})")
+            self.triage_stats['local'] += 1
+            return {**triage, 'confident': True}
+        self.triage_stats['ai'] += 1
+        return triage
+    
+    def _recommend_priority(self, triage: dict, main_symptoms: str,
+                            additional_symptoms: list[str]) -> int | None:
+        """Приоритет рекомендации: высокая срочность и красные флаги - вне очереди"""
+        if triage['urgency'] == 'high' or detect_red_flags(main_symptoms, *additional_symptoms):
+            self.triage_stats['emergency_priority'] += 1
+            return PRIORITY_EMERGENCY
+        return None
+    
+    @staticmethod
+    def _triage_recommendation(triage: dict) -> dict:
+        return {
+            'specialist': triage['specialist'],
+            'urgency': triage['urgency'],
+            'reasoning': triage['reasoning'],
+            'source': 'local'
+        }
+    
+    def _degraded_recommendation(self, triage: dict) -> dict:
+        """
+        Упрощённый режим (AI недоступен)
+        
+        Специалист локального триажа - только при уверенности не ниже порога,
+        иначе терапевт с пометкой 'low_confidence'.
+        """
+        if triage['specialist'] and triage['confidence'] >= TRIAGE_THRESHOLD:
+            return {**self._triage_recommendation(triage), 'source': 'degraded'}
+        self.triage_stats['degraded_low_confidence'] += 1
+        return {
+            'specialist': 'Терапевт',
+            'urgency': triage['urgency'],
+            'reasoning': (
+                'Сервис подбора специалиста временно работает в упрощённом режиме, '
+                'и по описанию симптомов нельзя уверенно выбрать профильного врача. '
+                'Рекомендуется начать с консультации терапевта.'
+            ),
+            'source': 'degraded',
+            'low_confidence': True
+        }
+    
+    def _recommend_prompts(self, main_symptoms: str, duration: str,
+                           additional_symptoms: list[str], user_profile: dict) -> tuple[Prompt, str]:
+        """Системный промпт и сообщение для рекомендации врача"""
+        prompt = self.prompts.get('recommend_doctor', main_symptoms)
+        additional = ', '.join(additional_symptoms) if additional_symptoms else 'нет'
+        main_symptoms = self.prompts.fit(
+            prompt, main_symptoms, reserved=estimate_tokens(additional) + estimate_tokens(duration) + 40
+        )
 
         # Формируем данные пациента
         age = user_profile.get('age', 'не указан')
@@ -325,34 +1247,34 @@ class AIService:
 ДАВНОСТЬ: {duration}
 
 ДОПОЛНИТЕЛЬНЫЕ СИМПТОМЫ:
-{', '.join(additional_symptoms) if additional_symptoms else 'нет'}
+{additional}
 
 Определи специалиста и срочность."""
 
-        response = self._call_ai(system_prompt, user_message, temperature=0.3)
-        
-        try:
-            # Извлекаем JSON
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-                
-                # Проверяем что специалист из списка
-                specialist = result.get('specialist', 'Терапевт')
-                if specialist not in specialists:
-                    specialist = 'Терапевт'
-                
-                return {
-                    'specialist': specialist,
-                    'urgency': result.get('urgency', 'medium'),
-                    'reasoning': result.get('reasoning', '')
-                }
-        except Exception as e:
-            print(f"JSON Parse Error: {e}")
+        return prompt, user_message
+    
+    @staticmethod
+    def _recommendation_result(result: Recommendation | None) -> dict:
+        """Рекомендация в формате recommend_doctor (без ответа AI - терапевт)"""
+        if result is not None:
+            return {**result.model_dump(), 'source': 'ai'}
         
         # Возвращаем дефолт если не удалось
         return {
             'specialist': 'Терапевт',
             'urgency': 'medium',
-            'reasoning': 'Рекомендуется консультация терапевта для первичного осмотра.'
+            'reasoning': 'Рекомендуется консультация терапевта для первичного осмотра.',
+            'source': 'default'
         }
+
+
+# Единый экземпляр сервиса для всех обработчиков
+# (AI_WORKERS > 0 - с тем же интерфейсом, но в пуле процессов: services/ai_workers.py)
+if int(os.getenv("AI_WORKERS", "0")) > 0:
+    from services.ai_workers import AIWorkerPool
+    ai_service = AIWorkerPool(
+        int(os.getenv("AI_WORKERS")),
+        max_restarts=int(os.getenv("AI_WORKER_MAX_RESTARTS", "10"))
+    )
+else:
+    ai_service = AIService()
@@ -0,0 +1,98 @@
+"""
+Привязка AI-запросов к сессии пользователя
+
+Обработчики выполняют обращения к AI внутри ai_sessions.scope(user_id),
+фоновые задачи регистрируются через track(). Отмена, возврат назад или
+новая консультация вызывают ai_sessions.cancel(user_id): все незавершённые
+запросы пользователя отменяются и освобождают слоты планировщика и квоту Groq.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class SessionCancelled(Exception):
+    """AI-запросы сессии отменены пользователем (отмена / назад / заново)"""
+
+
+class AISessions:
+    """Реестр выполняющихся AI-задач по пользователям"""
+
+    def __init__(self):
+        self._tasks: dict[int, set[asyncio.Task]] = {}
+        # Задачи, отменённые через cancel() (в отличие от остановки бота)
+        self._cancelled: set[asyncio.Task] = set()
+        # Обработчики отмены (например, пул процессов AI - отмена заданий пользователя)
+        self._listeners: list = []
+        self.cancelled = 0
+
+    def add_listener(self, callback):
+        """Регистрирует callback(user_id), вызываемый при каждой отмене"""
+        self._listeners.append(callback)
+
+    def track(self, user_id: int, task: asyncio.Task):
+        """Регистрирует задачу пользователя (снимается с учёта по завершении)"""
+        self._tasks.setdefault(user_id, set()).add(task)
+        task.add_done_callback(lambda t: self._untrack(user_id, t))
+
+    def _untrack(self, user_id: int, task: asyncio.Task):
+        tasks = self._tasks.get(user_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[user_id]
+        self._cancelled.discard(task)
+
+    @asynccontextmanager
+    async def scope(self, user_id: int):
+        """
+        Выполняет блок обработчика как отменяемую AI-работу пользователя
+
+        Raises:
+            SessionCancelled: Работа отменена через cancel(user_id)
+        """
+        task = asyncio.current_task()
+        self._tasks.setdefault(user_id, set()).add(task)
+        try:
+            yield
+        except asyncio.CancelledError:
+            if task not in self._cancelled:
+                raise
+            self._cancelled.discard(task)
+            task.uncancel()
+            raise SessionCancelled() from None
+        finally:
+            self._untrack(user_id, task)
+
+    def cancel(self, user_id: int) -> int:
+        """
+        Отменяет все незавершённые AI-задачи пользователя
+
+        Returns:
+            Количество отменённых задач
+        """
+        current = asyncio.current_task()
+        count = 0
+        for task in list(self._tasks.get(user_id, ())):
+            if task is current or task.done():
+                continue
+            task.cancel()
+            self._cancelled.add(task)
+            count += 1
+        if count:
+            print(f"DEBUG: Cancelled {count} AI task(s) of user {user_id}")
+        self.cancelled += count
+        for callback in self._listeners:
+            callback(user_id)
+        return count
+
+    def stats(self) -> dict:
+        return {
+            'active_users': len(self._tasks),
+            'active_tasks': sum(len(tasks) for tasks in self._tasks.values()),
+            'cancelled': self.cancelled
+        }
+
+
+# Единый реестр сессий
+ai_sessions = AISessions()
@@ -0,0 +1,545 @@
+"""
+Пул процессов для AIService (режим AI_WORKERS > 0)
+
+Разбор JSON, фильтрация, повторы и ожидание Groq выполняются в отдельных
+процессах (python -m services.ai_workers), а процесс бота только принимает
+обновления Telegram. AIWorkerPool повторяет методы AIService, которые
+вызывают обработчики, и отправляет задания в очередь выбранного процесса:
+
+- задания пользователя (предварительная генерация, рекомендация) всегда
+  уходят в один и тот же процесс - там хранятся его фоновые задачи и кэш
+  рекомендаций; остальные - в наименее загруженный процесс;
+- обмен идёт строками JSON через stdin/stdout процесса, print() процесса
+  перенаправлен в stderr (попадает в общий лог);
+- отмена задания обработчиком и ai_sessions.cancel(user_id) передаются
+  в процесс и отменяют выполняющиеся там запросы;
+- лимиты GROQ_RPM/GROQ_TPM делятся между процессами поровну;
+- завершившийся процесс перезапускается с экспоненциальной паузой; после
+  AI_WORKER_MAX_RESTARTS неудачных запусков подряд он считается
+  неисправным (видно в /health), а задания уходят в остальные процессы.
+
+Глубина очередей, задержки заданий и метрики каждого процесса доступны
+в /metrics.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+from services.ai_resilience import AIUnavailableError
+from services.ai_router import LatencyTracker
+from services.ai_sessions import ai_sessions
+
+
+# Методы AIService, доступные через пул: имя -> вид задания
+WORKER_METHODS = {
+    'validate_symptoms': 'call',
+    'improve_symptoms_text': 'call',
+    'analyze_symptoms': 'call',
+    'generate_additional_symptoms': 'call',
+    'get_additional_symptoms': 'call',
+    'recommend_doctor': 'call',
+    'stream_analyze_symptoms': 'stream',
+    'stream_recommend_doctor': 'stream',
+    'prefetch_additional_symptoms': 'prefetch',
+}
+
+# Период отправки метрик процессом (сек)
+STATS_INTERVAL = 5.0
+
+# Максимальная длина строки протокола (метрики процесса - самые длинные)
+LINE_LIMIT = 4 * 1024 * 1024
+
+# Пауза перед перезапуском процесса: начальная и максимальная (сек)
+RESTART_BASE_DELAY = 1.0
+RESTART_MAX_DELAY = 60.0
+
+# Процесс, проработавший дольше (сек), считается запущенным успешно
+STABLE_UPTIME = 60.0
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _encode(message: dict) -> bytes:
+    return (json.dumps(message, ensure_ascii=False) + '\n').encode()
+
+
+class WorkerProcess:
+    """Процесс пула и его незавершённые задания"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: asyncio.subprocess.Process | None = None
+        self.reader: asyncio.Task | None = None
+        # Задание -> очередь сообщений от процесса
+        self.jobs: dict[int, asyncio.Queue] = {}
+        self.completed = 0
+        self.restarts = 0
+        # Неудачные запуски подряд; после лимита процесс больше не перезапускается
+        self.failures = 0
+        self.healthy = True
+        self.last_error: str | None = None
+        self.started_at = 0.0
+        # Последние метрики, присланные процессом
+        self.stats: dict = {}
+        self.health: dict = {}
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def send(self, message: dict):
+        """Записывает сообщение в stdin процесса"""
+        if not self.running or self.process.stdin.is_closing():
+            raise AIUnavailableError(f"worker {self.index} is not running")
+        self.process.stdin.write(_encode(message))
+
+
+class AIWorkerPool:
+    """Замена AIService, выполняющая методы в пуле процессов"""
+
+    def __init__(self, workers: int, max_restarts: int = 10):
+        """
+        Args:
+            workers: Количество процессов
+            max_restarts: Максимум неудачных перезапусков процесса подряд
+        """
+        self.size = workers
+        self.max_restarts = max_restarts
+        self.workers = [WorkerProcess(i) for i in range(workers)]
+        self._ids = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._closing = False
+        # Фоновые задачи предварительной генерации: user_id -> (симптомы, задача)
+        self._prefetch: dict[int, tuple[str, asyncio.Task]] = {}
+        # Метрики
+        self.latency: dict[str, LatencyTracker] = {}
+        self.queue_wait = LatencyTracker()
+        self.jobs = {'completed': 0, 'failed': 0, 'cancelled': 0}
+        # Отмена сессии пользователя отменяет и его задания в процессах
+        ai_sessions.add_listener(self._on_session_cancel)
+
+    # ============ ПРОЦЕССЫ ============
+
+    async def start(self):
+        """Запускает процессы (иначе - при первом задании)"""
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                for worker in self.workers:
+                    try:
+                        await self._spawn(worker)
+                    except Exception as e:
+                        self._on_spawn_error(worker, e)
+                    worker.reader = asyncio.create_task(self._supervise(worker))
+                self._started = True
+                print(f"✅ AI worker pool started: {self.size} process(es)")
+
+    async def _spawn(self, worker: WorkerProcess):
+        env = dict(os.environ)
+        env['AI_WORKERS'] = '0'
+        env['AI_WORKER_INDEX'] = str(worker.index)
+        # Лимиты Groq общие для аккаунта - делим между процессами
+        env['GROQ_RPM'] = str(max(1, int(os.getenv("GROQ_RPM", "30")) // self.size))
+        env['GROQ_TPM'] = str(max(1, int(os.getenv("GROQ_TPM", "6000")) // self.size))
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'services.ai_workers',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=PROJECT_ROOT,
+            env=env,
+            limit=LINE_LIMIT
+        )
+        worker.started_at = time.monotonic()
+
+    def _on_spawn_error(self, worker: WorkerProcess, error: Exception):
+        worker.process = None
+        worker.failures += 1
+        worker.last_error = f"spawn failed: {error}"
+        print(f"AI worker {worker.index} failed to start: {error}")
+
+    async def _supervise(self, worker: WorkerProcess):
+        """Читает сообщения процесса и перезапускает его после завершения (с паузой)"""
+        while not self._closing:
+            if worker.process is not None:
+                error = await self._read(worker)
+                if self._closing:
+                    return
+                # Процесс, упавший сразу после запуска, - неудачный запуск
+                if time.monotonic() - worker.started_at >= STABLE_UPTIME:
+                    worker.failures = 0
+                worker.failures += 1
+                worker.last_error = error or f"exited with code {worker.process.returncode}"
+                print(f"AI worker {worker.index} {worker.last_error}")
+
+            if worker.failures > self.max_restarts:
+                worker.healthy = False
+                print(f"AI worker {worker.index} disabled after {worker.failures} failed starts")
+                return
+
+            delay = min(RESTART_BASE_DELAY * 2 ** (worker.failures - 1), RESTART_MAX_DELAY)
+            await asyncio.sleep(delay)
+            if self._closing:
+                return
+            worker.restarts += 1
+            try:
+                await self._spawn(worker)
+            except Exception as e:
+                self._on_spawn_error(worker, e)
+
+    async def _read(self, worker: WorkerProcess) -> str | None:
+        """
+        Разбирает сообщения процесса до его завершения
+
+        Returns:
+            Причина остановки процесса пулом (None - процесс завершился сам)
+        """
+        process = worker.process
+        error = None
+        try:
+            while True:
+                try:
+                    line = await process.stdout.readline()
+                except (asyncio.LimitOverrunError, ValueError) as e:
+                    # Строка длиннее LINE_LIMIT: границы сообщений потеряны,
+                    # процесс останавливается и перезапускается супервизором
+                    error = f"protocol error: {e}"
+                    process.kill()
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get('op') == 'stats':
+                    worker.stats, worker.health = message['stats'], message['health']
+                    continue
+                queue = worker.jobs.get(message.get('id'))
+                if queue is not None:
+                    queue.put_nowait(message)
+
+            await process.wait()
+        finally:
+            # Незавершённые задания процесса завершаются ошибкой
+            for queue in worker.jobs.values():
+                queue.put_nowait({'op': 'error', 'type': 'AIUnavailableError',
+                                  'message': f"worker {worker.index} exited"})
+            worker.jobs.clear()
+        return error
+
+    def _pick(self, user_id: int | None) -> WorkerProcess:
+        """
+        Процесс для задания: процесс пользователя или наименее загруженный
+
+        Raises:
+            AIUnavailableError: Нет работающих процессов
+        """
+        running = [w for w in self.workers if w.running]
+        if not running:
+            raise AIUnavailableError("no AI worker processes are running")
+        if user_id is not None:
+            preferred = self.workers[user_id % self.size]
+            # Процесс пользователя перезапускается - задание уходит в соседний
+            return preferred if preferred.running else running[user_id % len(running)]
+        return min(running, key=lambda w: len(w.jobs))
+
+    def _on_session_cancel(self, user_id: int):
+        self.cancel_prefetch(user_id)
+        if self._started:
+            try:
+                self._pick(user_id).send({'op': 'cancel_user', 'user_id': user_id})
+            except AIUnavailableError:
+                pass
+
+    # ============ ЗАДАНИЯ ============
+
+    async def _job(self, method: str, args: tuple, kwargs: dict, route: int | None):
+        """
+        Выполняет задание в процессе (route - ID пользователя для выбора процесса)
+
+        Yields:
+            Промежуточные значения (для потоковых методов) и последним -
+            ('result', значение)
+        """
+        await self.start()
+        worker = self._pick(route)
+        job_id = next(self._ids)
+        queue = asyncio.Queue()
+        worker.jobs[job_id] = queue
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        finished = False
+        try:
+            worker.send({'op': 'call', 'id': job_id, 'method': method,
+                         'args': list(args), 'kwargs': kwargs})
+            while True:
+                message = await queue.get()
+                op = message['op']
+                if op == 'item':
+                    yield 'item', message['value']
+                    continue
+
+                finished = True
+                if op == 'result':
+                    elapsed = loop.time() - started
+                    self.latency.setdefault(method, LatencyTracker()).record(elapsed)
+                    self.queue_wait.record(max(0.0, elapsed - message.get('elapsed', 0.0)))
+                    self.jobs['completed'] += 1
+                    worker.completed += 1
+                    yield 'result', message['value']
+                    return
+                if op == 'cancelled':
+                    self.jobs['cancelled'] += 1
+                    raise asyncio.CancelledError()
+                self.jobs['failed'] += 1
+                if message.get('type') == 'AIUnavailableError':
+                    raise AIUnavailableError(message['message'])
+                raise RuntimeError(f"{message.get('type')}: {message.get('message')}")
+        finally:
+            worker.jobs.pop(job_id, None)
+            if not finished:
+                # Обработчик отменён или перестал читать поток - отменяем задание в процессе
+                self.jobs['cancelled'] += 1
+                try:
+                    worker.send({'op': 'cancel', 'id': job_id})
+                except AIUnavailableError:
+                    pass
+
+    async def _call(self, method: str, *args, route: int | None = None, **kwargs):
+        jobs = self._job(method, args, kwargs, route)
+        try:
+            async for kind, value in jobs:
+                if kind == 'result':
+                    return value
+        finally:
+            await jobs.aclose()
+
+    async def _stream(self, method: str, *args, route: int | None = None, **kwargs):
+        jobs = self._job(method, args, kwargs, route)
+        try:
+            async for kind, value in jobs:
+                if kind == 'item':
+                    yield value
+        finally:
+            await jobs.aclose()
+
+    # ============ МЕТОДЫ AIService ============
+
+    async def validate_symptoms(self, text: str) -> dict:
+        return await self._call('validate_symptoms', text)
+
+    async def improve_symptoms_text(self, text: str) -> str:
+        return await self._call('improve_symptoms_text', text)
+
+    async def analyze_symptoms(self, text: str) -> dict:
+        return await self._call('analyze_symptoms', text)
+
+    def stream_analyze_symptoms(self, text: str):
+        return self._stream('stream_analyze_symptoms', text)
+
+    async def generate_additional_symptoms(self, main_symptoms: str, duration: str) -> list[str]:
+        return await self._call('generate_additional_symptoms', main_symptoms, duration)
+
+    def prefetch_additional_symptoms(self, user_id: int, main_symptoms: str):
+        """Запускает генерацию в процессе пользователя (см. AIService)"""
+        self.cancel_prefetch(user_id)
+        task = asyncio.create_task(self._call(
+            'prefetch_additional_symptoms', user_id, main_symptoms, route=user_id
+        ))
+        # Ошибка фоновой генерации не должна попадать в лог как необработанная
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._prefetch[user_id] = (main_symptoms, task)
+
+    def prefetch_ready(self, user_id: int, main_symptoms: str) -> bool:
+        entry = self._prefetch.get(user_id)
+        return bool(entry and entry[0] == main_symptoms and entry[1].done())
+
+    def cancel_prefetch(self, user_id: int):
+        entry = self._prefetch.pop(user_id, None)
+        if entry and not entry[1].done():
+            entry[1].cancel()
+
+    async def get_additional_symptoms(self, user_id: int, main_symptoms: str, duration: str) -> list[str]:
+        # Результат фоновой генерации хранится в процессе пользователя
+        self._prefetch.pop(user_id, None)
+        return await self._call('get_additional_symptoms', user_id, main_symptoms, duration,
+                                route=user_id)
+
+    async def recommend_doctor(self, main_symptoms: str, duration: str,
+                               additional_symptoms: list[str], user_profile: dict,
+                               user_id: int | None = None) -> dict:
+        return await self._call(
+            'recommend_doctor', main_symptoms, duration, additional_symptoms, user_profile,
+            route=user_id, user_id=user_id
+        )
+
+    def stream_recommend_doctor(self, main_symptoms: str, duration: str,
+                                additional_symptoms: list[str], user_profile: dict,
+                                user_id: int | None = None):
+        return self._stream(
+            'stream_recommend_doctor', main_symptoms, duration, additional_symptoms, user_profile,
+            route=user_id, user_id=user_id
+        )
+
+    # ============ МЕТРИКИ ============
+
+    def get_stats(self) -> dict:
+        """Метрики пула и последние метрики процессов (для эндпоинта /metrics)"""
+        latency = {}
+        for method, tracker in self.latency.items():
+            latency[method] = {'jobs': tracker.total, **self._percentiles(tracker)}
+        return {
+            'workers': {
+                'size': self.size,
+                'queue_depth': sum(len(w.jobs) for w in self.workers),
+                'jobs': dict(self.jobs),
+                'latency': latency,
+                'queue_wait': self._percentiles(self.queue_wait),
+                'processes': [
+                    {
+                        'pid': w.process.pid if w.process else None,
+                        'queue_depth': len(w.jobs),
+                        'completed': w.completed,
+                        'restarts': w.restarts,
+                        'healthy': w.healthy
+                    }
+                    for w in self.workers
+                ]
+            },
+            'worker_stats': [w.stats for w in self.workers]
+        }
+
+    @staticmethod
+    def _percentiles(tracker: LatencyTracker) -> dict:
+        p50, p95 = tracker.percentile(50), tracker.percentile(95)
+        return {
+            'p50': round(p50, 3) if p50 is not None else None,
+            'p95': round(p95, 3) if p95 is not None else None
+        }
+
+    def get_health(self) -> dict:
+        """Состояние процессов и их выключателей (для эндпоинта /health)"""
+        degraded = any(
+            not w.running or not w.healthy or w.health.get('status') == 'degraded'
+            for w in self.workers
+        )
+        return {
+            'status': 'degraded' if degraded and self._started else 'ok',
+            'workers': [
+                {
+                    'running': w.running,
+                    'healthy': w.healthy,
+                    'restarts': w.restarts,
+                    'last_error': w.last_error,
+                    **w.health
+                }
+                for w in self.workers
+            ]
+        }
+
+    async def close(self):
+        """Останавливает процессы (закрытие stdin - сигнал завершения)"""
+        self._closing = True
+        for worker in self.workers:
+            if worker.running:
+                worker.process.stdin.close()
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    await asyncio.wait_for(worker.process.wait(), 10)
+                except asyncio.TimeoutError:
+                    worker.process.kill()
+            if worker.reader:
+                # Супервизор может ждать паузы перед перезапуском
+                worker.reader.cancel()
+                await asyncio.gather(worker.reader, return_exceptions=True)
+
+
+# ============ ПРОЦЕСС ПУЛА ============
+
+async def _serve(output):
+    """Цикл процесса: задания из stdin, результаты и метрики - в output"""
+    from services.ai_service import ai_service
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    tasks: dict[int, asyncio.Task] = {}
+
+    def send(message: dict):
+        output.write(_encode(message))
+        output.flush()
+
+    async def run(job_id: int, method: str, args: list, kwargs: dict):
+        started = time.monotonic()
+        kind = WORKER_METHODS.get(method)
+        try:
+            if kind is None:
+                raise ValueError(f"unknown method {method}")
+            value = None
+            if kind == 'stream':
+                async for item in getattr(ai_service, method)(*args, **kwargs):
+                    send({'op': 'item', 'id': job_id, 'value': item})
+            elif kind == 'prefetch':
+                user_id = args[0]
+                ai_service.prefetch_additional_symptoms(*args)
+                try:
+                    # Задание завершается, когда фоновая генерация готова
+                    await asyncio.wait({ai_service._prefetch_tasks[user_id][1]})
+                except asyncio.CancelledError:
+                    ai_service.cancel_prefetch(user_id)
+                    raise
+            else:
+                value = await getattr(ai_service, method)(*args, **kwargs)
+            send({'op': 'result', 'id': job_id, 'value': value,
+                  'elapsed': time.monotonic() - started})
+        except asyncio.CancelledError:
+            send({'op': 'cancelled', 'id': job_id})
+        except Exception as e:
+            send({'op': 'error', 'id': job_id, 'type': type(e).__name__, 'message': str(e)})
+
+    async def report_stats():
+        while True:
+            send({'op': 'stats', 'stats': ai_service.get_stats(), 'health': ai_service.get_health()})
+            await asyncio.sleep(STATS_INTERVAL)
+
+    stats_task = asyncio.create_task(report_stats())
+    while line := await reader.readline():
+        message = json.loads(line)
+        op = message['op']
+        if op == 'call':
+            task = asyncio.create_task(run(
+                message['id'], message['method'], message['args'], message['kwargs']
+            ))
+            tasks[message['id']] = task
+            task.add_done_callback(lambda t, job_id=message['id']: tasks.pop(job_id, None))
+        elif op == 'cancel':
+            task = tasks.get(message['id'])
+            if task:
+                task.cancel()
+        elif op == 'cancel_user':
+            ai_sessions.cancel(message['user_id'])
+
+    # stdin закрыт - бот останавливается
+    stats_task.cancel()
+    for task in list(tasks.values()):
+        task.cancel()
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    await ai_service.close()
+
+
+def main():
+    # stdout занят протоколом, print() процесса уходит в stderr
+    output = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    asyncio.run(_serve(output))
+
+
+if __name__ == "__main__":
+    main()
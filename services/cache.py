@@ -0,0 +1,89 @@
+"""
+Ограниченный in-process кэш (LRU + TTL) со счётчиками попаданий
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """LRU-кэш с ограниченным размером и временем жизни записей"""
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        """
+        Args:
+            max_size: Максимальное количество записей
+            ttl: Время жизни записи в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение по ключу или default (просроченные записи удаляются)"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение без учёта в статистике и без изменения порядка LRU"""
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+    
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Сохраняет значение, вытесняя самые старые записи при переполнении"""
+        if self.max_size <= 0:
+            return
+        
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self._data.move_to_end(key)
+        
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удаляет запись и возвращает её значение"""
+        item = self._data.pop(key, None)
+        return item[1] if item is not None else default
+    
+    def clear(self):
+        """Очищает кэш"""
+        self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] >= time.monotonic()
+    
+    def stats(self) -> dict:
+        """Статистика кэша для метрик"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0
+        }
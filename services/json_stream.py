@@ -0,0 +1,144 @@
+"""
+Разбор неполного JSON-объекта по мере поступления потокового ответа AI
+"""
+
+import json
+
+
+_WHITESPACE = ' \t\r\n'
+
+
+def _decode_string(raw: str) -> str:
+    """Декодирует содержимое JSON-строки (без кавычек), отбрасывая незавершённый escape"""
+    while raw:
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            # Оборванная escape-последовательность в конце (\, \u04)
+            cut = raw.rfind('\\')
+            if cut < 0:
+                return raw
+            raw = raw[:cut]
+    return ''
+
+
+def _read_string(buffer: str, i: int) -> tuple[str, int, bool]:
+    """
+    Читает JSON-строку, начинающуюся с кавычки в позиции i
+
+    Returns:
+        (значение, позиция после строки, строка завершена)
+    """
+    j = i + 1
+    n = len(buffer)
+    while j < n:
+        c = buffer[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == '"':
+            return _decode_string(buffer[i + 1:j]), j + 1, True
+        j += 1
+    return _decode_string(buffer[i + 1:n]), n, False
+
+
+def _skip(buffer: str, i: int, chars: str) -> int:
+    while i < len(buffer) and buffer[i] in chars:
+        i += 1
+    return i
+
+
+def _find_container_end(buffer: str, i: int) -> int:
+    """Позиция после закрывающей скобки массива/объекта или -1, если он не завершён"""
+    depth = 0
+    j = i
+    n = len(buffer)
+    while j < n:
+        c = buffer[j]
+        if c == '"':
+            _, j, complete = _read_string(buffer, j)
+            if not complete:
+                return -1
+            continue
+        if c in '[{':
+            depth += 1
+        elif c in ']}':
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    return -1
+
+
+def parse_partial_object(buffer: str) -> tuple[dict, set[str]]:
+    """
+    Извлекает поля верхнего уровня из (возможно, неполного) JSON-объекта
+
+    Незавершённые строковые значения возвращаются частично, незавершённые
+    числа, литералы, массивы и объекты пропускаются.
+
+        >>> parse_partial_object('{"specialist": "Невролог", "reasoning": "Головная бо')
+        ({'specialist': 'Невролог', 'reasoning': 'Головная бо'}, {'specialist'})
+
+    Args:
+        buffer: Накопленный текст ответа (может содержать текст до объекта)
+
+    Returns:
+        (поля, имена полностью полученных полей)
+    """
+    fields: dict = {}
+    complete: set[str] = set()
+
+    i = buffer.find('{')
+    if i < 0:
+        return fields, complete
+    i += 1
+    n = len(buffer)
+
+    while True:
+        i = _skip(buffer, i, _WHITESPACE + ',')
+        if i >= n or buffer[i] != '"':
+            break
+
+        key, i, key_complete = _read_string(buffer, i)
+        if not key_complete:
+            break
+
+        i = _skip(buffer, i, _WHITESPACE)
+        if i >= n or buffer[i] != ':':
+            break
+        i = _skip(buffer, i + 1, _WHITESPACE)
+        if i >= n:
+            break
+
+        c = buffer[i]
+        if c == '"':
+            value, i, value_complete = _read_string(buffer, i)
+            fields[key] = value
+            if not value_complete:
+                break
+            complete.add(key)
+        elif c in '[{':
+            end = _find_container_end(buffer, i)
+            if end < 0:
+                break
+            try:
+                fields[key] = json.loads(buffer[i:end])
+                complete.add(key)
+            except ValueError:
+                pass
+            i = end
+        else:
+            j = i
+            while j < n and buffer[j] not in _WHITESPACE + ',}':
+                j += 1
+            if j >= n:
+                break  # Литерал ещё не дописан
+            try:
+                fields[key] = json.loads(buffer[i:j])
+                complete.add(key)
+            except ValueError:
+                pass
+            i = j
+
+    return fields, complete
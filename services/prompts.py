@@ -0,0 +1,278 @@
+"""
+Реестр системных промптов AI
+
+Промпты версионированы и загружаются один раз при импорте: подстановки
+(например, список специалистов) выполняются сразу, размер в токенах
+считается заранее. У каждого промпта есть полный вариант и сжатый
+(compact); доля запросов со сжатым вариантом задаётся AI_PROMPT_COMPACT_RATIO,
+а результаты разбора ответов по вариантам видны в /metrics для A/B-сравнения.
+"""
+
+import zlib
+from collections import defaultdict
+
+from services.ai_scheduler import estimate_tokens
+
+
+# Имя промпта -> вариант -> (версия, текст). Подстановки - {имя}
+PROMPT_TEXTS = {
+    'validate_symptoms': {
+        'full': ('1', """Ты медицинский ассистент. Твоя задача - проверить, описывает ли пользователь медицинские симптомы или жалобы на здоровье.
+
+СИМПТОМЫ - это:
+- Физические ощущения (боль, температура, слабость, тошнота и т.д.)
+- Изменения в состоянии здоровья
+- Видимые проявления (сыпь, отек, покраснение и т.д.)
+- Нарушения функций организма
+
+НЕ СИМПТОМЫ:
+- Рецепты
+- Инструкции
+- Вопросы не о здоровье
+- Случайный текст
+- Просьбы что-то сделать
+
+Ответь СТРОГО в JSON формате:
+{
+    "is_valid": true/false,
+    "symptoms": "краткое описание симптомов" или "",
+    "reason": "почему невалидно" или ""
+}"""),
+        'compact': ('1-compact', """Определи, описывает ли сообщение медицинские симптомы или жалобы на здоровье (боль, температура, слабость, тошнота, сыпь, отек, нарушения функций организма). Рецепты, инструкции, просьбы, вопросы не о здоровье и случайный текст - не симптомы.
+Ответ - только JSON:
+{"is_valid": true/false, "symptoms": "кратко симптомы" или "", "reason": "почему невалидно" или ""}"""),
+    },
+    'validate_symptoms_batch': {
+        'full': ('1', """Ты медицинский ассистент. Тебе пришлют несколько пронумерованных сообщений от разных пользователей.
+Для КАЖДОГО сообщения независимо проверь, описывает ли оно медицинские симптомы или жалобы на здоровье.
+
+СИМПТОМЫ: физические ощущения (боль, температура, слабость, тошнота), изменения в состоянии
+здоровья, видимые проявления (сыпь, отек, покраснение), нарушения функций организма.
+НЕ СИМПТОМЫ: рецепты, инструкции, вопросы не о здоровье, случайный текст, просьбы что-то сделать.
+
+Ответь СТРОГО в JSON формате, по одному элементу на каждое сообщение:
+{
+    "results": [
+        {"id": номер сообщения, "is_valid": true/false, "symptoms": "краткое описание" или "", "reason": "почему невалидно" или ""}
+    ]
+}"""),
+        'compact': ('1-compact', """Сообщения пронумерованы [1], [2]... Для каждого независимо определи, описывает ли оно медицинские симптомы или жалобы на здоровье. Рецепты, инструкции, просьбы, вопросы не о здоровье и случайный текст - не симптомы.
+Ответ - только JSON:
+{"results": [{"id": номер, "is_valid": true/false, "symptoms": "кратко" или "", "reason": "почему невалидно" или ""}]}"""),
+    },
+    'analyze_symptoms': {
+        'full': ('1', """Ты медицинский ассистент. Выполни две задачи за один ответ.
+
+1. ПРОВЕРКА: описывает ли пользователь медицинские симптомы или жалобы на здоровье
+(боль, температура, слабость, тошнота, сыпь, отек, нарушения функций организма).
+НЕ симптомы: рецепты, инструкции, вопросы не о здоровье, случайный текст, просьбы.
+
+2. УЛУЧШЕНИЕ (только если это симптомы): исправь ошибки, структурируй, используй
+медицинские термины, убери слова-паразиты. Сохрани всю информацию (локализация,
+интенсивность, время). НЕ добавляй того, чего нет в оригинале, НЕ ставь диагнозы.
+
+Пример улучшения:
+"у меня как бы голова болит и типа в висках стреляет уже 2 день" ->
+"Головная боль в области висков, стреляющего характера. Беспокоит в течение 2 дней."
+
+Ответь СТРОГО в JSON формате:
+{
+    "is_valid": true/false,
+    "reason": "почему невалидно" или "",
+    "improved": "улучшенный текст симптомов" или ""
+}"""),
+        'compact': ('1-compact', """Проверь, описаны ли медицинские симптомы (не рецепты, не просьбы, не случайный текст). Если да - перепиши их для врача: исправь ошибки, убери слова-паразиты, используй медицинские термины, сохрани локализацию, интенсивность и время. Ничего не добавляй, не ставь диагнозы.
+Ответ - только JSON:
+{"is_valid": true/false, "reason": "почему невалидно" или "", "improved": "текст для врача" или ""}"""),
+    },
+    'improve_symptoms_text': {
+        'full': ('1', """Ты медицинский редактор. Твоя задача - улучшить и структурировать описание симптомов от пациента, сохраняя всю важную информацию.
+
+ПРАВИЛА:
+1. Исправь грамматические и орфографические ошибки
+2. Структурируй информацию логично
+3. Используй правильные медицинские термины
+4. Сохрани ВСЮ важную информацию (локализация боли, интенсивность, время и т.д.)
+5. Убери лишние слова ("типа", "как бы", "ну вот" и т.д.)
+6. Сделай текст понятным для врача
+7. НЕ добавляй информацию, которой нет в оригинале
+8. НЕ ставь диагнозы
+
+ФОРМАТ ОТВЕТА: просто улучшенный текст, без дополнительных комментариев
+
+Примеры:
+Исходно: "у меня как бы голова болит и типа в висках стреляет уже 2 день"
+Улучшено: "Головная боль в области висков, стреляющего характера. Беспокоит в течение 2 дней."
+
+Исходно: "жывот болит справо низу когда хожу"
+Улучшено: "Боль в правой нижней части живота, усиливается при ходьбе."
+
+Исходно: "температура высокая кашель сухой слабость"
+Улучшено: "Повышенная температура тела. Сухой кашель. Общая слабость."""),
+        'compact': ('1-compact', """Перепиши жалобы пациента для врача: исправь ошибки, убери слова-паразиты, используй медицинские термины. Сохрани локализацию, интенсивность и время. Ничего не добавляй, не ставь диагнозы.
+Пример: "голова болит и типа в висках стреляет уже 2 день" -> "Головная боль в области висков, стреляющего характера. Беспокоит в течение 2 дней."
+Ответ - только улучшенный текст, без комментариев."""),
+    },
+    'generate_additional_symptoms': {
+        # Язык, болезни и повторы дополнительно проверяются локально (services/symptom_lexicon.py)
+        'full': ('3', """Ты опытный врач-диагност. На основе основных симптомов пациента предложи 8-10 дополнительных симптомов для уточнения диагноза.
+
+ПРАВИЛА:
+1. Только литературный русский язык
+2. Симптомы должны быть КОРОТКИМИ (2-4 слова)
+3. Только симптомы, НЕ названия болезней
+4. Релевантные основным жалобам
+5. Разнообразные (не повторяться)
+
+Формат ответа: JSON-объект
+{"symptoms": ["симптом 1", "симптом 2", ..., "симптом 8"]}"""),
+        'compact': ('3-compact', """Ты врач-диагност. Предложи 8-10 дополнительных симптомов для уточнения основных жалоб: по-русски, 2-4 слова, без названий болезней, без повторов.
+Ответ - только JSON: {"symptoms": ["симптом 1", "симптом 2"]}"""),
+    },
+    'recommend_doctor': {
+        'full': ('1', """Ты опытный врач-терапевт. На основе симптомов пациента:
+1. Определи наиболее подходящего специалиста из списка
+2. Оцени уровень срочности обращения
+3. Кратко объясни почему
+
+ДОСТУПНЫЕ СПЕЦИАЛИСТЫ:
+{specialists}
+
+УРОВНИ СРОЧНОСТИ:
+- emergency: Требуется скорая помощь (угроза жизни)
+- high: Обратиться в течение 24 часов
+- medium: Обратиться в течение недели
+- low: Плановый прием
+
+Ответь СТРОГО в JSON формате (поля в этом порядке):
+{
+    "specialist": "Название специалиста из списка",
+    "urgency": "emergency/high/medium/low",
+    "reasoning": "Краткое обоснование (2-3 предложения)"
+}"""),
+        'compact': ('1-compact', """Ты врач-терапевт. По симптомам выбери специалиста из списка, оцени срочность и кратко обоснуй (2-3 предложения).
+Специалисты: {specialists}
+Срочность: emergency - угроза жизни, high - в течение 24 часов, medium - в течение недели, low - плановый приём.
+Ответ - только JSON (поля в этом порядке):
+{"specialist": "из списка", "urgency": "emergency/high/medium/low", "reasoning": "обоснование"}"""),
+    },
+}
+
+# Бюджет токенов на вызов: (промпт + сообщение, максимум ответа).
+# Для пакетной проверки максимум ответа - на одно сообщение пакета.
+TOKEN_BUDGETS = {
+    'validate_symptoms': (900, 150),
+    'validate_symptoms_batch': (3000, 80),
+    'analyze_symptoms': (1500, 800),
+    'improve_symptoms_text': (1500, 800),
+    'generate_additional_symptoms': (1000, 300),
+    'recommend_doctor': (1600, 400),
+}
+
+# Бюджет для промптов, которых нет в TOKEN_BUDGETS
+DEFAULT_BUDGET = (2000, 1024)
+
+# Запас на служебные токены сообщений (роли, разметка чата)
+MESSAGE_OVERHEAD_TOKENS = 20
+
+
+class Prompt:
+    """Готовый к отправке системный промпт"""
+    __slots__ = ('name', 'variant', 'version', 'text', 'tokens')
+
+    def __init__(self, name: str, variant: str, version: str, text: str):
+        self.name = name
+        self.variant = variant
+        self.version = version
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+
+class PromptRegistry:
+    """Промпты по именам, выбор варианта для A/B и учёт токенов"""
+
+    def __init__(self, texts: dict, budgets: dict, compact_ratio: float = 0.0, **params: str):
+        """
+        Args:
+            texts: Имя -> вариант -> (версия, текст)
+            budgets: Имя -> (бюджет входа, максимум ответа) в токенах
+            compact_ratio: Доля запросов со сжатым вариантом (0..1)
+            params: Подстановки в тексты промптов
+        """
+        self.budgets = budgets
+        self.compact_ratio = compact_ratio
+        self._prompts: dict[tuple[str, str], Prompt] = {}
+        for name, variants in texts.items():
+            for variant, (version, text) in variants.items():
+                for key, value in params.items():
+                    text = text.replace('{' + key + '}', value)
+                self._prompts[(name, variant)] = Prompt(name, variant, version, text)
+
+        self._stats: dict[tuple[str, str], dict] = defaultdict(
+            lambda: {'calls': 0, 'input_tokens': 0, 'parsed': 0, 'failed': 0}
+        )
+
+    def get(self, name: str, key: str = "") -> Prompt:
+        """
+        Промпт для запроса
+
+        Вариант выбирается детерминированно по key (один и тот же текст
+        пользователя всегда получает один вариант, что сохраняет кэш и
+        объединение одинаковых запросов).
+
+        Args:
+            name: Имя промпта (обычно имя метода AIService)
+            key: Ключ распределения по вариантам A/B
+        """
+        variant = 'full'
+        if self.compact_ratio > 0 and (name, 'compact') in self._prompts:
+            bucket = zlib.crc32(f"{name}:{key}".encode('utf-8')) % 1000
+            if bucket < self.compact_ratio * 1000:
+                variant = 'compact'
+        return self._prompts[(name, variant)]
+
+    def max_tokens(self, name: str, items: int = 1) -> int:
+        """Максимум токенов ответа"""
+        return self.budgets.get(name, DEFAULT_BUDGET)[1] * items
+
+    def fit(self, prompt: Prompt, text: str, reserved: int = 0) -> str:
+        """
+        Обрезает текст пользователя, чтобы запрос уложился в бюджет входа
+
+        Args:
+            prompt: Системный промпт запроса
+            text: Текст пользователя
+            reserved: Токены остальной части сообщения (шаблон, другие поля)
+        """
+        budget = self.budgets.get(prompt.name, DEFAULT_BUDGET)[0]
+        available = budget - prompt.tokens - reserved - MESSAGE_OVERHEAD_TOKENS
+        if estimate_tokens(text) <= available:
+            return text
+
+        # estimate_tokens: ~3 символа на токен
+        cut = text[:max(0, available) * 3]
+        if ' ' in cut:
+            cut = cut.rsplit(' ', 1)[0]
+        print(f"DEBUG AI: {prompt.name} input trimmed from {len(text)} to {len(cut)} chars")
+        return cut
+
+    def record(self, prompt: Prompt, user_message: str):
+        """Учитывает отправленный запрос"""
+        stats = self._stats[(prompt.name, prompt.variant)]
+        stats['calls'] += 1
+        stats['input_tokens'] += prompt.tokens + estimate_tokens(user_message)
+
+    def record_outcome(self, prompt: Prompt, parsed: bool):
+        """Учитывает, удалось ли разобрать ответ (сигнал качества варианта)"""
+        self._stats[(prompt.name, prompt.variant)]['parsed' if parsed else 'failed'] += 1
+
+    def stats(self) -> dict:
+        result = {'compact_ratio': self.compact_ratio, 'prompts': {}}
+        for (name, variant), prompt in self._prompts.items():
+            stats = self._stats.get((name, variant))
+            entry = {'version': prompt.version, 'tokens': prompt.tokens}
+            if stats:
+                entry.update(stats)
+                entry['avg_input_tokens'] = round(stats['input_tokens'] / stats['calls'], 1) if stats['calls'] else 0.0
+            result['prompts'][f"{name}:{variant}"] = entry
+        return result
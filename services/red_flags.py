@@ -0,0 +1,349 @@
+"""
+Локальный детектор признаков неотложных состояний ("красных флагов")
+
+Работает без обращения к AI: правила компилируются один раз при импорте.
+Два механизма:
+- фразы (одно регулярное выражение на все шаблоны) - для устойчивых
+  формулировок вроде "не могу дышать" или "температура 40";
+- правила из групп слов: правило срабатывает, если в тексте есть хотя бы
+  одно слово из каждой группы. Слова сравниваются по основам; длинные
+  основы - с допуском одной опечатки (удаление, вставка или замена буквы).
+
+Ложное срабатывание завершает консультацию вызовом скорой, поэтому
+не учитываются:
+- слова после отрицания и перед ним ("нет обмороков и судорог",
+  "обмороков нет"); "не" с глаголом считается одним словом и может
+  входить в правило ("кровотечение не останавливается");
+- слово, к которому относится смягчение ("слегка отекли губы",
+  "отек горла небольшой"), - остальная часть фразы учитывается;
+- части текста (между запятыми и точками) о прошлом ("обморок год назад");
+- описания с признаками безопасной причины ("сводит ногу судорогой").
+"""
+
+import re
+
+from services.russian_text import stem
+
+
+# Фразы, сразу указывающие на неотложное состояние: шаблон -> описание
+RED_FLAG_PHRASES = {
+    r'не\s+могу\s+(?:вдохнуть|дышать|нормально\s+дышать)': 'затруднение дыхания',
+    r'нечем\s+дышать': 'затруднение дыхания',
+    r'(?:потер|теря)\w*\s+сознани\w*': 'потеря сознания',
+    r'без\s+сознани\w*': 'потеря сознания',
+    r'не\s+хочу\s+жить': 'угроза жизни (суицидальные мысли)',
+    r'покончить\s+с\s+собой': 'угроза жизни (суицидальные мысли)',
+    r'суицид\w*': 'угроза жизни (суицидальные мысли)',
+    # "Не могу говорить громко" - осиплость, а не нарушение речи
+    r'не\s+(?:могу|может)\s+говорить(?!\s+(?:громко|громче|долго|шепотом|из-за|от))': 'нарушение речи',
+    # Число должно относиться к температуре, а не к минутам или дням
+    r'(?:температур\w*|жар)\s*(?:до|выше|под|около|за)?\s*4[0-2](?:[.,]\d)?(?!\d)': 'очень высокая температура',
+    r'не\s+(?:могу|можем|может|удается|получается)\s+остановить\s+кров\w*': 'кровотечение',
+}
+
+# Правила: описание -> группы синонимов (нужно совпадение в каждой группе).
+# Слово вида "не останавливается" совпадает только вместе с отрицанием.
+RED_FLAG_RULES = [
+    ('признаки сердечного приступа', [
+        ['боль', 'болит', 'давит', 'давящая', 'жжет', 'жжение', 'сжимает', 'колет'],
+        ['груди', 'грудь', 'грудине', 'сердце', 'сердца'],
+        ['рука', 'руку', 'руке', 'челюсть', 'лопатку', 'отдает', 'немеет', 'онемение',
+         'одышка', 'давящая'],
+    ]),
+    ('признаки инсульта', [
+        ['лицо', 'лица', 'рта', 'улыбка'],
+        ['перекосило', 'перекошено', 'асимметрия', 'онемело', 'онемение', 'опустился', 'опустилась'],
+    ]),
+    ('признаки инсульта', [
+        ['речь', 'речи', 'язык'],
+        ['невнятная', 'нарушена', 'нарушение', 'заплетается', 'пропала', 'спутанная'],
+    ]),
+    ('признаки инсульта', [
+        ['онемение', 'немеет', 'онемела', 'слабость', 'отнялась', 'отнялись'],
+        ['половины', 'половина', 'сторона', 'стороны'],
+        ['тела', 'лица'],
+    ]),
+    ('признаки инсульта', [
+        ['отнялась', 'отнялись', 'парализовало'],
+        ['рука', 'нога', 'ноги', 'руки', 'половина'],
+    ]),
+    ('затруднение дыхания', [
+        ['задыхаюсь', 'удушье', 'удушья', 'задыхается', 'синеют', 'посинели'],
+    ]),
+    ('потеря сознания', [
+        ['обморок', 'обмороки', 'отключился', 'отключилась'],
+    ]),
+    ('кровотечение', [
+        ['кровью', 'кровь', 'крови', 'кровавая', 'кровавый'],
+        ['рвота', 'рвет', 'кашель', 'кашляю', 'стул', 'кал', 'моча', 'сильное', 'обильное'],
+    ]),
+    ('кровотечение', [
+        ['кровотечение'],
+        ['сильное', 'обильное', 'не останавливается', 'не прекращается', 'не проходит'],
+    ]),
+    # Отек языка или гортани опасен сам по себе
+    ('тяжёлая аллергическая реакция', [
+        ['отек', 'отекает', 'отекло', 'отекли', 'опухает', 'опухло', 'опухли', 'распухает'],
+        ['языка', 'язык', 'гортани', 'гортань'],
+    ]),
+    # Отек горла, лица или губ - только вместе с затруднением дыхания или аллергией
+    ('тяжёлая аллергическая реакция', [
+        ['отек', 'отекает', 'отекло', 'отекли', 'опухает', 'опухло', 'опухли', 'распухает'],
+        ['горла', 'горло', 'лицо', 'лица', 'губы'],
+        ['дышать', 'дыхание', 'вдохнуть', 'задыхаюсь', 'удушье', 'крапивница', 'укус',
+         'аллергия', 'аллергическая'],
+    ]),
+    ('судороги', [
+        ['судороги', 'судорога', 'судорожный', 'припадок', 'конвульсии'],
+    ]),
+    ('острая боль в животе', [
+        ['кинжальная', 'невыносимая', 'нестерпимая', 'резчайшая'],
+        ['боль', 'болит', 'боли'],
+        ['живот', 'живота', 'животе'],
+    ]),
+]
+
+# Признаки безопасной причины: описание -> слова, при которых оно не срабатывает
+RED_FLAG_EXCLUSIONS = {
+    # Осиплость и боль в горле
+    'нарушение речи': ['голос', 'осип', 'охрип', 'хрипота', 'горло', 'горле'],
+    # Мышечная судорога ("сводит ногу", "судороги в икрах")
+    'судороги': ['сводит', 'свело', 'свела', 'икры', 'икрах', 'икроножные'],
+    # Онемение после местной анестезии
+    'признаки инсульта': ['анестезии', 'анестезия', 'наркоза', 'укола', 'заморозки', 'стоматолога'],
+}
+
+# Слова отрицания
+NEGATIONS = frozenset({'не', 'нет', 'без', 'ни'})
+
+# Глаголы, с которыми "не" отрицает существительное ("не было обмороков")
+NEGATED_BE = frozenset({'было', 'были', 'был', 'была', 'бывает', 'бывало'})
+
+# Союзы, после которых отрицание не действует ("обмороков нет, но судороги")
+CONTRAST_CONJUNCTIONS = frozenset({'но', 'а', 'однако', 'зато'})
+
+# Смягчающие наречия: относятся к следующему слову ("слегка отекли")
+MITIGATING_ADVERBS = frozenset({'слегка', 'чуть', 'немного', 'незначительно', 'слабо'})
+
+# Смягчающие прилагательные: к следующему слову или, в конце фразы,
+# к её первому слову ("отек горла небольшой")
+MITIGATING_ADJECTIVES = ('небольш', 'незначительн', 'слабовыраженн')
+
+# Части текста о прошлых событиях
+PAST_RE = re.compile(
+    r'\b(?:раньше|давно|когда-то|в\s+прошлом|(?:\d+\s+)?(?:год|года|лет|месяц\w*|недел\w*)\s+назад)\b'
+)
+
+# Границы частей текста (точка в "37.4" границей не считается)
+_CLAUSE_RE = re.compile(r'[,;!?\n]|\.(?!\d)')
+
+_TOKEN_RE = re.compile(r'[а-яa-z0-9]+')
+
+# Минимальная длина основы, для которой допускается опечатка
+# (короче - слишком много настоящих слов на расстоянии одной буквы: "спин" / "сине")
+FUZZY_MIN_LENGTH = 6
+
+# Частые в жалобах слова, которые не исправляются как опечатки
+# (иначе одна буква превращает их в другое слово словаря)
+COMMON_WORDS = [
+    'спина', 'спине', 'шея', 'шеи', 'голова', 'головы', 'горле', 'нога', 'ноге', 'колено',
+    'колени', 'живот', 'желудок', 'желудка', 'печень', 'почки', 'кожа', 'кожи', 'сыпь',
+    'кашель', 'кашля', 'насморк', 'кишечник', 'суставы', 'суставах', 'мышцы', 'мышцах',
+    'поясница', 'пояснице', 'лопатка', 'лопатки', 'зубы', 'зуба', 'десна', 'уши', 'глаза',
+    'глазах', 'нос', 'носа', 'ребро', 'ребра', 'ребрами', 'грудная', 'грудной', 'грудном',
+    'тошнота', 'тошнит', 'рвет', 'слабость', 'болью', 'болела', 'болело', 'больно',
+    'давление', 'давлением', 'дыхании', 'кровит', 'кровоточит', 'синяк', 'синяки',
+    'опухоль', 'отдых', 'отдыхе', 'сердцебиение', 'стулом', 'речью', 'лицом',
+    'глотать', 'глотании', 'глотание',
+]
+
+
+def _deletes(word: str) -> set[str]:
+    """Все варианты слова с одной удалённой буквой"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class RedFlagDetector:
+    """Предкомпилированный детектор красных флагов"""
+
+    def __init__(self, phrases: dict[str, str], rules: list[tuple[str, list[list[str]]]],
+                 exclusions: dict[str, list[str]] | None = None):
+        self._phrase_names = list(phrases.values())
+        self._phrase_re = re.compile(
+            '|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(phrases))
+        )
+
+        self._rules = [
+            (name, [frozenset(self._word_stem(word) for word in group) for group in groups])
+            for name, groups in rules
+        ]
+        self._exclusions = {
+            name: frozenset(stem(word) for word in words)
+            for name, words in (exclusions or {}).items()
+        }
+
+        # Словарь основ и индекс удалений для поиска с одной опечаткой
+        self._vocab = {s for _, groups in self._rules for group in groups for s in group}
+        self._known = self._vocab | {stem(word) for word in COMMON_WORDS}
+        self._fuzzy: dict[str, set[str]] = {}
+        for s in self._vocab:
+            if len(s) >= FUZZY_MIN_LENGTH and ' ' not in s:
+                for variant in _deletes(s):
+                    self._fuzzy.setdefault(variant, set()).add(s)
+
+    @staticmethod
+    def _word_stem(word: str) -> str:
+        """Основа слова правила ("не останавливается" -> "не останавлив")"""
+        if word.startswith('не '):
+            return 'не ' + stem(word[3:])
+        return stem(word)
+
+    def _resolve(self, token: str) -> set[str]:
+        """Основы словаря, совпадающие с основой токена с точностью до одной опечатки"""
+        if token in self._vocab:
+            return {token}
+        # Настоящее слово - не опечатка, даже если похоже на слово словаря
+        if token in self._known or len(token) < FUZZY_MIN_LENGTH - 1:
+            return set()
+
+        found = set(self._fuzzy.get(token, ()))           # пропущена буква
+        for variant in _deletes(token):
+            if variant in self._vocab and len(variant) >= FUZZY_MIN_LENGTH:
+                found.add(variant)                        # лишняя буква
+            found.update(self._fuzzy.get(variant, ()))    # замена / перестановка
+        return found
+
+    def _excluded(self, name: str, text_stems: set[str]) -> bool:
+        return bool(self._exclusions.get(name, frozenset()) & text_stems)
+
+    @staticmethod
+    def _relevant_clauses(text: str) -> list[str]:
+        """Части текста без упоминаний прошлого"""
+        return [clause for clause in _CLAUSE_RE.split(text) if not PAST_RE.search(clause)]
+
+    @staticmethod
+    def _segments(words: list[str]) -> list[tuple[int, int]]:
+        """Границы отрезков фразы между противительными союзами"""
+        bounds, start = [], 0
+        for i, word in enumerate(words):
+            if word in CONTRAST_CONJUNCTIONS:
+                bounds.append((start, i))
+                start = i + 1
+        bounds.append((start, len(words)))
+        return bounds
+
+    @classmethod
+    def _ignored(cls, words: list[str]) -> list[int | None]:
+        """
+        Слова под отрицанием или смягчением
+
+        Returns:
+            Для каждого слова - позиция отменяющего его слова (или None)
+        """
+        ignored: list[int | None] = [None] * len(words)
+
+        def mark(positions, source: int):
+            for i in positions:
+                if ignored[i] is None and i != source:
+                    ignored[i] = source
+
+        for start, end in cls._segments(words):
+            for i in range(start, end):
+                word = words[i]
+                following = i + 1 < end
+
+                if word in NEGATIONS:
+                    if word == 'не' and following and words[i + 1] not in NEGATED_BE:
+                        # "не" с глаголом: отрицается одно следующее слово
+                        mark([i + 1], i)
+                    elif word == 'не' and following and i + 2 == end and i > start:
+                        # "судорог не было": отрицание после слов
+                        mark(range(start, i + 2), i)
+                    elif word in ('не', 'нет') and i > start and i + 1 == end:
+                        # "обмороков и судорог нет"
+                        mark(range(start, i), i)
+                    else:
+                        # "нет обмороков и судорог", "без температуры", "не было рвоты"
+                        mark(range(i + 1, end), i)
+
+                elif word in MITIGATING_ADVERBS or word.startswith(MITIGATING_ADJECTIVES):
+                    target = i + 1
+                    while target < end and (words[target] in MITIGATING_ADVERBS
+                                            or words[target].startswith(MITIGATING_ADJECTIVES)):
+                        target += 1
+                    if target < end:
+                        mark([target], i)
+                    elif word.startswith(MITIGATING_ADJECTIVES) and i > start:
+                        mark([start], i)
+
+        return ignored
+
+    def detect(self, text: str) -> dict | None:
+        """
+        Ищет признаки неотложного состояния
+
+        Args:
+            text: Текст симптомов
+
+        Returns:
+            {'name': str, 'matched': list[str]} или None
+        """
+        text = text.lower().replace('ё', 'е')
+        text_stems = {stem(word) for word in _TOKEN_RE.findall(text)}
+
+        stems: set[str] = set()
+        for clause in self._relevant_clauses(text):
+            tokens = list(_TOKEN_RE.finditer(clause))
+            words = [token.group() for token in tokens]
+            ignored = self._ignored(words)
+
+            for match in self._phrase_re.finditer(clause):
+                name = self._phrase_names[int(match.lastgroup[1:])]
+                span = [i for i, token in enumerate(tokens)
+                        if match.start() <= token.start() < match.end()]
+                # Отменено словом вне фразы ("не терял сознание", "потери сознания нет")
+                if any(ignored[i] is not None and ignored[i] not in span for i in span):
+                    continue
+                if not self._excluded(name, text_stems):
+                    return {'name': name, 'matched': [match.group()]}
+
+            for i, word in enumerate(words):
+                if ignored[i] is None:
+                    stems |= self._resolve(stem(word))
+                if i and words[i - 1] == 'не' and ignored[i - 1] is None:
+                    stems.add('не ' + stem(word))
+        if not stems:
+            return None
+
+        for name, groups in self._rules:
+            hits = [group & stems for group in groups]
+            if all(hits) and not self._excluded(name, text_stems):
+                return {'name': name, 'matched': sorted(set().union(*hits))}
+
+        return None
+
+
+_detector = RedFlagDetector(RED_FLAG_PHRASES, RED_FLAG_RULES, RED_FLAG_EXCLUSIONS)
+
+
+def detect_red_flags(*texts: str) -> dict | None:
+    """
+    Проверяет тексты на признаки неотложного состояния
+
+        >>> detect_red_flags("сильная боль в груди, немеет левая рука")['name']
+        'признаки сердечного приступа'
+    """
+    return _detector.detect(' '.join(t for t in texts if t))
+
+
+# Текст экстренной рекомендации (без обращения к AI)
+EMERGENCY_GUIDANCE = (
+    "🚨 *СРОЧНО! Требуется скорая помощь*\n\n"
+    "Ваши симптомы могут указывать на угрожающее жизни состояние "
+    "({name}).\n\n"
+    "📞 *Немедленно вызовите скорую помощь: 103 или 112*\n\n"
+    "• Не ждите, что симптомы пройдут сами\n"
+    "• Не садитесь за руль самостоятельно\n"
+    "• Не оставайтесь одни до приезда врачей\n\n"
+    "Бот не заменяет медицинскую помощь."
+)
@@ -0,0 +1,73 @@
+"""
+Нормализация русскоязычных описаний симптомов
+"""
+
+import re
+from functools import lru_cache
+
+
+# Служебные и разговорные слова, не влияющие на смысл жалобы
+# (отрицания не, нет, без меняют смысл и стоп-словами не являются)
+STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'на', 'с', 'со', 'у', 'к', 'ко', 'по', 'о', 'об', 'от', 'до',
+    'из', 'за', 'при', 'для', 'а', 'но', 'или', 'же', 'ли', 'бы', 'то',
+    'меня', 'мне', 'мой', 'моя', 'мои', 'я', 'есть', 'уже', 'очень', 'как',
+    'типа', 'ну', 'вот', 'еще', 'также', 'так', 'когда', 'что', 'это',
+    'немного', 'иногда', 'беспокоит'
+})
+
+_TOKEN_RE = re.compile(r'[а-яa-z0-9]+')
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбивает текст на слова в нижнем регистре (ё заменяется на е)"""
+    return _TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def normalize_symptoms(text: str) -> str:
+    """
+    Приводит описание симптомов к каноническому виду для использования в ключах кэша
+    
+    Регистр, пунктуация, порядок слов и стоп-слова не учитываются:
+        >>> normalize_symptoms("Температура, кашель!")
+        'кашель температура'
+        >>> normalize_symptoms("у меня кашель и температура")
+        'кашель температура'
+        >>> normalize_symptoms("не болит голова")
+        'болит голова не'
+    """
+    words = {word for word in tokenize(text) if word not in STOP_WORDS}
+    return ' '.join(sorted(words))
+
+
+# Окончания для упрощённого стемминга (от длинных к коротким)
+_ENDINGS = tuple(sorted({
+    # Прилагательные и причастия
+    'ыми', 'ими', 'ого', 'его', 'ому', 'ему', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+    'ый', 'ий', 'ой', 'ую', 'юю', 'ых', 'их', 'ым', 'им',
+    # Существительные
+    'ами', 'ями', 'иям', 'иях', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ов', 'ев', 'ей',
+    'ью', 'ия', 'ии', 'ию', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+    # Глаголы
+    'ается', 'яется', 'ится', 'ется', 'ются', 'ятся', 'утся', 'атся',
+    'ает', 'яет', 'ит', 'ет', 'ют', 'ят', 'ут', 'ат', 'ешь', 'ишь',
+}, key=len, reverse=True))
+
+
+@lru_cache(maxsize=16384)
+def stem(word: str) -> str:
+    """
+    Упрощённый стемминг русского слова (отбрасывание окончания)
+    
+        >>> stem('головные'), stem('головная'), stem('боли'), stem('болит')
+        ('головн', 'головн', 'бол', 'бол')
+    """
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def content_stems(text: str) -> list[str]:
+    """Основы значимых слов текста (без стоп-слов)"""
+    return [stem(word) for word in tokenize(text) if word not in STOP_WORDS]
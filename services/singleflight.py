@@ -0,0 +1,67 @@
+"""
+Single-flight: одновременные одинаковые запросы выполняются один раз
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    """Выполняющийся запрос и количество ожидающих его вызовов"""
+    __slots__ = ('task', 'waiters')
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Объединяет одновременные вызовы с одинаковым ключом в один запрос"""
+    
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self.executed = 0  # Реально выполненные запросы
+        self.shared = 0    # Вызовы, получившие результат чужого запроса
+    
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет factory() или присоединяется к уже выполняющемуся запросу с тем же ключом
+        
+        Если все ожидающие вызовы отменены, общий запрос тоже отменяется.
+        
+        Args:
+            key: Ключ запроса
+            factory: Функция, создающая корутину запроса
+        
+        Returns:
+            Результат запроса
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.executed += 1
+        else:
+            self.shared += 1
+        
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+    
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+    
+    def stats(self) -> dict:
+        """Статистика для метрик"""
+        return {
+            'in_flight': len(self._calls),
+            'executed': self.executed,
+            'shared': self.shared
+        }
@@ -0,0 +1,89 @@
+r"""
+Разбор структурированных ответов AI
+
+Вместо жадного поиска r'\{.*\}' ответ разбирается терпимо: снимаются
+markdown-блоки, JSON ищется с первой открывающей скобки, после которой
+декодируется корректное значение (комментарии модели до и после
+игнорируются), а оборванный объект разбирается по полностью полученным
+полям. Результат проверяется pydantic-схемой метода.
+"""
+
+import json
+import re
+from typing import Any, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from services.json_stream import parse_partial_object
+
+
+SchemaT = TypeVar('SchemaT', bound=BaseModel)
+
+_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+
+_decoder = json.JSONDecoder()
+
+
+class StructuredOutputError(ValueError):
+    """Ответ AI не удалось разобрать или он не соответствует схеме"""
+
+
+def extract_json(text: str) -> Any:
+    """
+    Извлекает первое JSON-значение (объект или массив) из ответа модели
+
+    Args:
+        text: Ответ модели
+
+    Returns:
+        Декодированное значение
+
+    Raises:
+        StructuredOutputError: JSON в ответе не найден
+    """
+    candidates = [block for block in _FENCE_RE.findall(text)] + [text]
+    for candidate in candidates:
+        candidate = candidate.strip()
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+
+        for start, char in enumerate(candidate):
+            if char not in '{[':
+                continue
+            try:
+                value, _ = _decoder.raw_decode(candidate, start)
+                return value
+            except ValueError:
+                continue
+
+    # Оборванный ответ (лимит токенов): берём полностью полученные поля
+    fields, complete = parse_partial_object(text)
+    if complete:
+        return {key: fields[key] for key in complete}
+
+    raise StructuredOutputError("в ответе нет JSON")
+
+
+def parse_structured(text: str, schema: type[SchemaT], context: dict | None = None) -> SchemaT:
+    """
+    Разбирает ответ модели и проверяет его схемой
+
+    Args:
+        text: Ответ модели
+        schema: Pydantic-схема ответа
+        context: Контекст валидации (например, допустимые значения)
+
+    Raises:
+        StructuredOutputError: Ответ не разобран или не прошёл схему
+    """
+    data = extract_json(text)
+    try:
+        return schema.model_validate(data, context=context)
+    except ValidationError as e:
+        errors = '; '.join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'ответ'}: {error['msg']}"
+            for error in e.errors()
+        )
+        raise StructuredOutputError(errors) from e
@@ -0,0 +1,364 @@
+"""
+Постоянное хранилище дополнительных симптомов (общий кэш между перезапусками)
+
+In-process кэш AIService теряется при каждом деплое и не общий у реплик.
+Хранилище держит готовые списки в таблице Supabase или в локальном файле
+SQLite с ключом (нормализованные основные симптомы, группа давности):
+
+- чтение сквозное: промах in-process кэша -> запись хранилища -> AI;
+- запись отложенная: новые списки и счётчики попаданий накапливаются
+  в памяти и сбрасываются пачкой фоновой задачей;
+- у записей есть срок жизни, просроченные удаляются при сбросе.
+
+Ошибки хранилища не прерывают консультацию: запрос просто уходит в AI.
+
+Прогрев по самым частым жалобам из таблицы consultations:
+    python -m services.suggestion_store --top 50
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+
+# Таблица Supabase (схема - в supabase_schema.sql)
+SUPABASE_TABLE = 'symptom_suggestions'
+
+
+class SQLiteSuggestionBackend:
+    """
+    Хранилище в локальном файле SQLite
+
+    Методы вызываются из потоков asyncio.to_thread; одно соединение
+    защищено блокировкой, поэтому запросы разных потоков не смешиваются.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS symptom_suggestions (
+                symptoms_key TEXT NOT NULL,
+                duration_key TEXT NOT NULL,
+                suggestions TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (symptoms_key, duration_key)
+            )"""
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def load(self, key: tuple[str, str]) -> tuple[list[str], float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT suggestions, expires_at FROM symptom_suggestions "
+                "WHERE symptoms_key = ? AND duration_key = ?",
+                key
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def save(self, rows: list[tuple[tuple[str, str], list[str], float]], hits: dict):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO symptom_suggestions "
+                "(symptoms_key, duration_key, suggestions, expires_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (symptoms_key, duration_key) DO UPDATE SET "
+                "suggestions = excluded.suggestions, expires_at = excluded.expires_at, "
+                "updated_at = excluded.updated_at",
+                [(*key, json.dumps(symptoms, ensure_ascii=False), expires_at, now)
+                 for key, symptoms, expires_at in rows]
+            )
+            self._conn.executemany(
+                "UPDATE symptom_suggestions SET hits = hits + ? "
+                "WHERE symptoms_key = ? AND duration_key = ?",
+                [(count, *key) for key, count in hits.items()]
+            )
+
+    def purge(self) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM symptom_suggestions WHERE expires_at < ?", (time.time(),)
+            )
+        return cursor.rowcount
+
+    def keys(self) -> set[tuple[str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT symptoms_key, duration_key FROM symptom_suggestions WHERE expires_at >= ?",
+                (time.time(),)
+            ).fetchall()
+        return {tuple(row) for row in rows}
+
+
+class SupabaseSuggestionBackend:
+    """Хранилище в таблице Supabase (общее для всех реплик)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self, key: tuple[str, str]) -> tuple[list[str], float] | None:
+        rows = self.client.table(SUPABASE_TABLE).select('suggestions,expires_at').eq(
+            'symptoms_key', key[0]
+        ).eq('duration_key', key[1]).limit(1).execute().data
+        return (rows[0]['suggestions'], rows[0]['expires_at']) if rows else None
+
+    def save(self, rows: list[tuple[tuple[str, str], list[str], float]], hits: dict):
+        now = time.time()
+        if rows:
+            self.client.table(SUPABASE_TABLE).upsert([
+                {
+                    'symptoms_key': key[0],
+                    'duration_key': key[1],
+                    'suggestions': symptoms,
+                    'expires_at': expires_at,
+                    'updated_at': now
+                }
+                for key, symptoms, expires_at in rows
+            ], on_conflict='symptoms_key,duration_key').execute()
+        for key, count in hits.items():
+            # Атомарное увеличение счётчика - функцией в базе (supabase_schema.sql)
+            self.client.rpc('increment_suggestion_hits', {
+                'p_symptoms_key': key[0], 'p_duration_key': key[1], 'p_hits': count
+            }).execute()
+
+    def purge(self) -> int:
+        rows = self.client.table(SUPABASE_TABLE).delete().lt(
+            'expires_at', time.time()
+        ).execute().data
+        return len(rows or [])
+
+    def keys(self) -> set[tuple[str, str]]:
+        rows = self.client.table(SUPABASE_TABLE).select('symptoms_key,duration_key').gte(
+            'expires_at', time.time()
+        ).execute().data
+        return {(row['symptoms_key'], row['duration_key']) for row in rows}
+
+
+class SuggestionStore:
+    """Сквозное чтение и отложенная запись списков симптомов"""
+
+    def __init__(self, backend, ttl: float = 7 * 86400, flush_interval: float = 5.0,
+                 flush_size: int = 50, purge_interval: float = 3600.0):
+        """
+        Args:
+            backend: SQLiteSuggestionBackend или SupabaseSuggestionBackend
+            ttl: Время жизни записи в секундах
+            flush_interval: Период сброса накопленных записей в секундах
+            flush_size: Количество записей, при котором сброс выполняется сразу
+            purge_interval: Период удаления просроченных записей в секундах
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.purge_interval = purge_interval
+        # Несохранённые записи и попадания: ключ -> (симптомы, срок) / число попаданий
+        self._pending: dict[tuple[str, str], tuple[list[str], float]] = {}
+        self._pending_hits: Counter = Counter()
+        self._flusher: asyncio.Task | None = None
+        self._flush_now = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._last_purge = time.monotonic()
+        self.stats_counters = Counter()
+
+    async def get(self, key: tuple[str, str]) -> list[str] | None:
+        """
+        Список симптомов по ключу или None (нет записи, просрочена или ошибка хранилища)
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            entry = pending
+        else:
+            try:
+                entry = await asyncio.to_thread(self.backend.load, key)
+            except Exception as e:
+                self.stats_counters['errors'] += 1
+                print(f"DEBUG STORE: Load failed: {e}")
+                return None
+
+        if entry is None or entry[1] < time.time():
+            self.stats_counters['misses'] += 1
+            return None
+
+        self.stats_counters['hits'] += 1
+        self._pending_hits[key] += 1
+        self._schedule_flush()
+        return list(entry[0])
+
+    def put(self, key: tuple[str, str], symptoms: list[str]):
+        """Ставит список в очередь на запись (сохраняется фоновой задачей)"""
+        self._pending[key] = (list(symptoms), time.time() + self.ttl)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(self._pending) + len(self._pending_hits) >= self.flush_size:
+            self._flush_now.set()
+
+    async def _flush_loop(self):
+        while self._pending or self._pending_hits:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Сохраняет накопленные записи и счётчики попаданий"""
+        async with self._lock:
+            if not self._pending and not self._pending_hits:
+                return
+            rows = [(key, symptoms, expires_at)
+                    for key, (symptoms, expires_at) in self._pending.items()]
+            hits = dict(self._pending_hits)
+            self._pending_hits.clear()
+            try:
+                await asyncio.to_thread(self.backend.save, rows, hits)
+            except Exception as e:
+                # Попадания не критичны, записи остаются в очереди до следующего сброса
+                self.stats_counters['errors'] += 1
+                print(f"DEBUG STORE: Flush failed: {e}")
+                return
+            for key, symptoms, expires_at in rows:
+                if self._pending.get(key) == (symptoms, expires_at):
+                    del self._pending[key]
+            self.stats_counters['writes'] += len(rows)
+            self.stats_counters['flushes'] += 1
+
+            if time.monotonic() - self._last_purge >= self.purge_interval:
+                self._last_purge = time.monotonic()
+                try:
+                    self.stats_counters['expired'] += await asyncio.to_thread(self.backend.purge)
+                except Exception as e:
+                    print(f"DEBUG STORE: Purge failed: {e}")
+
+    async def close(self):
+        """Сбрасывает очередь и останавливает фоновую задачу"""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+        await self.flush()
+
+    def stats(self) -> dict:
+        """Статистика хранилища для метрик"""
+        total = self.stats_counters['hits'] + self.stats_counters['misses']
+        return {
+            'backend': type(self.backend).__name__,
+            'pending': len(self._pending),
+            **self.stats_counters,
+            'hit_ratio': round(self.stats_counters['hits'] / total, 3) if total else 0.0
+        }
+
+
+def create_suggestion_store() -> SuggestionStore | None:
+    """
+    Хранилище по переменным окружения
+
+    SUGGESTION_STORE: sqlite (по умолчанию), supabase или off
+    """
+    kind = os.getenv("SUGGESTION_STORE", "sqlite").lower()
+    if kind == "sqlite":
+        backend = SQLiteSuggestionBackend(os.getenv("SUGGESTION_STORE_PATH", "suggestions.db"))
+    elif kind == "supabase":
+        from database.connection import supabase_client
+        backend = SupabaseSuggestionBackend(supabase_client)
+    else:
+        return None
+    return SuggestionStore(
+        backend,
+        ttl=float(os.getenv("SUGGESTION_STORE_TTL", str(7 * 86400))),
+        flush_interval=float(os.getenv("SUGGESTION_STORE_FLUSH_INTERVAL", "5"))
+    )
+
+
+def frequent_clusters(consultations: list[str], top: int) -> list[tuple[str, str]]:
+    """
+    Самые частые группы жалоб в сохранённых консультациях
+
+    Args:
+        consultations: Симптомы консультаций (столбец symptoms, JSON)
+        top: Количество групп
+
+    Returns:
+        [(основные симптомы, давность)] - по одному примеру на группу
+    """
+    from services.ai_service import AIService
+
+    counts = Counter()
+    examples = {}
+    for raw in consultations:
+        try:
+            symptoms = json.loads(raw or '{}')
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(symptoms, dict) or not symptoms.get('main'):
+            continue
+        main, duration = symptoms['main'], symptoms.get('duration') or ''
+        key = AIService._symptoms_cache_key(main, duration)
+        counts[key] += 1
+        examples.setdefault(key, (main, duration))
+    return [examples[key] for key, _ in counts.most_common(top)]
+
+
+async def warmup(ai_service, consultations: list[str], top: int = 50) -> int:
+    """
+    Заранее генерирует симптомы для самых частых групп жалоб
+
+    Args:
+        ai_service: Экземпляр AIService с подключённым хранилищем
+        consultations: Симптомы консультаций (столбец symptoms, JSON)
+        top: Количество групп
+
+    Returns:
+        Количество сгенерированных списков
+    """
+    store = ai_service.suggestion_store
+    existing = await asyncio.to_thread(store.backend.keys)
+    generated = 0
+    for main, duration in frequent_clusters(consultations, top):
+        if ai_service._symptoms_cache_key(main, duration) in existing:
+            continue
+        if await ai_service.generate_additional_symptoms(main, duration):
+            generated += 1
+    await store.flush()
+    return generated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database.repositories import consultation_repository, storage
+    from services.ai_service import AIService, ai_service
+
+    parser = argparse.ArgumentParser(description="Прогрев хранилища дополнительных симптомов")
+    parser.add_argument('--top', type=int, default=50, help="Количество частых групп жалоб")
+    args = parser.parse_args()
+
+    # При AI_WORKERS > 0 ai_service - пул процессов без своего хранилища,
+    # прогрев выполняется в этом процессе
+    if not isinstance(ai_service, AIService):
+        ai_service = AIService()
+
+    async def run():
+        if ai_service.suggestion_store is None:
+            print("Хранилище выключено (SUGGESTION_STORE=off)")
+            return
+        try:
+            rows = await consultation_repository.recent_symptoms(limit=5000)
+            generated = await warmup(ai_service, rows, args.top)
+            print(f"Сгенерировано списков: {generated}")
+        finally:
+            await ai_service.close()
+            await storage.close()
+
+    asyncio.run(run())
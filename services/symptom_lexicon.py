@@ -0,0 +1,304 @@
+"""
+Локальная проверка списков дополнительных симптомов от AI
+
+Модель иногда возвращает украинские или английские слова, латинские буквы
+вперемешку с кириллицей, названия болезней и повторы в разных формах.
+Вместо длинных запретов в промпте и повторной генерации список чистится
+локально:
+
+- проверка алфавита и морфологии: украинские буквы (і, ї, є, ґ), апостроф
+  внутри слова и окончания -ння/-ття считаются признаками другого языка;
+- известные украинские слова и фразы заменяются русскими, латинские буквы,
+  похожие на кириллицу, заменяются, если получилось слово из словаря;
+  остальные элементы с чужими словами отбрасываются;
+- названия болезней отбрасываются (и учитываются в метриках);
+- формы одного симптома ("головная боль" / "головные боли", "боль
+  в мышцах" / "мышечная боль") сводятся по основам слов к одному
+  элементу; повторы основных жалоб, в том числе с уточнением степени
+  ("повышенная температура" при жалобе "температура"), убираются.
+
+Исправляются только слова: числа и знаки в формулировке сохраняются
+("температура выше 38").
+
+Словарь основ строится один раз из типичных симптомов специалистов,
+словаря триажа и COMMON_SYMPTOMS.
+"""
+
+import re
+from collections import Counter
+from typing import Iterable
+
+from bot.handlers.specialists import SPECIALISTS_DATA
+from services.russian_text import content_stems, stem
+from services.triage import TRIAGE_KEYWORDS
+
+
+# Частые симптомы, которых нет в описаниях специалистов
+COMMON_SYMPTOMS = [
+    "повышенная температура", "озноб", "слабость", "усталость", "потливость",
+    "головокружение", "головная боль", "тошнота", "рвота", "потеря аппетита",
+    "боль в мышцах", "ломота в теле", "боль в суставах", "кашель", "насморк",
+    "боль в горле", "одышка", "сердцебиение", "отеки", "сыпь", "зуд",
+    "покраснение", "жжение", "онемение", "покалывание", "судороги", "дрожь",
+    "бессонница", "сонливость", "раздражительность", "нарушение сна",
+    "снижение веса", "жажда", "сухость во рту", "вздутие", "изжога", "диарея",
+    "запор", "боль в животе", "боль в спине", "светобоязнь", "шум в ушах",
+    "кровотечение", "выделения", "ухудшение зрения", "боль при глотании",
+    "чихание", "слезотечение", "шелушение", "отечность", "скованность",
+]
+
+# Украинские фразы целиком (с согласованием рода) -> русские
+UKRAINIAN_PHRASES = {
+    "головний біль": "головная боль",
+    "біль голови": "головная боль",
+    "зудяча шкіра": "зуд кожи",
+    "зудящая шкіра": "зуд кожи",
+    "свербіж шкіри": "зуд кожи",
+    "червона шкіра": "покраснение кожи",
+    "почервоніння шкіри": "покраснение кожи",
+    "лущення шкіри": "шелушение кожи",
+    "висока температура": "высокая температура",
+    "підвищена температура": "повышенная температура",
+    "втрата апетиту": "потеря аппетита",
+    "біль у горлі": "боль в горле",
+    "біль у животі": "боль в животе",
+    "біль у грудях": "боль в груди",
+    "біль у спині": "боль в спине",
+    "біль у суглобах": "боль в суставах",
+    "біль у м'язах": "боль в мышцах",
+    "закладеність носа": "заложенность носа",
+    "шум у вухах": "шум в ушах",
+    "сухість у роті": "сухость во рту",
+    "порушення сну": "нарушение сна",
+}
+
+# Украинские слова -> русские (в том числе без украинских букв)
+UKRAINIAN_WORDS = {
+    "біль": "боль", "болі": "боли", "шкіра": "кожа", "шкіри": "кожи", "шкірі": "коже",
+    "нудота": "тошнота", "блювота": "рвота", "блювання": "рвота",
+    "слабкість": "слабость", "втома": "усталость", "втомлюваність": "утомляемость",
+    "запаморочення": "головокружение", "задишка": "одышка",
+    "нежить": "насморк", "висип": "сыпь", "висипання": "сыпь", "свербіж": "зуд",
+    "почервоніння": "покраснение", "набряк": "отек", "набряки": "отеки",
+    "печія": "изжога", "печіння": "жжение", "оніміння": "онемение",
+    "поколювання": "покалывание", "лущення": "шелушение", "здуття": "вздутие",
+    "безсоння": "бессонница", "сонливість": "сонливость", "пітливість": "потливость",
+    "лихоманка": "лихорадка", "пронос": "диарея", "закреп": "запор",
+    "кров": "кровь", "крові": "крови", "серце": "сердце", "серця": "сердца",
+    "живіт": "живот", "животі": "животе", "шлунок": "желудок", "шлунку": "желудке",
+    "сеча": "моча", "сечі": "мочи", "сечовипускання": "мочеиспускание",
+    "голови": "головы", "горлі": "горле", "грудях": "груди", "спині": "спине",
+    "суглобах": "суставах", "суглобів": "суставов", "м'язах": "мышцах",
+    "м'язів": "мышц", "очі": "глаза", "очей": "глаз", "вуха": "уха", "вухах": "ушах",
+    "зір": "зрение", "зору": "зрения", "апетиту": "аппетита", "сну": "сна",
+    "головний": "головная", "головна": "головная", "червона": "красная",
+    "червоний": "красный", "червоні": "красные", "підвищена": "повышенная",
+    "підвищений": "повышенный", "висока": "высокая", "сильний": "сильный",
+    "сильна": "сильная", "гострий": "острый", "гостра": "острая", "сухість": "сухость",
+    "втрата": "потеря", "порушення": "нарушение", "закладеність": "заложенность",
+    # Прилагательные на -ий (в русском -ой / -ый) без украинских букв
+    "сухий": "сухой", "правий": "правый", "лівий": "левый", "тупий": "тупой",
+    "частий": "частый", "мокрий": "мокрый", "жовтий": "желтый", "білий": "белый",
+    "чорний": "черный", "блідий": "бледный", "нічний": "ночной", "загальна": "общая",
+    "та": "и", "після": "после",
+}
+
+# Основы названий болезней (совпадение с началом слова)
+DISEASE_STEMS = (
+    'инфаркт', 'инсульт', 'диабет', 'онколог', 'карцином', 'опухол', 'грипп',
+    'ковид', 'covid', 'коронавирус', 'пневмони', 'гастрит', 'язвенн', 'артрит',
+    'артроз', 'астм', 'бронхит', 'ангин', 'гайморит', 'синусит', 'отит', 'цистит',
+    'пиелонефрит', 'гепатит', 'панкреатит', 'холецистит', 'аппендицит',
+    'остеохондроз', 'гипертони', 'дерматит', 'экзем', 'псориаз', 'туберкул',
+    'простуд', 'инфекци', 'тромбоз', 'варикоз', 'геморро', 'анеми', 'депресси',
+    'невроз', 'неврит', 'энтерит', 'эзофагит', 'конъюнктивит', 'катаракт',
+    'глауком', 'менингит', 'энцефалит', 'эпилепси', 'сколиоз', 'грыж', 'стенокарди',
+    'аритми', 'тонзиллит', 'фарингит', 'ларингит', 'трахеит', 'ринит', 'мастит',
+    'простатит', 'уретрит', 'нефрит', 'герпес', 'лишай', 'ветрянк', 'корь', 'краснух',
+)
+
+# Короткие названия болезней (только точное совпадение слова)
+DISEASE_WORDS = frozenset({
+    'рак', 'рака', 'раком', 'раке', 'орви', 'орз', 'спид', 'вич',
+    'кори', 'корью', 'подагра', 'подагры',
+})
+
+# Названия болезней из нескольких слов ("язвы во рту" - симптом, "язва желудка" - болезнь)
+DISEASE_PHRASES = re.compile(r'\bязв\w*\s+(?:желудка|двенадцатиперстной|кишки|кишечника)')
+
+# Основы уточнений степени: "повышенная температура" - повтор жалобы "температура"
+MODIFIER_STEMS = frozenset({
+    'повышенн', 'высок', 'сильн', 'небольш', 'незначительн', 'выраженн', 'умеренн',
+    'постоянн', 'периодическ', 'част', 'учащенн', 'резк', 'остр', 'хроническ',
+})
+
+# Основы прилагательных -> основы существительных ("мышечная боль" = "боль в мышцах")
+STEM_SYNONYMS = {
+    'мышечн': 'мышц', 'головн': 'голов', 'суставн': 'сустав', 'кожн': 'кож',
+    'желудочн': 'желудк', 'сердечн': 'сердц', 'носов': 'нос', 'грудн': 'груд',
+    'глазн': 'глаз', 'ушн': 'уш', 'зубн': 'зуб', 'брюшн': 'живот', 'поясничн': 'поясниц',
+}
+
+# Буквы, которых нет в русском алфавите
+_FOREIGN_CYRILLIC = set('іїєґ')
+
+# Окончания, невозможные в русских словах (украинские -ння, -ття)
+_FOREIGN_ENDINGS = ('ння', 'ття')
+
+# Латинские буквы, неотличимые на вид от кириллических
+_HOMOGLYPHS = str.maketrans('aceopxykmhtb', 'асеорхукмнтв')
+
+_WORD_RE = re.compile(r"[a-zа-яёіїєґ'’ʼ]+(?:-[a-zа-яёіїєґ]+)*")
+_RUSSIAN_WORD_RE = re.compile(r'[а-я]+(?:-[а-я]+)*')
+_LATIN_RE = re.compile(r'[a-z]')
+
+# Максимальная длина симптома в символах
+MAX_SYMPTOM_LENGTH = 50
+
+
+class SymptomLexicon:
+    """Словарь основ симптомов и очистка списков от AI"""
+
+    def __init__(self, phrases: Iterable[str] = ()):
+        """
+        Args:
+            phrases: Дополнительные формулировки симптомов для словаря
+        """
+        sources = list(COMMON_SYMPTOMS) + list(phrases)
+        for data in SPECIALISTS_DATA.values():
+            sources += [p.strip() for p in data['symptoms'].split(',')]
+        for keywords in TRIAGE_KEYWORDS.values():
+            sources += keywords
+        sources += UKRAINIAN_WORDS.values()
+
+        self.known_stems = frozenset(s for phrase in sources for s in content_stems(phrase))
+        self.stats = Counter()
+
+    def _normalize_word(self, word: str) -> str | None:
+        """
+        Приводит слово к русскому написанию
+
+        Returns:
+            Русское слово или None, если слово не русское и не исправляется
+        """
+        word = word.replace('’', "'").replace('ʼ', "'")
+        if word in UKRAINIAN_WORDS:
+            return UKRAINIAN_WORDS[word]
+
+        if _RUSSIAN_WORD_RE.fullmatch(word) and not word.endswith(_FOREIGN_ENDINGS):
+            return word
+
+        if _LATIN_RE.search(word) and not _FOREIGN_CYRILLIC & set(word):
+            # Латиница вперемешку с кириллицей ("кaшель") - исправляем, если слово известно
+            fixed = word.translate(_HOMOGLYPHS)
+            if _RUSSIAN_WORD_RE.fullmatch(fixed) and stem(fixed) in self.known_stems:
+                return fixed
+
+        return None
+
+    def normalize(self, symptom: str) -> str | None:
+        """
+        Приводит формулировку симптома к русскому языку
+
+        Args:
+            symptom: Симптом от AI
+
+        Returns:
+            Исправленный симптом или None, если в нём есть нерусские слова
+        """
+        text = ' '.join(symptom.lower().replace('ё', 'е').split())
+        text = text.strip(' "\'.,;:!-')
+        if text in UKRAINIAN_PHRASES:
+            return UKRAINIAN_PHRASES[text]
+
+        # Заменяются только слова: числа и знаки остаются на месте
+        parts, position = [], 0
+        for match in _WORD_RE.finditer(text):
+            normalized = self._normalize_word(match.group())
+            if normalized is None:
+                return None
+            parts += [text[position:match.start()], normalized]
+            position = match.end()
+        parts.append(text[position:])
+        return ''.join(parts)
+
+    @staticmethod
+    def is_disease(symptom: str) -> bool:
+        """Является ли формулировка названием болезни"""
+        symptom = symptom.lower()
+        if DISEASE_PHRASES.search(symptom):
+            return True
+        for word in _WORD_RE.findall(symptom):
+            if word in DISEASE_WORDS or word.startswith(DISEASE_STEMS):
+                return True
+        return False
+
+    @staticmethod
+    def symptom_key(text: str) -> frozenset[str]:
+        """
+        Основы симптома без уточнений степени (для поиска повторов)
+
+            >>> SymptomLexicon.symptom_key("Мышечная боль") == SymptomLexicon.symptom_key("боль в мышцах")
+            True
+        """
+        stems = {STEM_SYNONYMS.get(s, s) for s in content_stems(text)}
+        return frozenset(stems - MODIFIER_STEMS or stems)
+
+    def clean(self, symptoms: list[str], main_symptoms: str = "", limit: int = 10) -> list[str]:
+        """
+        Очищает список дополнительных симптомов
+
+        Args:
+            symptoms: Симптомы от AI
+            main_symptoms: Основные симптомы (их повторы убираются)
+            limit: Максимум симптомов
+
+        Returns:
+            Русские симптомы без болезней и повторов, с заглавной буквы
+        """
+        main_stems = set(self.symptom_key(main_symptoms))
+        seen: set[frozenset[str]] = set()
+        result = []
+
+        for symptom in symptoms:
+            self.stats['items'] += 1
+            clean = symptom.strip().strip('"').strip("'").strip()
+            if not clean or len(clean) > MAX_SYMPTOM_LENGTH:
+                self.stats['too_long'] += 1
+                continue
+
+            normalized = self.normalize(clean)
+            if not normalized:
+                self.stats['foreign'] += 1
+                continue
+
+            if self.is_disease(normalized):
+                self.stats['diseases'] += 1
+                print(f"DEBUG AI: Dropped disease name: {clean}")
+                continue
+
+            # Формы одной фразы ("головная боль" / "головные боли") имеют одинаковые основы
+            key = self.symptom_key(normalized)
+            if not key or key in seen or key <= main_stems:
+                self.stats['duplicates'] += 1
+                continue
+            seen.add(key)
+
+            if normalized != ' '.join(clean.lower().replace('ё', 'е').split()):
+                self.stats['fixed'] += 1
+                print(f"DEBUG AI: Fixed symptom: {clean} -> {normalized}")
+                clean = normalized[0].upper() + normalized[1:]
+
+            if not key & self.known_stems:
+                self.stats['unknown'] += 1
+
+            result.append(clean)
+            if len(result) >= limit:
+                break
+
+        self.stats['kept'] += len(result)
+        return result
+
+    def get_stats(self) -> dict:
+        """Метрики очистки (для эндпоинта /metrics)"""
+        return {'lexicon_stems': len(self.known_stems), **self.stats}
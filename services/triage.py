@@ -0,0 +1,284 @@
+"""
+Локальный триаж: подбор специалиста по ключевым словам без обращения к AI
+
+Индекс строится из типичных симптомов SPECIALISTS_DATA и дополнительного
+словаря TRIAGE_KEYWORDS. Однозначные случаи получают высокую уверенность и
+обрабатываются локально, остальные уходят в AI.
+
+Оценка точности по сохранённым консультациям:
+    python -m services.triage
+"""
+
+import json
+from collections import defaultdict
+
+from bot.handlers.specialists import SPECIALISTS_DATA
+from services.russian_text import content_stems
+
+
+# Дополнительные формулировки жалоб (разговорные и в разных формах)
+TRIAGE_KEYWORDS = {
+    "Кардиолог": ["сердцебиение", "перебои в сердце", "давление повышено", "колет в сердце"],
+    "Невролог": ["голова болит", "болит голова", "головная боль", "мигрень", "головокружение",
+                 "онемение", "немеют пальцы", "покалывание в руках"],
+    "Гастроэнтеролог": ["болит живот", "боль в животе", "изжога", "отрыжка", "вздутие живота",
+                        "диарея", "понос", "запор", "тошнота", "рвота"],
+    "Эндокринолог": ["постоянная жажда", "сухость во рту", "щитовидная железа"],
+    "Пульмонолог": ["кашель с мокротой", "хрипы в легких", "свистящее дыхание"],
+    "Уролог": ["частое мочеиспускание", "боль при мочеиспускании", "жжение при мочеиспускании"],
+    "Гинеколог": ["задержка месячных", "болезненные месячные", "выделения из влагалища"],
+    "Дерматолог": ["сыпь", "зуд кожи", "кожный зуд", "шелушение кожи", "прыщи", "угри",
+                   "пятна на коже", "покраснение кожи"],
+    "Офтальмолог": ["болят глаза", "резь в глазах", "покраснение глаз", "слезятся глаза",
+                    "ухудшение зрения", "двоение в глазах"],
+    "Отоларинголог (ЛОР)": ["болит горло", "боль в горле", "першение в горле", "насморк",
+                            "заложенность носа", "заложен нос", "болит ухо", "боль в ухе",
+                            "заложенность уха", "гайморит", "осиплость голоса"],
+    "Ортопед-травматолог": ["ушиб", "растяжение", "вывих", "перелом", "болит колено",
+                            "боль в колене", "болит спина", "боль в спине", "боль в пояснице"],
+    "Ревматолог": ["утренняя скованность", "опухшие суставы", "отек суставов"],
+    "Аллерголог-иммунолог": ["аллергия", "чихание", "крапивница", "слезотечение и чихание"],
+    "Психиатр": ["бессонница", "тревожность", "панические атаки", "подавленное настроение",
+                 "апатия"],
+    "Проктолог": ["кровь в стуле", "зуд в анусе", "боль в заднем проходе"],
+    "Маммолог": ["уплотнение в груди", "уплотнение в молочной железе", "боль в молочной железе"],
+    "Нефролог": ["отеки на лице", "отеки по утрам", "пенистая моча"],
+}
+
+# Признаки, при которых локальный ответ недопустим (решает AI / детектор неотложных состояний)
+DEFER_TO_AI_PHRASES = [
+    "боль в груди", "боли в груди", "одышка", "потеря сознания", "обморок", "судороги",
+    "кровь", "кровотечение", "рвота кровью", "онемение лица", "нарушение речи",
+    "температура 39", "температура 40", "новообразование", "потеря веса",
+    # Острый живот (аппендицит), кровь в стуле, загрудинная боль
+    "правой нижней", "острый живот", "живот температура", "черный стул", "черный кал",
+    "за грудиной",
+]
+
+# Признаки высокой срочности (обратиться в течение 24 часов)
+HIGH_URGENCY_PHRASES = [
+    "высокая температура", "сильная боль", "острая боль", "резкая боль",
+    "невыносимая боль", "отек", "не проходит", "усиливается",
+]
+
+# Основы слов, которые сами по себе не указывают на специалиста
+GENERIC_STEMS = frozenset({
+    'бол', 'болезнен', 'проблем', 'нарушен', 'изменен', 'люб', 'жалоб', 'признак',
+    'длительн', 'частн', 'сильн', 'симптом', 'повышенн', 'анализ', 'здоров', 'осмотр',
+    'не', 'нет', 'без',
+})
+
+# Оценка, при которой совпадение считается полностью однозначным
+STRONG_SCORE = 3.0
+
+
+def _phrase_stems(phrase: str) -> frozenset[str]:
+    return frozenset(content_stems(phrase))
+
+
+class TriageEngine:
+    """Индекс 'основы слов -> специалист' и оценка уверенности"""
+
+    def __init__(self, specialists: list[str]):
+        """
+        Args:
+            specialists: Специалисты, которых может рекомендовать бот
+        """
+        self.specialists = specialists
+        self.descriptions = {
+            name: SPECIALISTS_DATA[name]['description']
+            for name in specialists if name in SPECIALISTS_DATA
+        }
+
+        # Фразы: (основы, специалист, вес, исходная фраза)
+        self._phrases: list[tuple[frozenset[str], str, float, str]] = []
+        # Инвертированный индекс: значимая основа -> номера фраз
+        self._index: dict[str, list[int]] = defaultdict(list)
+        # Формы одной фразы у специалиста ("головная боль" / "головные боли") учитываются один раз
+        self._seen: set[tuple[str, frozenset[str]]] = set()
+
+        for name in specialists:
+            if name == 'Терапевт':
+                continue
+            phrases = []
+            if name in SPECIALISTS_DATA:
+                phrases += [p.strip() for p in SPECIALISTS_DATA[name]['symptoms'].split(',')]
+            phrases += TRIAGE_KEYWORDS.get(name, [])
+            for phrase in phrases:
+                self._add_phrase(phrase, name)
+
+        self._defer = [_phrase_stems(p) for p in DEFER_TO_AI_PHRASES]
+        self._high = [_phrase_stems(p) for p in HIGH_URGENCY_PHRASES]
+
+    def _add_phrase(self, phrase: str, specialist: str):
+        stems = _phrase_stems(phrase)
+        significant = stems - GENERIC_STEMS
+        if not significant or (specialist, stems) in self._seen:
+            return
+        self._seen.add((specialist, stems))
+        idx = len(self._phrases)
+        # Многословные конкретные фразы весят больше одиночных слов
+        weight = len(significant) + 0.5 * (len(stems) - len(significant))
+        self._phrases.append((stems, specialist, weight, phrase))
+        for s in significant:
+            self._index[s].append(idx)
+
+    def assess(self, main_symptoms: str, duration: str = "",
+               additional_symptoms: list[str] | None = None) -> dict:
+        """
+        Локальная оценка: специалист, срочность и уверенность
+
+        Args:
+            main_symptoms: Основные симптомы
+            duration: Давность симптомов
+            additional_symptoms: Дополнительные симптомы
+
+        Returns:
+            {
+                'specialist': str | None,
+                'urgency': 'low'|'medium'|'high',
+                'confidence': float,  # 0..1
+                'reasoning': str,
+                'matched': list[str]  # Совпавшие фразы
+            }
+        """
+        text = ' '.join([main_symptoms, *(additional_symptoms or [])])
+        stems = set(content_stems(text))
+
+        # Кандидатные фразы по инвертированному индексу
+        candidates = {idx for s in stems for idx in self._index.get(s, ())}
+
+        scores: dict[str, float] = defaultdict(float)
+        matched: dict[str, list[str]] = defaultdict(list)
+        for idx in candidates:
+            phrase_stems, specialist, weight, phrase = self._phrases[idx]
+            if phrase_stems <= stems:
+                scores[specialist] += weight
+                matched[specialist].append(phrase)
+
+        if not scores:
+            return {'specialist': None, 'urgency': 'medium', 'confidence': 0.0,
+                    'reasoning': '', 'matched': []}
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        specialist, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+
+        confidence = (top - second) / top * min(1.0, top / STRONG_SCORE)
+        if any(p <= stems for p in self._defer):
+            confidence = 0.0
+
+        urgency = 'high' if any(p <= stems for p in self._high) else 'medium'
+
+        phrases = ', '.join(sorted(set(matched[specialist])))
+        reasoning = (
+            f"Жалобы ({phrases}) относятся к профилю специалиста: "
+            f"{self.descriptions.get(specialist, specialist).lower()}."
+        )
+        if duration:
+            reasoning += f" Давность симптомов: {duration.lower()}."
+
+        return {
+            'specialist': specialist,
+            'urgency': urgency,
+            'confidence': round(confidence, 3),
+            'reasoning': reasoning,
+            'matched': sorted(set(matched[specialist]))
+        }
+
+    def suggest_symptoms(self, main_symptoms: str, limit: int = 8) -> list[str]:
+        """
+        Типичные симптомы наиболее подходящих специалистов (без обращения к AI)
+
+        Args:
+            main_symptoms: Основные симптомы
+            limit: Максимум симптомов
+
+        Returns:
+            Список симптомов, которых нет среди основных
+        """
+        stems = set(content_stems(main_symptoms))
+        scores: dict[str, float] = defaultdict(float)
+        for idx in {idx for s in stems for idx in self._index.get(s, ())}:
+            phrase_stems, specialist, weight, _ = self._phrases[idx]
+            if phrase_stems <= stems:
+                scores[specialist] += weight
+
+        suggestions = []
+        seen = set(stems)
+        for specialist, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            for phrase_stems, name, _, phrase in self._phrases:
+                significant = phrase_stems - GENERIC_STEMS
+                # Пропускаем уже предложенное или совпадающее с основными симптомами
+                if name != specialist or significant <= seen:
+                    continue
+                seen |= significant
+                suggestions.append(phrase[0].upper() + phrase[1:])
+                if len(suggestions) >= limit:
+                    return suggestions
+        return suggestions
+
+    def evaluate(self, consultations: list[dict], threshold: float) -> dict:
+        """
+        Сравнивает локальный триаж с рекомендациями AI из сохранённых консультаций
+
+        Учитываются только консультации, где специалиста выбрал AI (source = 'ai'):
+        ответы самого триажа, экстренные и упрощённые рекомендации сделали бы
+        оценку точности замкнутой.
+
+        Args:
+            consultations: Строки таблицы consultations (со столбцом source)
+            threshold: Порог уверенности для локального ответа
+
+        Returns:
+            {'total', 'skipped', 'answered_locally', 'coverage', 'correct', 'accuracy'}
+        """
+        total = skipped = answered = correct = 0
+        for row in consultations:
+            if row.get('source') != 'ai':
+                skipped += 1
+                continue
+            try:
+                symptoms = json.loads(row.get('symptoms') or '{}')
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(symptoms, dict) or not symptoms.get('main'):
+                continue
+
+            total += 1
+            result = self.assess(
+                symptoms.get('main', ''),
+                symptoms.get('duration') or '',
+                symptoms.get('additional') or []
+            )
+            if result['confidence'] >= threshold:
+                answered += 1
+                if result['specialist'] == row.get('recommended_doctor'):
+                    correct += 1
+
+        return {
+            'total': total,
+            'skipped': skipped,
+            'answered_locally': answered,
+            'coverage': round(answered / total, 3) if total else 0.0,
+            'correct': correct,
+            'accuracy': round(correct / answered, 3) if answered else 0.0
+        }
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from database.repositories import consultation_repository, storage
+    from services.ai_service import SPECIALISTS, TRIAGE_THRESHOLD
+
+    async def load_consultations() -> list[dict]:
+        try:
+            return await consultation_repository.recent(limit=1000)
+        finally:
+            await storage.close()
+
+    report = TriageEngine(SPECIALISTS).evaluate(asyncio.run(load_consultations()), TRIAGE_THRESHOLD)
+    print(f"Консультаций с ответом AI: {report['total']} (пропущено других: {report['skipped']})")
+    print(f"Отвечено локально: {report['answered_locally']} ({report['coverage']:.1%})")
+    print(f"Совпадений с AI: {report['correct']} (точность {report['accuracy']:.1%})")
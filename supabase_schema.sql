@@ -1,7 +1,13 @@
+-- Схема Supabase (PostgreSQL). При изменении таблиц user_profiles, consultations
+-- и messages обновите SQLITE_SCHEMA в database/storage.py (STORAGE_BACKEND=sqlite)
+
 -- Таблица профилей пользователей
 CREATE TABLE IF NOT EXISTS user_profiles (
     user_id BIGINT PRIMARY KEY,
     username TEXT,
+    full_name TEXT,
+    phone TEXT,
+    birthdate DATE,
     age INTEGER,
     gender TEXT CHECK (gender IN ('male', 'female', 'other')),
     height INTEGER,
@@ -18,9 +24,13 @@ CREATE TABLE IF NOT EXISTS consultations (
     questions_answers TEXT NOT NULL,
     recommended_doctor TEXT NOT NULL,
     urgency_level TEXT CHECK (urgency_level IN ('low', 'medium', 'high', 'emergency')),
+    source TEXT,  -- кто выбрал специалиста: ai, local, degraded, default, emergency
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Для таблиц, созданных до появления столбца source
+ALTER TABLE consultations ADD COLUMN IF NOT EXISTS source TEXT;
+
 -- Таблица сообщений (история диалогов)
 CREATE TABLE IF NOT EXISTS messages (
     id SERIAL PRIMARY KEY,
@@ -31,13 +41,34 @@ CREATE TABLE IF NOT EXISTS messages (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Постоянный кэш дополнительных симптомов (services/suggestion_store.py)
+CREATE TABLE IF NOT EXISTS symptom_suggestions (
+    symptoms_key TEXT NOT NULL,
+    duration_key TEXT NOT NULL,
+    suggestions JSONB NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    expires_at DOUBLE PRECISION NOT NULL,
+    updated_at DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (symptoms_key, duration_key)
+);
+
+-- Атомарное увеличение счётчика попаданий
+CREATE OR REPLACE FUNCTION increment_suggestion_hits(
+    p_symptoms_key TEXT, p_duration_key TEXT, p_hits INTEGER
+) RETURNS VOID AS $$
+    UPDATE symptom_suggestions SET hits = hits + p_hits
+    WHERE symptoms_key = p_symptoms_key AND duration_key = p_duration_key;
+$$ LANGUAGE SQL;
+
 -- Индексы для быстрого поиска
 CREATE INDEX IF NOT EXISTS idx_consultations_user_id ON consultations(user_id);
 CREATE INDEX IF NOT EXISTS idx_consultations_created_at ON consultations(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id);
 CREATE INDEX IF NOT EXISTS idx_messages_consultation_id ON messages(consultation_id);
+CREATE INDEX IF NOT EXISTS idx_symptom_suggestions_expires_at ON symptom_suggestions(expires_at);
 
 -- Комментарии к таблицам
 COMMENT ON TABLE user_profiles IS 'Профили пользователей телеграм бота';
 COMMENT ON TABLE consultations IS 'История медицинских консультаций';
 COMMENT ON TABLE messages IS 'История диалогов пользователей с ботом';
+COMMENT ON TABLE symptom_suggestions IS 'Кэш дополнительных симптомов по основным жалобам и давности';
@@ -0,0 +1,162 @@
+"""
+Тесты AIService без обращения к Groq
+"""
+
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault('GROQ_API_KEY', 'test-key')
+os.environ['SUGGESTION_STORE'] = 'off'
+
+from services.ai_resilience import AIUnavailableError  # noqa: E402
+from services.ai_scheduler import PRIORITY_EMERGENCY  # noqa: E402
+from services import ai_service as ai_service_module  # noqa: E402
+from services.ai_service import AIService, ANY_DURATION  # noqa: E402
+from services.ai_sessions import AISessions, SessionCancelled  # noqa: E402
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AIService()
+    calls = []
+
+    async def fake_generate(main_symptoms, duration):
+        calls.append(duration)
+        await asyncio.sleep(10 if duration == ANY_DURATION else 0)
+        return ['Слабость']
+
+    monkeypatch.setattr(service, 'generate_additional_symptoms', fake_generate)
+    service.calls = calls
+    return service
+
+
+def test_cancel_during_prefetch_wait_makes_no_new_request(service, monkeypatch):
+    sessions = AISessions()
+    monkeypatch.setattr('services.ai_service.ai_sessions', sessions)
+
+    async def scenario():
+        service.prefetch_additional_symptoms(1, 'кашель')
+
+        async def handler():
+            async with sessions.scope(1):
+                return await service.get_additional_symptoms(1, 'кашель', '1-3 дня')
+
+        task = asyncio.create_task(handler())
+        await asyncio.sleep(0.01)
+        sessions.cancel(1)
+        with pytest.raises(SessionCancelled):
+            await task
+        await service.close()
+
+    asyncio.run(scenario())
+    assert service.calls == [ANY_DURATION]
+
+
+def test_cancelled_prefetch_falls_back_to_generation(service):
+    async def scenario():
+        service.prefetch_additional_symptoms(1, 'кашель')
+        await asyncio.sleep(0)
+        # Отменена только фоновая задача - обработчик делает обычный запрос
+        service._prefetch_tasks[1][1].cancel()
+        result = await service.get_additional_symptoms(1, 'кашель', '1-3 дня')
+        await service.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result == ['Слабость']
+    assert service.calls == [ANY_DURATION, '1-3 дня']
+
+
+def test_unused_prefetch_expires(service, monkeypatch):
+    monkeypatch.setattr(ai_service_module, 'PREFETCH_TTL', 0.01)
+
+    async def quick_generate(main_symptoms, duration):
+        return ['Слабость']
+
+    monkeypatch.setattr(service, 'generate_additional_symptoms', quick_generate)
+
+    async def scenario():
+        service.prefetch_additional_symptoms(1, 'кашель')
+        await asyncio.sleep(0)
+        ready = service.prefetch_ready(1, 'кашель')
+        await asyncio.sleep(0.05)
+        await service.close()
+        return ready
+
+    assert asyncio.run(scenario()) is True
+    assert service._prefetch_tasks == {}
+
+
+def test_failed_prefetch_dropped(service, monkeypatch):
+    async def failing_generate(main_symptoms, duration):
+        raise RuntimeError("groq down")
+
+    monkeypatch.setattr(service, 'generate_additional_symptoms', failing_generate)
+
+    async def scenario():
+        service.prefetch_additional_symptoms(1, 'кашель')
+        await asyncio.sleep(0.01)
+        await service.close()
+
+    asyncio.run(scenario())
+    assert service._prefetch_tasks == {}
+
+
+def test_warmed_store_entry_used_before_prefetch(service, tmp_path):
+    from services.suggestion_store import SQLiteSuggestionBackend, SuggestionStore
+
+    backend = SQLiteSuggestionBackend(str(tmp_path / 'suggestions.db'))
+    key = AIService._symptoms_cache_key('кашель', '1-3 дня')
+    backend.save([(key, ['Мокрота', 'Хрипы'], 2e9)], {})
+
+    async def scenario():
+        service.suggestion_store = SuggestionStore(backend)
+        service.prefetch_additional_symptoms(1, 'кашель')
+        result = await service.get_additional_symptoms(1, 'кашель', '1-3 дня')
+        await service.close()
+        return result
+
+    assert asyncio.run(scenario()) == ['Мокрота', 'Хрипы']
+
+
+@pytest.mark.parametrize('main, priority', [
+    ("Сильная боль в правой нижней части живота, усиливается при ходьбе", PRIORITY_EMERGENCY),
+    ("Болит голова и немного кашель", None),
+])
+def test_urgent_recommendation_scheduled_first(service, monkeypatch, main, priority):
+    priorities = []
+
+    async def fake_call_ai(prompt, user_message, priority=None, **kwargs):
+        priorities.append(priority)
+        return '{"specialist": "Терапевт", "urgency": "high", "reasoning": "..."}'
+
+    monkeypatch.setattr(service, '_call_ai', fake_call_ai)
+
+    async def scenario():
+        result = await service.recommend_doctor(main, '1-3 дня', [], {})
+        await service.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result['specialist'] == 'Терапевт'
+    assert result['source'] == 'ai'
+    assert priorities == [priority]
+
+
+def test_degraded_mode_below_threshold_recommends_therapist(service, monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise AIUnavailableError("circuit open")
+
+    monkeypatch.setattr(service, '_call_ai', unavailable)
+
+    async def scenario():
+        result = await service.recommend_doctor("болит живот справа внизу", '1-3 дня', [], {'gender': 'male'})
+        await service.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result['specialist'] == 'Терапевт'
+    assert result['source'] == 'degraded'
+    assert result['low_confidence'] is True
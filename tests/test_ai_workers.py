@@ -0,0 +1,111 @@
+"""
+Тесты перезапуска процессов пула AI
+"""
+
+import asyncio
+import sys
+import time
+
+import pytest
+
+from services import ai_workers
+from services.ai_resilience import AIUnavailableError
+from services.ai_workers import AIWorkerPool
+
+
+@pytest.fixture(autouse=True)
+def fast_restarts(monkeypatch):
+    monkeypatch.setattr(ai_workers, 'RESTART_BASE_DELAY', 0.01)
+    monkeypatch.setattr(ai_workers, 'RESTART_MAX_DELAY', 0.02)
+
+
+def test_crashing_worker_is_disabled_after_max_restarts(monkeypatch):
+    pool = AIWorkerPool(1, max_restarts=3)
+    spawned = []
+
+    async def crashing_spawn(worker):
+        spawned.append(worker.index)
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', 'raise SystemExit(1)', stdout=asyncio.subprocess.PIPE
+        )
+        worker.started_at = time.monotonic()
+
+    monkeypatch.setattr(pool, '_spawn', crashing_spawn)
+
+    async def scenario():
+        await pool.start()
+        await asyncio.wait_for(pool.workers[0].reader, 5)
+        health = pool.get_health()
+        with pytest.raises(AIUnavailableError):
+            pool._pick(1)
+        await pool.close()
+        return health
+
+    health = asyncio.run(scenario())
+    # Первый запуск и 3 перезапуска, затем процесс отключён
+    assert len(spawned) == 4
+    assert health['status'] == 'degraded'
+    assert health['workers'][0]['healthy'] is False
+    assert 'exited with code 1' in health['workers'][0]['last_error']
+
+
+def test_spawn_failure_marks_worker_unhealthy(monkeypatch):
+    pool = AIWorkerPool(2, max_restarts=2)
+
+    async def failing_spawn(worker):
+        if worker.index == 0:
+            raise OSError("cannot start")
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', 'import sys; sys.stdin.read()',
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+        )
+        worker.started_at = time.monotonic()
+
+    monkeypatch.setattr(pool, '_spawn', failing_spawn)
+
+    async def scenario():
+        await pool.start()
+        await asyncio.wait_for(pool.workers[0].reader, 5)
+        # Задания пользователя неисправного процесса уходят в работающий
+        picked = pool._pick(0)
+        health = pool.get_health()
+        await pool.close()
+        return picked, health
+
+    picked, health = asyncio.run(scenario())
+    assert picked.index == 1
+    assert health['workers'][0]['healthy'] is False
+    assert health['workers'][0]['last_error'] == "spawn failed: cannot start"
+    assert health['workers'][1]['running'] is True
+
+
+def test_oversized_line_fails_pending_jobs_and_restarts(monkeypatch):
+    monkeypatch.setattr(ai_workers, 'LINE_LIMIT', 1024)
+    pool = AIWorkerPool(1, max_restarts=1)
+    spawned = []
+
+    async def spawn(worker):
+        # Первый процесс отвечает строкой длиннее лимита, второй работает нормально
+        code = ("import sys; sys.stdin.readline(); print('x' * 4096, flush=True); sys.stdin.read()"
+                if not spawned else "import sys; sys.stdin.read()")
+        spawned.append(worker.index)
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', code, stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE, limit=ai_workers.LINE_LIMIT
+        )
+        worker.started_at = time.monotonic()
+
+    monkeypatch.setattr(pool, '_spawn', spawn)
+
+    async def scenario():
+        with pytest.raises(AIUnavailableError):
+            await asyncio.wait_for(pool.validate_symptoms("кашель"), 5)
+        while len(spawned) < 2 or not pool.workers[0].running:
+            await asyncio.sleep(0.01)
+        health = pool.get_health()
+        await pool.close()
+        return health
+
+    health = asyncio.run(scenario())
+    assert health['workers'][0]['running'] is True
+    assert health['workers'][0]['last_error'].startswith('protocol error')
@@ -0,0 +1,83 @@
+"""
+Тесты детектора красных флагов
+"""
+
+import pytest
+
+from bot.handlers.specialists import SPECIALISTS_DATA
+from services.red_flags import _detector, detect_red_flags
+from services.russian_text import stem, tokenize
+from services.symptom_lexicon import COMMON_SYMPTOMS
+
+
+@pytest.mark.parametrize('text, name', [
+    ("сильная боль в груди, немеет левая рука", 'признаки сердечного приступа'),
+    ("давящая боль за грудиной, отдает в челюсть", 'признаки сердечного приступа'),
+    # Смягчение относится к одному слову, а не ко всей фразе
+    ("давит в груди и немного отдает в левую руку", 'признаки сердечного приступа'),
+    ("боль в груди отдает в руку чуть ниже локтя", 'признаки сердечного приступа'),
+    ("Температура 40.5 второй день", 'очень высокая температура'),
+    ("жар до 41", 'очень высокая температура'),
+    ("Потеря сознания", 'потеря сознания'),
+    ("потерял сознание на улице", 'потеря сознания'),
+    ("был без сознания несколько минут", 'потеря сознания'),
+    ("обморок 10 минут назад", 'потеря сознания'),
+    ("обмороков нет, но судороги", 'судороги'),
+    ("не могу дышать", 'затруднение дыхания'),
+    ("задыхаюс", 'затруднение дыхания'),
+    ("отекает язык и губы", 'тяжёлая аллергическая реакция'),
+    ("отекает горло, трудно дышать", 'тяжёлая аллергическая реакция'),
+    # "не" с глаголом - часть правила
+    ("кровотечение не останавливается", 'кровотечение'),
+    ("не могу остановить кровь из носа", 'кровотечение'),
+    ("у ребенка судороги", 'судороги'),
+])
+def test_detects_emergency(text, name):
+    result = detect_red_flags(text)
+    assert result is not None
+    assert result['name'] == name
+
+
+@pytest.mark.parametrize('text', [
+    # Число не относится к температуре
+    "Температура 37.4, 40 минут назад",
+    "Болит голова уже 40 дней",
+    # Боль в груди без признаков сердечного приступа
+    "Болит грудь при кашле, сильная простуда",
+    "Жжение в груди после еды, изжога, сильная",
+    "Боль в грудном отделе позвоночника, сильная",
+    # Боль в спине ("спине" - не опечатка в "синеют")
+    "болит спина",
+    "боль в спине",
+    "сильно болит спина",
+    "боль в спине, отдает в лопатку",
+    # Отрицание до и после слова, в том числе списка
+    "нет боли в груди, немеет рука",
+    "не терял сознание",
+    "без температуры, мне 40 лет",
+    "обмороков нет",
+    "нет обмороков и судорог",
+    "судорог не было",
+    "потери сознания нет",
+    # Смягчение и прошлые события
+    "Боль в горле, отек горла небольшой",
+    "слегка отекли губы",
+    "Раньше был обморок год назад",
+    # Безопасные причины похожих жалоб
+    "не могу говорить громко, осип голос",
+    "сводит ногу судорогой",
+    "опухла губа",
+    "опухло горло, больно глотать",
+    "лицо онемело после анестезии",
+])
+def test_ignores_ordinary_complaints(text):
+    assert detect_red_flags(text) is None
+
+
+def test_symptom_words_not_read_as_typos():
+    phrases = list(COMMON_SYMPTOMS)
+    for data in SPECIALISTS_DATA.values():
+        phrases += data['symptoms'].split(',')
+    for word in {word for phrase in phrases for word in tokenize(phrase)}:
+        resolved = _detector._resolve(stem(word))
+        assert not resolved or resolved == {stem(word)}, word
@@ -0,0 +1,72 @@
+"""
+Тесты репозиториев на локальном хранилище SQLite
+"""
+
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+
+from database.models import UserProfile  # noqa: E402
+from database.repositories import UserRepository  # noqa: E402
+from database.storage import SQLiteStorage  # noqa: E402
+
+
+class SlowReadStorage(SQLiteStorage):
+    """Чтение, которое ждёт сигнала (для проверки гонки с изменением)"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.read_started = asyncio.Event()
+        self.release_read = asyncio.Event()
+
+    async def select(self, *args, **kwargs):
+        rows = await super().select(*args, **kwargs)
+        self.read_started.set()
+        await self.release_read.wait()
+        return rows
+
+
+@pytest.fixture
+def storage_path(tmp_path):
+    return str(tmp_path / 'bot.db')
+
+
+def test_read_racing_update_is_not_cached(storage_path):
+    async def scenario():
+        storage = SlowReadStorage(storage_path)
+        repository = UserRepository(storage)
+        await repository.create(UserProfile(user_id=1, full_name='Иванов Иван', weight=80.0))
+        repository.cache.clear()
+
+        # Чтение получило строку до изменения и завершается уже после него
+        read = asyncio.create_task(repository.get(1))
+        await storage.read_started.wait()
+        await repository.update(1, {'weight': 75.0})
+        storage.release_read.set()
+        stale = await read
+
+        fresh = await repository.get(1)
+        await storage.close()
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale.weight == 80.0
+    assert fresh.weight == 75.0
+
+
+def test_update_patches_cached_profile(storage_path):
+    async def scenario():
+        storage = SQLiteStorage(storage_path)
+        repository = UserRepository(storage)
+        await repository.create(UserProfile(user_id=1, birthdate='1990-01-01'))
+        await repository.update(1, {'birthdate': '2000-01-01'})
+        profile = await repository.get(1)
+        await storage.close()
+        return profile, repository.cache_stats()
+
+    profile, stats = asyncio.run(scenario())
+    assert profile.birthdate_text == '01.01.2000'
+    assert stats['hits'] == 1
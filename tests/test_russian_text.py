@@ -0,0 +1,18 @@
+"""
+Тесты нормализации текста симптомов
+"""
+
+import pytest
+
+from services.russian_text import normalize_symptoms
+
+
+@pytest.mark.parametrize('negated, plain', [
+    ("не болит голова", "болит голова"),
+    ("нет температуры, кашель", "температуры, кашель"),
+    ("кашель без мокроты", "кашель мокроты"),
+])
+def test_negation_changes_cache_key(negated, plain):
+    # Ключ кэша симптомов и ключ сохранённой рекомендации строятся по normalize_symptoms
+    assert normalize_symptoms(negated) != normalize_symptoms(plain)
+
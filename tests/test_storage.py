@@ -0,0 +1,32 @@
+"""
+Тесты хранилищ данных
+"""
+
+import asyncio
+
+import pytest
+
+from database.storage import SQLiteStorage, StorageBackend
+
+
+def test_incomplete_backend_cannot_be_created():
+    class SelectOnly(StorageBackend):
+        async def select(self, table, columns='*', filters=None, order=None, limit=None):
+            return []
+
+    with pytest.raises(TypeError):
+        SelectOnly()
+
+
+def test_sqlite_round_trip(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / 'bot.db'))
+        await storage.insert('user_profiles', {'user_id': 1, 'full_name': 'Иванов Иван'})
+        await storage.update('user_profiles', {'height': 180}, {'user_id': 1})
+        rows = await storage.select(
+            'user_profiles', columns='user_id, full_name, height', filters={'user_id': 1}
+        )
+        await storage.close()
+        return rows
+
+    assert asyncio.run(scenario()) == [{'user_id': 1, 'full_name': 'Иванов Иван', 'height': 180}]
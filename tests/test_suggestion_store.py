@@ -0,0 +1,24 @@
+"""
+Тесты постоянного хранилища дополнительных симптомов
+"""
+
+import asyncio
+
+from services.suggestion_store import SQLiteSuggestionBackend
+
+
+def test_sqlite_backend_shared_between_threads(tmp_path):
+    backend = SQLiteSuggestionBackend(str(tmp_path / 'suggestions.db'))
+
+    async def scenario():
+        async def write(i: int):
+            key = (f'симптом {i}', 'days')
+            await asyncio.to_thread(backend.save, [(key, ['Слабость'], 2e9)], {key: 1})
+            return await asyncio.to_thread(backend.load, key)
+
+        loaded = await asyncio.gather(*(write(i) for i in range(50)))
+        return loaded, await asyncio.to_thread(backend.keys)
+
+    loaded, keys = asyncio.run(scenario())
+    assert all(entry == (['Слабость'], 2e9) for entry in loaded)
+    assert len(keys) == 50
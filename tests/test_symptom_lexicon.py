@@ -0,0 +1,37 @@
+"""
+Тесты очистки списков дополнительных симптомов
+"""
+
+import pytest
+
+from services.symptom_lexicon import SymptomLexicon
+
+
+@pytest.fixture(scope='module')
+def lexicon():
+    return SymptomLexicon()
+
+
+def test_numbers_kept(lexicon):
+    assert lexicon.clean(["Температура тела выше 38"]) == ["Температура тела выше 38"]
+
+
+@pytest.mark.parametrize('symptom, fixed', [
+    ("Сухий кашель", "Сухой кашель"),
+    ("Біль у горлі", "Боль в горле"),
+    ("Нічний кашель", "Ночной кашель"),
+])
+def test_ukrainian_fixed(lexicon, symptom, fixed):
+    assert lexicon.clean([symptom]) == [fixed]
+
+
+def test_ulcers_in_mouth_are_a_symptom(lexicon):
+    assert lexicon.clean(["Язвы во рту", "Язва желудка"]) == ["Язвы во рту"]
+
+
+def test_repeat_of_main_complaint_with_degree_dropped(lexicon):
+    assert lexicon.clean(["Повышенная температура", "Озноб"], "температура") == ["Озноб"]
+
+
+def test_adjective_and_noun_forms_merged(lexicon):
+    assert lexicon.clean(["Боль в мышцах", "Мышечная боль", "Сильная мышечная боль"]) == ["Боль в мышцах"]
@@ -0,0 +1,53 @@
+"""
+Тесты локального триажа
+"""
+
+import pytest
+
+from bot.handlers.specialists import SPECIALISTS_DATA
+from services.triage import TriageEngine
+
+
+# Порог локального ответа по умолчанию (AI_TRIAGE_THRESHOLD)
+THRESHOLD = 0.75
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return TriageEngine(list(SPECIALISTS_DATA))
+
+
+def test_phrase_forms_counted_once(engine):
+    # "головная боль" и "головные боли" - одна жалоба, а не две
+    result = engine.assess("Головная боль")
+    assert result['specialist'] == 'Невролог'
+    assert result['confidence'] < THRESHOLD
+
+
+def test_clear_case_answered_locally(engine):
+    result = engine.assess("Сыпь и зуд кожи")
+    assert result['specialist'] == 'Дерматолог'
+    assert result['confidence'] >= THRESHOLD
+
+
+@pytest.mark.parametrize('main, additional', [
+    ("Сильная боль в правой нижней части живота, усиливается при ходьбе. Тошнота.", []),
+    ("Болит живот", ["Черный стул"]),
+    ("Боль в животе, рвота, температура", []),
+    ("Давящая боль за грудиной", []),
+])
+def test_dangerous_cases_defer_to_ai(engine, main, additional):
+    assert engine.assess(main, "", additional)['confidence'] == 0.0
+
+
+def test_evaluation_uses_only_ai_answers(engine):
+    symptoms = '{"main": "Сыпь и зуд кожи"}'
+    report = engine.evaluate([
+        {'symptoms': symptoms, 'recommended_doctor': 'Дерматолог', 'source': 'ai'},
+        {'symptoms': symptoms, 'recommended_doctor': 'Дерматолог', 'source': 'local'},
+        {'symptoms': symptoms, 'recommended_doctor': 'Скорая помощь', 'source': 'emergency'},
+        {'symptoms': symptoms, 'recommended_doctor': 'Дерматолог'},
+    ], THRESHOLD)
+    assert report['total'] == 1
+    assert report['skipped'] == 3
+    assert report['accuracy'] == 1.0